@@ -1,6 +1,6 @@
 from flask import jsonify, request
 
-from database import get_session
+from database import get_request_session
 from models.account import AccountType
 from services.account_service import create_account, list_accounts, patch_account, delete_account
 from utils.response import ok, err, ErrorCode
@@ -11,12 +11,9 @@ from . import bp
 
 @bp.route('/accounts', methods=['GET'])
 def get_accounts():
-    session = get_session()
-    try:
-        items = list_accounts(session)
-        return jsonify(ok({"items": items}))
-    finally:
-        session.close()
+    session = get_request_session()
+    items = list_accounts(session)
+    return jsonify(ok({"items": items}))
 
 
 @bp.route('/accounts', methods=['POST'])
@@ -40,19 +37,16 @@ def post_accounts():
     is_liquid = payload.get('is_liquid')
     currency = payload.get('currency') or 'CNY'
 
-    session = get_session()
-    try:
-        account = create_account(
-            session,
-            name=name,
-            account_type=account_type,
-            institution_id=institution_id,
-            is_liquid=is_liquid,
-            currency=currency,
-        )
-        return jsonify(ok(account))
-    finally:
-        session.close()
+    session = get_request_session()
+    account = create_account(
+        session,
+        name=name,
+        account_type=account_type,
+        institution_id=institution_id,
+        is_liquid=is_liquid,
+        currency=currency,
+    )
+    return jsonify(ok(account))
 
 
 @bp.route('/accounts/<int:account_id>', methods=['PATCH'])
@@ -71,50 +65,44 @@ def patch_accounts(account_id: int):
         except Exception:
             return jsonify(err('invalid account type', code=400)), 400
 
-    session = get_session()
+    session = get_request_session()
     try:
-        try:
-            updated = patch_account(
-                session,
-                account_id=account_id,
-                name=name,
-                institution_id=institution_id,
-                account_type=account_type,
-                is_liquid=is_liquid,
-                currency=currency,
-            )
-        except ValueError as e:
-            log_error(
-                "更新账户失败",
-                error=e,
-                extra={
-                    "endpoint": f"PATCH /accounts/{account_id}",
-                    "account_id": account_id,
-                    "payload": {"name": name, "institution_id": institution_id, "is_liquid": is_liquid, "currency": currency}
-                }
-            )
-            return jsonify(err(error_code=ErrorCode.NOT_FOUND)), 404
-        return jsonify(ok(updated))
-    finally:
-        session.close()
+        updated = patch_account(
+            session,
+            account_id=account_id,
+            name=name,
+            institution_id=institution_id,
+            account_type=account_type,
+            is_liquid=is_liquid,
+            currency=currency,
+        )
+    except ValueError as e:
+        log_error(
+            "更新账户失败",
+            error=e,
+            extra={
+                "endpoint": f"PATCH /accounts/{account_id}",
+                "account_id": account_id,
+                "payload": {"name": name, "institution_id": institution_id, "is_liquid": is_liquid, "currency": currency}
+            }
+        )
+        return jsonify(err(error_code=ErrorCode.NOT_FOUND)), 404
+    return jsonify(ok(updated))
 
 
 @bp.route('/accounts/<int:account_id>', methods=['DELETE'])
 def delete_accounts(account_id: int):
-    session = get_session()
+    session = get_request_session()
     try:
-        try:
-            delete_account(session, account_id)
-        except ValueError as e:
-            log_error(
-                "删除账户失败",
-                error=e,
-                extra={
-                    "endpoint": f"DELETE /accounts/{account_id}",
-                    "account_id": account_id
-                }
-            )
-            return jsonify(err(error_code=ErrorCode.NOT_FOUND)), 404
-        return jsonify(ok({'message': 'deleted'}))
-    finally:
-        session.close()
+        delete_account(session, account_id)
+    except ValueError as e:
+        log_error(
+            "删除账户失败",
+            error=e,
+            extra={
+                "endpoint": f"DELETE /accounts/{account_id}",
+                "account_id": account_id
+            }
+        )
+        return jsonify(err(error_code=ErrorCode.NOT_FOUND)), 404
+    return jsonify(ok({'message': 'deleted'}))
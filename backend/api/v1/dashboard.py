@@ -1,51 +1,50 @@
 from flask import jsonify, request
 from datetime import date
 
-from database import get_session
+from database import get_request_session
 from services.snapshot_service import list_snapshots
-from services.cash_service import get_cash_summary, calculate_available_cash, calculate_cash_timeline
+from services.cash_service import get_cash_summary, calculate_available_cash, calculate_cash_timeline, calculate_cash_curve
 from services.redeem_service import calculate_pending_redeems, summarize_future_cash_flow
 from models.snapshot import Snapshot
 from sqlmodel import select
 from utils.response import ok, err
+from utils.computation_context import computation_context
 
 from . import bp
 
 
+# 现金曲线最多预测 10 年：逐日点位随 days 线性增长，过大的 days 会生成巨大响应或日期溢出
+MAX_CASH_CURVE_DAYS = 3650
+
+
 @bp.route('/dashboard/available_dates', methods=['GET'])
 def get_available_dates():
     """获取所有有快照的日期列表"""
-    session = get_session()
-    try:
-        statement = select(Snapshot.date).distinct().order_by(Snapshot.date.desc())
-        result = session.exec(statement).all()
-        dates = [date_obj.isoformat() for date_obj in result]
-        return jsonify(ok({
-            "dates": dates
-            }))
-    finally:
-        session.close()
+    session = get_request_session()
+    statement = select(Snapshot.date).distinct().order_by(Snapshot.date.desc())
+    result = session.exec(statement).all()
+    dates = [date_obj.isoformat() for date_obj in result]
+    return jsonify(ok({
+        "dates": dates
+        }))
 
 
 @bp.route('/dashboard/latest_date', methods=['GET'])
 def get_latest_snapshot_date():
     """获取最近有 Snapshot 的日期"""
-    session = get_session()
-    try:
-        # 查找最新的快照日期
-        statement = select(Snapshot.date).order_by(Snapshot.date.desc()).limit(1)
-        result = session.exec(statement).first()
-        
-        if result:
-            return jsonify(ok({
-                "date": result.isoformat()
-            }))
-        else:
-            return jsonify(ok({
-                "date": None
-            }))
-    finally:
-        session.close()
+    session = get_request_session()
+    # 查找最新的快照日期
+    statement = select(Snapshot.date).order_by(Snapshot.date.desc()).limit(1)
+    result = session.exec(statement).first()
+    
+    if result:
+        return jsonify(ok({
+            "date": result.isoformat()
+        }))
+    else:
+        return jsonify(ok({
+            "date": None
+        }))
 
 
 @bp.route('/dashboard/summary', methods=['GET'])
@@ -61,63 +60,61 @@ def get_dashboard_summary():
     except ValueError:
         return jsonify(err('invalid date format', code=400)), 400
     
-    session = get_session()
-    try:
-        snapshots = list_snapshots(session, target_date)
-        
-        # 计算汇总指标
-        total_assets = 0.0
-        liquid_assets = 0.0
-        liabilities = 0.0
+    session = get_request_session()
+    snapshots = list_snapshots(session, target_date, with_account=True)
+    
+    # 计算汇总指标
+    total_assets = 0.0
+    liquid_assets = 0.0
+    liabilities = 0.0
+    
+    by_type = {
+        'cash': 0.0,
+        'debit': 0.0,
+        'credit': 0.0,
+        'investment_cash': 0.0,
+        'other': 0.0,
+    }
+    
+    for snapshot in snapshots:
+        balance = snapshot.balance if snapshot.balance is not None else 0.0
         
-        by_type = {
-            'cash': 0.0,
-            'debit': 0.0,
-            'credit': 0.0,
-            'investment_cash': 0.0,
-            'other': 0.0,
-        }
+        # 总资产
+        total_assets += balance
         
-        for snapshot in snapshots:
-            balance = snapshot.balance if snapshot.balance is not None else 0.0
-            
-            # 总资产
-            total_assets += balance
-            
-            # 按类型分组
-            account_type = snapshot.account.type if snapshot.account else 'other'
-            if account_type in by_type:
-                by_type[account_type] += balance
-            
-            # 流动资产
-            if snapshot.account and snapshot.account.is_liquid:
-                liquid_assets += balance
-            
-            # 负债（信用卡）
-            if snapshot.account and snapshot.account.type == 'credit':
-                liabilities += balance
+        # 按类型分组
+        account_type = snapshot.account.type if snapshot.account else 'other'
+        if account_type in by_type:
+            by_type[account_type] += balance
         
-        # 基础可用现金 = 流动资产 - 负债
-        base_available_cash = liquid_assets + liabilities
+        # 流动资产
+        if snapshot.account and snapshot.account.is_liquid:
+            liquid_assets += balance
         
-        # Sprint 4: 计算实际可用现金（扣除在途赎回）
+        # 负债（信用卡）
+        if snapshot.account and snapshot.account.type == 'credit':
+            liabilities += balance
+    
+    # 基础可用现金 = 流动资产 - 负债
+    base_available_cash = liquid_assets + liabilities
+    
+    # Sprint 4: 计算实际可用现金（扣除在途赎回）
+    with computation_context(session):
         cash_summary = get_cash_summary(session, target_date)
-        
-        return jsonify(ok({
-            "date": target_date.isoformat(),
-            "total_assets": total_assets,
-            "liquid_assets": liquid_assets,
-            "liabilities": liabilities,
-            "available_cash": base_available_cash,           # 基础可用现金（兼容旧版）
-            "real_available_cash": cash_summary["real_available"],  # 实际可用现金（扣除在途）
-            "pending_redeems": cash_summary["pending_redeems"],     # 在途赎回金额
-            "future_7d": cash_summary["future_7d"],                 # 未来7天预计到账
-            "future_30d": cash_summary["future_30d"],               # 未来30天预计到账
-            "future_90d": cash_summary["future_90d"],               # 未来90天预计到账（Sprint 5）
-            "by_type": by_type
-        }))
-    finally:
-        session.close()
+    
+    return jsonify(ok({
+        "date": target_date.isoformat(),
+        "total_assets": total_assets,
+        "liquid_assets": liquid_assets,
+        "liabilities": liabilities,
+        "available_cash": base_available_cash,           # 基础可用现金（兼容旧版）
+        "real_available_cash": cash_summary["real_available"],  # 实际可用现金（扣除在途）
+        "pending_redeems": cash_summary["pending_redeems"],     # 在途赎回金额
+        "future_7d": cash_summary["future_7d"],                 # 未来7天预计到账
+        "future_30d": cash_summary["future_30d"],               # 未来30天预计到账
+        "future_90d": cash_summary["future_90d"],               # 未来90天预计到账（Sprint 5）
+        "by_type": by_type
+    }))
 
 
 @bp.route('/dashboard/pending_redeems', methods=['GET'])
@@ -130,12 +127,9 @@ def get_pending_redeems():
     """
     product_id = request.args.get('product_id', type=int)
     
-    session = get_session()
-    try:
-        result = calculate_pending_redeems(session, product_id)
-        return jsonify(ok(result))
-    finally:
-        session.close()
+    session = get_request_session()
+    result = calculate_pending_redeems(session, product_id)
+    return jsonify(ok(result))
 
 
 @bp.route('/dashboard/future_cash_flow', methods=['GET'])
@@ -148,12 +142,9 @@ def get_future_cash_flow():
     """
     days = request.args.get('days', default=30, type=int)
     
-    session = get_session()
-    try:
-        result = summarize_future_cash_flow(session, days_7=7, days_30=days)
-        return jsonify(ok(result))
-    finally:
-        session.close()
+    session = get_request_session()
+    result = summarize_future_cash_flow(session, days_7=7, days_30=days)
+    return jsonify(ok(result))
 
 
 @bp.route('/dashboard/cash_detail', methods=['GET'])
@@ -173,12 +164,9 @@ def get_cash_detail():
         except ValueError:
             return jsonify(err('invalid date format', code=400)), 400
     
-    session = get_session()
-    try:
-        result = calculate_available_cash(session, target_date)
-        return jsonify(ok(result))
-    finally:
-        session.close()
+    session = get_request_session()
+    result = calculate_available_cash(session, target_date)
+    return jsonify(ok(result))
 
 
 @bp.route('/dashboard/cash_timeline', methods=['GET'])
@@ -220,9 +208,41 @@ def get_cash_timeline():
     except ValueError:
         return jsonify(err('invalid milestones format, expected comma-separated integers', code=400)), 400
     
-    session = get_session()
-    try:
+    session = get_request_session()
+    # 时间轴内部复用可用现金、未来现金流等中间结果
+    with computation_context(session):
         result = calculate_cash_timeline(session, milestones)
-        return jsonify(ok(result))
-    finally:
-        session.close()
+    return jsonify(ok(result))
+
+
+@bp.route('/dashboard/cash_curve', methods=['GET'])
+def get_cash_curve():
+    """
+    获取逐日预计可用现金曲线（用于图表）
+    
+    Query Params:
+        days: 预测天数，默认90天，取值 1..MAX_CASH_CURVE_DAYS
+        
+    Response:
+        {
+            "start_date": "2024-01-15",
+            "available_cash": 50000,
+            "points": [
+                {
+                    "date": "2024-01-15",
+                    "inflow": 0,
+                    "accumulated_inflow": 0,
+                    "projected_available_cash": 50000
+                },
+                ...
+            ]
+        }
+    """
+    days = request.args.get('days', default=90, type=int)
+    if not 1 <= days <= MAX_CASH_CURVE_DAYS:
+        return jsonify(err(f'days must be between 1 and {MAX_CASH_CURVE_DAYS}', code=400)), 400
+    
+    session = get_request_session()
+    with computation_context(session):
+        result = calculate_cash_curve(session, days)
+    return jsonify(ok(result))
@@ -1,12 +1,19 @@
 from flask import jsonify
+from database import get_engine, get_sqlite_pragmas
 from . import bp
 
 
 @bp.route('/health', methods=['GET'])
 def health_check():
-    """健康检查接口"""
+    """健康检查接口（附带数据库方言与生效的 SQLite PRAGMA）"""
     return jsonify({
         "code": 200,
-        "data": {"status": "healthy"},
+        "data": {
+            "status": "healthy",
+            "database": {
+                "dialect": get_engine().dialect.name,
+                "pragmas": get_sqlite_pragmas()
+            }
+        },
         "message": "Backend is running"
     })
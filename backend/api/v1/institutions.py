@@ -1,6 +1,6 @@
 from flask import jsonify, request
 
-from database import get_session
+from database import get_request_session
 from services.institution_service import create_institution, list_institutions
 from utils.response import ok, err, ErrorCode
 from utils.logger import log_error
@@ -10,12 +10,9 @@ from . import bp
 
 @bp.route('/institutions', methods=['GET'])
 def get_institutions():
-    session = get_session()
-    try:
-        items = list_institutions(session)
-        return jsonify(ok({"items": items}))
-    finally:
-        session.close()
+    session = get_request_session()
+    items = list_institutions(session)
+    return jsonify(ok({"items": items}))
 
 
 @bp.route('/institutions', methods=['POST'])
@@ -25,20 +22,17 @@ def post_institutions():
     if not name:
         return jsonify(err(error_code=ErrorCode.BAD_REQUEST)), 400
 
-    session = get_session()
+    session = get_request_session()
     try:
-        try:
-            institution = create_institution(session, name=name)
-        except ValueError as e:
-            log_error(
-                "创建机构失败",
-                error=e,
-                extra={
-                    "endpoint": "POST /institutions",
-                    "name": name
-                }
-            )
-            return jsonify(err(error_code=ErrorCode.BAD_REQUEST)), 400
-        return jsonify(ok(institution))
-    finally:
-        session.close()
+        institution = create_institution(session, name=name)
+    except ValueError as e:
+        log_error(
+            "创建机构失败",
+            error=e,
+            extra={
+                "endpoint": "POST /institutions",
+                "name": name
+            }
+        )
+        return jsonify(err(error_code=ErrorCode.BAD_REQUEST)), 400
+    return jsonify(ok(institution))
@@ -1,11 +1,12 @@
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 from datetime import date
 
-from database import get_session
+from database import get_request_session, unit_of_work
 from utils.response import ok, err
 from services.reconciliation_service import (
-    get_all_warnings,
+    get_cached_warnings,
     check_account_diffs,
+    check_account_diffs_range,
     check_redeem_consistency,
     check_valuation_gaps,
     update_warning_status,
@@ -16,6 +17,7 @@ from . import bp
 
 
 @bp.route('/reconciliation/warnings', methods=['GET'])
+@unit_of_work
 def get_reconciliation_warnings():
     """
     获取所有对账警告（聚合接口）
@@ -25,6 +27,7 @@ def get_reconciliation_warnings():
         - account_threshold: 账户差异阈值（默认 1.0）
         - gap_days: 估值断档阈值天数（默认 14）
         - redeem_buffer: 赎回缓冲天数（默认 3）
+        - refresh: 为 true 时全量重建警告缓存（默认只增量重算 dirty 对象）
     
     Returns:
         {
@@ -58,30 +61,30 @@ def get_reconciliation_warnings():
     account_threshold = request.args.get('account_threshold', 1.0, type=float)
     gap_days = request.args.get('gap_days', 14, type=int)
     redeem_buffer = request.args.get('redeem_buffer', 3, type=int)
+    refresh = request.args.get('refresh') == 'true'
     
-    session = get_session()
-    try:
-        warnings = get_all_warnings(
-            session,
-            target_date=target_date,
-            account_diff_threshold=account_threshold,
-            valuation_gap_days=gap_days,
-            redeem_buffer_days=redeem_buffer
-        )
-        
-        warn_count = sum(1 for w in warnings if w.level == 'warn')
-        info_count = sum(1 for w in warnings if w.level == 'info')
-        
-        return jsonify(ok({
-            "items": [w.to_dict() for w in warnings],
-            "summary": {
-                "total": len(warnings),
-                "warn": warn_count,
-                "info": info_count
-            }
-        }))
-    finally:
-        session.close()
+    session = get_request_session()
+    warnings = get_cached_warnings(
+        session,
+        target_date=target_date,
+        account_diff_threshold=account_threshold,
+        valuation_gap_days=gap_days,
+        redeem_buffer_days=redeem_buffer,
+        refresh=refresh,
+        parallel=current_app.config['RECONCILIATION_PARALLEL']
+    )
+    
+    warn_count = sum(1 for w in warnings if w.level == 'warn')
+    info_count = sum(1 for w in warnings if w.level == 'info')
+    
+    return jsonify(ok({
+        "items": [w.to_dict() for w in warnings],
+        "summary": {
+            "total": len(warnings),
+            "warn": warn_count,
+            "info": info_count
+        }
+    }))
 
 
 @bp.route('/reconciliation/account_diffs', methods=['GET'])
@@ -91,6 +94,9 @@ def get_account_diffs():
     
     Query Params:
         - date: 检查日期（ISO格式，默认今天）
+        - from / to: 区间模式（ISO格式，需同时提供），对区间内每个快照日期输出一行，
+          推导余额按日期滚动累计
+        - account_id: 只检查该账户（可选，区间模式）
         - threshold: 差异阈值（默认 1.0）
     
     Returns:
@@ -109,20 +115,46 @@ def get_account_diffs():
             ]
         }
     """
-    date_str = request.args.get('date')
-    target_date = date.today() if not date_str else date.fromisoformat(date_str)
     threshold = request.args.get('threshold', 1.0, type=float)
+    session = get_request_session()
     
-    session = get_session()
-    try:
-        diffs = check_account_diffs(session, target_date, threshold)
+    from_str = request.args.get('from')
+    to_str = request.args.get('to')
+    if from_str or to_str:
+        if not (from_str and to_str):
+            return jsonify(err("from and to are required together", code=400)), 400
+        try:
+            from_date = date.fromisoformat(from_str)
+            to_date = date.fromisoformat(to_str)
+        except ValueError:
+            return jsonify(err("invalid date format", code=400)), 400
+        if from_date > to_date:
+            return jsonify(err("from must not be after to", code=400)), 400
+        
+        account_id = request.args.get('account_id', type=int)
+        diffs = check_account_diffs_range(
+            session,
+            from_date,
+            to_date,
+            threshold,
+            account_ids=[account_id] if account_id is not None else None
+        )
         return jsonify(ok({
             "items": [d.to_dict() for d in diffs],
-            "check_date": target_date.isoformat(),
+            "from": from_date.isoformat(),
+            "to": to_date.isoformat(),
             "threshold": threshold
         }))
-    finally:
-        session.close()
+    
+    date_str = request.args.get('date')
+    target_date = date.today() if not date_str else date.fromisoformat(date_str)
+    
+    diffs = check_account_diffs(session, target_date, threshold)
+    return jsonify(ok({
+        "items": [d.to_dict() for d in diffs],
+        "check_date": target_date.isoformat(),
+        "threshold": threshold
+    }))
 
 
 @bp.route('/reconciliation/redeem_check', methods=['GET'])
@@ -151,15 +183,12 @@ def get_redeem_check():
     """
     buffer_days = request.args.get('buffer_days', 3, type=int)
     
-    session = get_session()
-    try:
-        checks = check_redeem_consistency(session, buffer_days)
-        return jsonify(ok({
-            "items": [c.to_dict() for c in checks],
-            "buffer_days": buffer_days
-        }))
-    finally:
-        session.close()
+    session = get_request_session()
+    checks = check_redeem_consistency(session, buffer_days)
+    return jsonify(ok({
+        "items": [c.to_dict() for c in checks],
+        "buffer_days": buffer_days
+    }))
 
 
 @bp.route('/reconciliation/valuation_gaps', methods=['GET'])
@@ -187,15 +216,12 @@ def get_valuation_gaps():
     """
     gap_days = request.args.get('gap_days', 14, type=int)
     
-    session = get_session()
-    try:
-        gaps = check_valuation_gaps(session, gap_days)
-        return jsonify(ok({
-            "items": [g.to_dict() for g in gaps],
-            "gap_threshold_days": gap_days
-        }))
-    finally:
-        session.close()
+    session = get_request_session()
+    gaps = check_valuation_gaps(session, gap_days)
+    return jsonify(ok({
+        "items": [g.to_dict() for g in gaps],
+        "gap_threshold_days": gap_days
+    }))
 
 
 @bp.route('/reconciliation/warnings/<warning_id>/status', methods=['PUT'])
@@ -226,18 +252,15 @@ def update_warning_status_endpoint(warning_id: str):
     if status not in ['open', 'acknowledged', 'muted']:
         return jsonify(err('invalid status, must be open/acknowledged/muted', code=400)), 400
     
-    session = get_session()
-    try:
-        record = update_warning_status(session, warning_id, status, mute_reason)
-        return jsonify(ok({
-            "id": record.id,
-            "warning_id": record.warning_id,
-            "status": record.status,
-            "mute_reason": record.mute_reason,
-            "updated_at": record.updated_at.isoformat() if record.updated_at else None
-        }))
-    finally:
-        session.close()
+    session = get_request_session()
+    record = update_warning_status(session, warning_id, status, mute_reason)
+    return jsonify(ok({
+        "id": record.id,
+        "warning_id": record.warning_id,
+        "status": record.status,
+        "mute_reason": record.mute_reason,
+        "updated_at": record.updated_at.isoformat() if record.updated_at else None
+    }))
 
 
 @bp.route('/reconciliation/warnings/<warning_id>/restore', methods=['POST'])
@@ -253,17 +276,14 @@ def restore_warning_endpoint(warning_id: str):
             "updated_at": str
         }
     """
-    session = get_session()
-    try:
-        record = restore_warning_to_open(session, warning_id)
-        if not record:
-            return jsonify(err('warning not found', code=404)), 404
-        
-        return jsonify(ok({
-            "id": record.id,
-            "warning_id": record.warning_id,
-            "status": record.status,
-            "updated_at": record.updated_at.isoformat() if record.updated_at else None
-        }))
-    finally:
-        session.close()
+    session = get_request_session()
+    record = restore_warning_to_open(session, warning_id)
+    if not record:
+        return jsonify(err('warning not found', code=404)), 404
+    
+    return jsonify(ok({
+        "id": record.id,
+        "warning_id": record.warning_id,
+        "status": record.status,
+        "updated_at": record.updated_at.isoformat() if record.updated_at else None
+    }))
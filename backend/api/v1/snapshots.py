@@ -1,12 +1,15 @@
-from flask import request, jsonify
+from flask import Response, current_app, request, jsonify, stream_with_context
 from datetime import date
-from database import get_session
+from database import get_request_session, unit_of_work
 from services import snapshot_service
-from utils.response import ok, err
+from services.import_service import detect_import_format, drain_import, iter_import_snapshots, ndjson_progress_lines
+from utils.logger import log_error
+from utils.response import ok, err, err_safe
 from . import bp
 
 
 @bp.route('/snapshots/batch_upsert', methods=['POST'])
+@unit_of_work
 def batch_upsert():
     data = request.json
     if not data or 'rows' not in data:
@@ -14,16 +17,48 @@ def batch_upsert():
         
     rows = data['rows']
     
-    session = get_session()
+    session = get_request_session()
+    inserted, updated, warnings = snapshot_service.batch_upsert_snapshots(session, rows)
+    return jsonify(ok({
+        "inserted": inserted,
+        "updated": updated,
+        "warnings": warnings
+    }))
+
+
+@bp.route('/snapshots/import', methods=['POST'])
+def import_snapshots_route():
+    """
+    流式导入账户快照（date, account_id, balance）
+
+    请求体为 CSV（带表头）或 NDJSON（每行一个对象），通过 Content-Type
+    （text/csv、application/x-ndjson）或 ?format=csv|ndjson 指定。
+    逐行解析，每 IMPORT_CHUNK_SIZE 行写入并提交一次；不合法的行按行号返回，不影响其他行。
+
+    ?progress=true 时以 NDJSON 流式返回：每写入一块输出一行 {"type": "progress", ...}，
+    最后一行为 {"type": "summary", "data": {...}}（中途出错时为 {"type": "error", ...}）。
+    """
+    fmt = detect_import_format(request.mimetype, request.args.get('format'))
+    if fmt is None:
+        return jsonify(err("unsupported format, expected csv or ndjson", code=415)), 415
+
+    session = get_request_session()
     try:
-        inserted, updated, warnings = snapshot_service.batch_upsert_snapshots(session, rows)
-        return jsonify(ok({
-            "inserted": inserted,
-            "updated": updated,
-            "warnings": warnings
-        }))
-    finally:
-        session.close()
+        progress = iter_import_snapshots(session, request.stream, fmt, current_app.config['IMPORT_CHUNK_SIZE'])
+        if request.args.get('progress', 'false').lower() == 'true':
+            lines = ndjson_progress_lines(progress, fmt, "流式导入快照失败", "POST /snapshots/import")
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        result = drain_import(progress)
+        return jsonify(ok(dict(result, format=fmt)))
+    except ValueError as e:
+        return jsonify(err(str(e), code=400)), 400
+    except Exception as e:
+        log_error(
+            "流式导入快照失败",
+            error=e,
+            extra={"endpoint": "POST /snapshots/import", "format": fmt}
+        )
+        return jsonify(err_safe(e, code=500)), 500
 
 
 @bp.route('/snapshots', methods=['GET'])
@@ -39,20 +74,17 @@ def list_snapshots_route():
     except ValueError:
         return jsonify(err("Invalid date format", code=400)), 400
         
-    session = get_session()
-    try:
-        snapshots = snapshot_service.list_snapshots(session, query_date, fill_previous)
-        items = [
-            {
-                "account_id": s.account_id,
-                "balance": s.balance,
-                "date": s.date.isoformat() # 返回实际的快照日期，以便前端知道数据来源
-            }
-            for s in snapshots
-        ]
-        return jsonify(ok({
-            "date": date_str,
-            "items": items
-        }))
-    finally:
-        session.close()
+    session = get_request_session()
+    snapshots = snapshot_service.list_snapshots(session, query_date, fill_previous)
+    items = [
+        {
+            "account_id": s.account_id,
+            "balance": s.balance,
+            "date": s.date.isoformat() # 返回实际的快照日期，以便前端知道数据来源
+        }
+        for s in snapshots
+    ]
+    return jsonify(ok({
+        "date": date_str,
+        "items": items
+    }))
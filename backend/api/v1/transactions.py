@@ -2,11 +2,13 @@ from flask import jsonify, request
 from datetime import date
 from typing import Optional
 
-from database import get_session
+from database import get_request_session, unit_of_work
 from models.transaction import Transaction, TransactionCategory
 from services.transaction_service import (
     create_transaction,
+    batch_create_transactions,
     list_transactions,
+    decode_transaction_cursor,
     delete_transaction,
     get_product_transactions
 )
@@ -28,15 +30,10 @@ def create():
             return jsonify(err(f'{field} is required', code=400)), 400
 
     # 校验 category
-    if payload['category'] not in [
-        TransactionCategory.BUY,
-        TransactionCategory.REDEEM_REQUEST,
-        TransactionCategory.REDEEM_SETTLE,
-        TransactionCategory.FEE
-    ]:
+    if payload['category'] not in TransactionCategory.PRODUCT_CATEGORIES:
         return jsonify(err('invalid category', code=400)), 400
 
-    session = get_session()
+    session = get_request_session()
     try:
         transaction = create_transaction(
             session,
@@ -71,13 +68,58 @@ def create():
         )
         # 返回安全的错误响应，不暴露内部细节
         return jsonify(err_safe(e, code=500)), 500
-    finally:
-        session.close()
 
 
+@bp.route('/transactions/batch_create', methods=['POST'])
+@unit_of_work
+def batch_create():
+    """
+    批量创建交易记录（如导入券商/银行对账单）
+    
+    Body:
+        {
+            "rows": [{product_id, account_id, category, trade_date, amount, settle_date?, note?, external_ref?}, ...],
+            "dedupe_by_content": false   # 为 true 时没有 external_ref 的行按内容哈希去重
+        }
+    
+    不合法的行在 errors 中按下标返回，已导入过的行（external_ref 重复）在 duplicates 中返回，
+    其余行在同一事务内写入。
+    """
+    payload = request.get_json(silent=True) or {}
+    rows = payload.get('rows')
+    if not isinstance(rows, list):
+        return jsonify(err("Missing 'rows' in request body", code=400)), 400
+
+    session = get_request_session()
+    try:
+        result = batch_create_transactions(
+            session,
+            rows,
+            hash_missing_refs=bool(payload.get('dedupe_by_content', False))
+        )
+        return jsonify(ok(result))
+    except Exception as e:
+        log_error(
+            "批量创建交易记录失败",
+            error=e,
+            extra={
+                "endpoint": "POST /transactions/batch_create",
+                "rows_count": len(rows),
+                "remote_addr": request.remote_addr
+            }
+        )
+        return jsonify(err_safe(e, code=500)), 500
+
 @bp.route('/transactions', methods=['GET'])
 def list_all():
-    """查询交易记录列表"""
+    """
+    查询交易记录列表
+    
+    Query Params:
+        page / page_size: OFFSET 分页
+        cursor: keyset 分页游标（上一页 pagination.next_cursor），提供时忽略 page
+        with_total: 为 false 时跳过总数统计，total/total_pages 返回 null
+    """
     product_id = request.args.get('product_id', type=int)
     account_id = request.args.get('account_id', type=int)
     category = request.args.get('category')
@@ -85,6 +127,13 @@ def list_all():
     to_date = request.args.get('to')
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('page_size', 20, type=int)
+    # keyset 分页游标（上一页的 next_cursor），提供时忽略 page
+    cursor = request.args.get('cursor')
+    # with_total=false 时跳过 COUNT 查询
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
+
+    if page < 1 or page_size < 1:
+        return jsonify(err("page and page_size must be positive", code=400)), 400
 
     # 日期解析
     start_date: Optional[date] = None
@@ -99,8 +148,13 @@ def list_all():
             end_date = date.fromisoformat(to_date)
         except ValueError:
             return jsonify(err("invalid to date format", code=400)), 400
+    if cursor:
+        try:
+            decode_transaction_cursor(cursor)
+        except ValueError:
+            return jsonify(err("invalid cursor", code=400)), 400
 
-    session = get_session()
+    session = get_request_session()
     try:
         result = list_transactions(
             session,
@@ -110,7 +164,9 @@ def list_all():
             start_date=start_date,
             end_date=end_date,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            with_total=with_total,
+            cursor=cursor
         )
 
         items = [
@@ -122,7 +178,8 @@ def list_all():
                 "trade_date": t.trade_date.isoformat(),
                 "settle_date": t.settle_date.isoformat() if t.settle_date else None,
                 "amount": t.amount,
-                "note": t.note
+                "note": t.note,
+                "external_ref": t.external_ref
             }
             for t in result['items']
         ]
@@ -144,19 +201,18 @@ def list_all():
                     "from": from_date,
                     "to": to_date,
                     "page": page,
-                    "page_size": page_size
+                    "page_size": page_size,
+                    "cursor": cursor
                 }
             }
         )
         return jsonify(err_safe(e, code=500)), 500
-    finally:
-        session.close()
 
 
 @bp.route('/transactions/<int:transaction_id>', methods=['DELETE'])
 def delete(transaction_id: int):
     """删除交易记录"""
-    session = get_session()
+    session = get_request_session()
     try:
         success = delete_transaction(session, transaction_id)
         if success:
@@ -173,8 +229,6 @@ def delete(transaction_id: int):
             }
         )
         return jsonify(err_safe(e, code=500)), 500
-    finally:
-        session.close()
 
 
 @bp.route('/products/<int:product_id>/transactions', methods=['GET'])
@@ -221,7 +275,7 @@ def get_product_transactions_api(product_id: int):
             else:
                 start_date = today - timedelta(weeks=8)
 
-    session = get_session()
+    session = get_request_session()
     try:
         transactions = get_product_transactions(
             session,
@@ -238,7 +292,8 @@ def get_product_transactions_api(product_id: int):
                 "trade_date": t.trade_date.isoformat(),
                 "settle_date": t.settle_date.isoformat() if t.settle_date else None,
                 "amount": t.amount,
-                "note": t.note
+                "note": t.note,
+                "external_ref": t.external_ref
             }
             for t in transactions
         ]
@@ -258,5 +313,3 @@ def get_product_transactions_api(product_id: int):
             }
         )
         return jsonify(err_safe(e, code=500)), 500
-    finally:
-        session.close()
@@ -1,8 +1,9 @@
-from flask import jsonify, request
+from flask import Response, current_app, jsonify, request, stream_with_context
 from datetime import date
 
-from database import get_session
-from services.valuation_service import batch_upsert_valuations, list_valuations, delete_valuation
+from database import get_request_session, unit_of_work
+from services.valuation_service import batch_upsert_valuations, list_valuations_page, delete_valuation
+from services.import_service import detect_import_format, drain_import, iter_import_valuations, ndjson_progress_lines
 from utils.response import ok, err, err_safe, ErrorCode
 from utils.logger import log_error
 
@@ -10,6 +11,7 @@ from . import bp
 
 
 @bp.route('/valuations/batch_upsert', methods=['POST'], endpoint='batch_upsert_valuations')
+@unit_of_work
 def batch_upsert():
     """批量录入/更新产品估值点"""
     payload = request.get_json(silent=True) or {}
@@ -19,7 +21,7 @@ def batch_upsert():
     if not rows:
         return jsonify(ok({"inserted": 0, "updated": 0, "warnings": []}))
 
-    session = get_session()
+    session = get_request_session()
     try:
         result = batch_upsert_valuations(session, rows)
         return jsonify(ok(result))
@@ -34,8 +36,41 @@ def batch_upsert():
             }
         )
         return jsonify(err_safe(e, code=500)), 500
-    finally:
-        session.close()
+
+
+@bp.route('/valuations/import', methods=['POST'])
+def import_valuations_route():
+    """
+    流式导入产品估值（product_id, date, market_value）
+
+    请求体为 CSV（带表头）或 NDJSON（每行一个对象），通过 Content-Type
+    （text/csv、application/x-ndjson）或 ?format=csv|ndjson 指定。
+    逐行解析，每 IMPORT_CHUNK_SIZE 行写入并提交一次；不合法的行按行号返回，不影响其他行。
+
+    ?progress=true 时以 NDJSON 流式返回：每写入一块输出一行 {"type": "progress", ...}，
+    最后一行为 {"type": "summary", "data": {...}}（中途出错时为 {"type": "error", ...}）。
+    """
+    fmt = detect_import_format(request.mimetype, request.args.get('format'))
+    if fmt is None:
+        return jsonify(err("unsupported format, expected csv or ndjson", code=415)), 415
+
+    session = get_request_session()
+    try:
+        progress = iter_import_valuations(session, request.stream, fmt, current_app.config['IMPORT_CHUNK_SIZE'])
+        if request.args.get('progress', 'false').lower() == 'true':
+            lines = ndjson_progress_lines(progress, fmt, "流式导入估值失败", "POST /valuations/import")
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        result = drain_import(progress)
+        return jsonify(ok(dict(result, format=fmt)))
+    except ValueError as e:
+        return jsonify(err(str(e), code=400)), 400
+    except Exception as e:
+        log_error(
+            "流式导入估值失败",
+            error=e,
+            extra={"endpoint": "POST /valuations/import", "format": fmt}
+        )
+        return jsonify(err_safe(e, code=500)), 500
 
 
 @bp.route('/products/<int:product_id>/valuations', methods=['GET'])
@@ -45,39 +80,45 @@ def get_product_valuations(product_id: int):
     end_date_str = request.args.get('to')
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('page_size', 20, type=int)
+    # keyset 分页游标（上一页的 next_cursor，即最后一个估值日期），提供时忽略 page
+    cursor_str = request.args.get('cursor')
+    # with_total=false 时跳过总数统计
+    with_total = request.args.get('with_total', 'true').lower() != 'false'
 
     if not start_date_str or not end_date_str:
         return jsonify(err("from and to dates are required", code=400)), 400
 
+    if page < 1 or page_size < 1:
+        return jsonify(err("page and page_size must be positive", code=400)), 400
+
     try:
         start_date = date.fromisoformat(start_date_str)
         end_date = date.fromisoformat(end_date_str)
     except ValueError:
         return jsonify(err("invalid date format", code=400)), 400
 
-    session = get_session()
-    try:
-        valuations = list_valuations(session, product_id, start_date, end_date)
+    cursor = None
+    if cursor_str:
+        try:
+            cursor = date.fromisoformat(cursor_str)
+        except ValueError:
+            return jsonify(err("invalid cursor", code=400)), 400
 
-        # 分页逻辑
-        total = len(valuations)
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        paginated_valuations = valuations[start_idx:end_idx]
+    session = get_request_session()
+    try:
+        result = list_valuations_page(
+            session, product_id, start_date, end_date,
+            page=page, page_size=page_size, with_total=with_total, cursor=cursor
+        )
 
         points = [
             {"date": v.date.isoformat(), "market_value": v.market_value}
-            for v in paginated_valuations
+            for v in result['items']
         ]
         return jsonify(ok({
             "product_id": product_id,
             "points": points,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "total_pages": (total + page_size - 1) // page_size
-            }
+            "pagination": result['pagination']
         }))
     except Exception as e:
         log_error(
@@ -86,12 +127,10 @@ def get_product_valuations(product_id: int):
             extra={
                 "endpoint": f"GET /products/{product_id}/valuations",
                 "product_id": product_id,
-                "params": {"from": start_date_str, "to": end_date_str, "page": page, "page_size": page_size}
+                "params": {"from": start_date_str, "to": end_date_str, "page": page, "page_size": page_size, "cursor": cursor_str}
             }
         )
         return jsonify(err_safe(e, code=500)), 500
-    finally:
-        session.close()
 
 
 @bp.route('/products/<int:product_id>/valuations', methods=['DELETE'])
@@ -106,7 +145,7 @@ def delete_product_valuation(product_id: int):
     except ValueError:
         return jsonify(err("invalid date format", code=400)), 400
 
-    session = get_session()
+    session = get_request_session()
     try:
         success = delete_valuation(session, product_id, valuation_date)
         if success:
@@ -124,5 +163,3 @@ def delete_product_valuation(product_id: int):
             }
         )
         return jsonify(err_safe(e, code=500)), 500
-    finally:
-        session.close()
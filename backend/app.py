@@ -1,6 +1,6 @@
 from flask import Flask
 from config import Config
-from database import init_db
+from database import init_engine, init_db, close_request_session
 
 
 def create_app(config_class=Config):
@@ -8,11 +8,17 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
-    # 初始化数据库
-    init_db()
+    # 初始化数据库（进程级引擎与连接池只创建一次）
+    init_engine(config_class)
+    init_db(auto_migrate=config_class.DB_AUTO_MIGRATE)
+    app.teardown_appcontext(close_request_session)
     
     # 注册蓝图
     from api.v1 import bp as v1_bp
     app.register_blueprint(v1_bp, url_prefix='/api')
+
+    # 注册命令行工具（flask --app run <command>）
+    from cli import register_commands
+    register_commands(app)
     
     return app
@@ -0,0 +1,103 @@
+"""
+命令行工具
+通过 `flask --app run <command>` 调用
+"""
+
+from datetime import date
+
+import click
+
+from database import SCHEMA_VERSION, get_engine, get_schema_version, get_session, migrate_db
+from utils.query_plan import capture_statements, explain_query_plan
+
+
+def _service_queries():
+    """需要检查查询计划的服务层调用：(名称, fn(session))"""
+    from services.account_service import list_accounts
+    from services.product_service import list_products_with_holdings
+    from services.snapshot_service import list_snapshots
+    from services.transaction_service import list_transactions, get_product_transactions
+    from services.valuation_service import get_valuation_series
+    from services.redeem_service import calculate_pending_redeems, calculate_future_cash_flow
+    from services.cash_service import calculate_available_cash, calculate_cash_timeline
+    from services.reconciliation_service import (
+        calculate_account_derived_balance,
+        check_account_diffs,
+        check_redeem_consistency,
+        check_valuation_gaps,
+        get_all_warnings,
+    )
+
+    today = date.today()
+    year_ago = date(today.year - 1, today.month, min(today.day, 28))
+    return [
+        ("account_service.list_accounts", lambda s: list_accounts(s)),
+        ("product_service.list_products_with_holdings", lambda s: list_products_with_holdings(s)),
+        ("snapshot_service.list_snapshots", lambda s: list_snapshots(s, today, fill_previous=True)),
+        ("transaction_service.list_transactions", lambda s: list_transactions(s, product_id=1, category='buy')),
+        ("transaction_service.list_transactions(cursor)", lambda s: list_transactions(s, cursor=f"{today.isoformat()}_1")),
+        ("transaction_service.get_product_transactions", lambda s: get_product_transactions(s, 1, year_ago, today)),
+        ("valuation_service.get_valuation_series", lambda s: get_valuation_series(s, 1, year_ago, today)),
+        ("redeem_service.calculate_pending_redeems", lambda s: calculate_pending_redeems(s)),
+        ("redeem_service.calculate_pending_redeems(product)", lambda s: calculate_pending_redeems(s, 1)),
+        ("redeem_service.calculate_future_cash_flow", lambda s: calculate_future_cash_flow(s, days=90)),
+        ("cash_service.calculate_available_cash", lambda s: calculate_available_cash(s)),
+        ("cash_service.calculate_cash_timeline", lambda s: calculate_cash_timeline(s)),
+        ("reconciliation_service.calculate_account_derived_balance", lambda s: calculate_account_derived_balance(s, 1, today)),
+        ("reconciliation_service.check_account_diffs", lambda s: check_account_diffs(s, today)),
+        ("reconciliation_service.check_redeem_consistency", lambda s: check_redeem_consistency(s)),
+        ("reconciliation_service.check_valuation_gaps", lambda s: check_valuation_gaps(s)),
+        ("reconciliation_service.get_all_warnings", lambda s: get_all_warnings(s, today)),
+    ]
+
+
+def register_commands(app):
+    """注册 Flask CLI 命令"""
+
+    @app.cli.command('migrate-db')
+    def migrate_db_command():
+        """将数据库 schema 迁移到当前代码版本"""
+        current = get_schema_version()
+        if current == SCHEMA_VERSION:
+            click.echo(f"schema 已是最新版本 v{SCHEMA_VERSION}")
+            return
+        migrate_db()
+        click.echo(f"schema 已迁移：v{current or 0} -> v{SCHEMA_VERSION}")
+
+    @app.cli.command('schema-version')
+    def schema_version_command():
+        """查看数据库 schema 版本"""
+        click.echo(f"数据库版本：{get_schema_version()}，代码版本：{SCHEMA_VERSION}")
+
+    @app.cli.command('explain-queries')
+    @click.option('--all', 'show_all', is_flag=True, help='同时输出未发现全表扫描的查询')
+    def explain_queries_command(show_all):
+        """对服务层查询执行 EXPLAIN QUERY PLAN，标记全表扫描（仅 SQLite）"""
+        engine = get_engine()
+        if engine.dialect.name != 'sqlite':
+            click.echo(f"仅支持 SQLite，当前数据库为 {engine.dialect.name}")
+            return
+
+        flagged = 0
+        for name, fn in _service_queries():
+            session = get_session()
+            try:
+                with capture_statements(engine) as statements:
+                    fn(session)
+                with engine.connect() as conn:
+                    reports = [explain_query_plan(conn, sql, params) for sql, params in statements]
+            finally:
+                session.rollback()
+                session.close()
+
+            for report in reports:
+                if not report["full_scans"] and not show_all:
+                    continue
+                flagged += 1 if report["full_scans"] else 0
+                mark = "FULL SCAN" if report["full_scans"] else "ok"
+                click.echo(f"[{mark}] {name}")
+                click.echo("    " + " ".join(report["sql"].split()))
+                for detail in report["plan"]:
+                    click.echo(f"      - {detail}")
+
+        click.echo(f"共 {flagged} 条查询包含全表扫描")
@@ -12,6 +12,32 @@ class Config:
     DATABASE_URL = os.environ.get('DATABASE_URL') or f'sqlite:///{DB_PATH}'
     DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
 
+    # 数据库连接池
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))  # 秒，-1 表示不回收
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() == 'true'
+
+    # 启动时 schema 版本落后是否自动迁移（关闭后需手动执行 `flask --app run migrate-db`）
+    DB_AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', 'True').lower() == 'true'
+
+    # SQLite PRAGMA 调优配置（每个新连接建立时应用，非 SQLite 数据库忽略）
+    SQLITE_PRAGMAS_ENABLED = os.environ.get('SQLITE_PRAGMAS_ENABLED', 'True').lower() == 'true'
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))  # 字节，256MB
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -65536))  # 负数表示 KiB，即 64MB
+    SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # 毫秒
+    # 开启外键约束会让删除仍被交易引用的产品/账户失败，默认保持关闭
+    SQLITE_FOREIGN_KEYS = os.environ.get('SQLITE_FOREIGN_KEYS', 'False').lower() == 'true'
+
+    # 对账三类检查是否在线程池中并发执行（各自使用独立会话）
+    RECONCILIATION_PARALLEL = os.environ.get('RECONCILIATION_PARALLEL', 'False').lower() == 'true'
+
+    # 流式导入（CSV / NDJSON）每块写入的行数，每块单独提交
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
@@ -1,3 +1,11 @@
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from flask import g, make_response
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
 from sqlmodel import create_engine, SQLModel, Session
 from config import Config
 from models.base import BaseModel
@@ -5,21 +13,343 @@ from models.institution import Institution
 from models.account import Account
 from models.product import Product
 from models.valuation import ProductValuation
-from models.warning import ReconciliationWarningRecord  # Sprint 6 (S6-5): 对账警告状态表
+from models.warning import (  # Sprint 6 (S6-5): 对账警告状态表
+    ReconciliationWarningRecord,
+    ReconciliationDirtyObject,
+    ReconciliationWarningCache,
+    ReconciliationCacheState,
+)
+from models.transaction import Transaction
+from models.schema_version import SchemaVersion
+from utils.logger import log_info, log_warning
+
+
+# 当前代码对应的 schema 版本；修改表结构时 +1 并在 MIGRATIONS 中登记迁移函数
+SCHEMA_VERSION = 5
+
+
+class AppSession(Session):
+    """
+    应用会话
+
+    unit-of-work 模式下（session.info['unit_of_work'] 为真），服务层的 commit()
+    只 flush 到当前事务，由请求结束时统一提交一次。
+    """
+
+    def commit(self) -> None:
+        if self.info.get('unit_of_work'):
+            self.flush()
+            return
+        super().commit()
+
+    def commit_unit_of_work(self) -> None:
+        """提交 unit-of-work 期间累积的全部写入"""
+        self.info['unit_of_work'] = False
+        super().commit()
+
+
+# 进程级引擎与会话工厂（由 init_engine 在应用启动时创建一次）
+_engine = None
+_session_factory = None
+
+
+def _engine_options(config_class) -> dict:
+    """根据配置生成 create_engine 参数（连接池相关）"""
+    url = make_url(config_class.DATABASE_URL)
+    options = {}
+
+    if url.get_backend_name() == 'sqlite':
+        # Flask 多线程处理请求，连接会在线程间复用
+        options['connect_args'] = {'check_same_thread': False}
+        if url.database in (None, '', ':memory:'):
+            # 内存库使用 SingletonThreadPool，不支持以下连接池参数
+            return options
+
+    options.update(
+        pool_size=config_class.DB_POOL_SIZE,
+        max_overflow=config_class.DB_MAX_OVERFLOW,
+        pool_recycle=config_class.DB_POOL_RECYCLE,
+        pool_pre_ping=config_class.DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def _sqlite_pragmas(config_class) -> dict:
+    """根据配置生成 SQLite PRAGMA 调优参数（按应用顺序）"""
+    if not config_class.SQLITE_PRAGMAS_ENABLED:
+        return {}
+    return {
+        'journal_mode': config_class.SQLITE_JOURNAL_MODE,
+        'synchronous': config_class.SQLITE_SYNCHRONOUS,
+        'mmap_size': config_class.SQLITE_MMAP_SIZE,
+        'cache_size': config_class.SQLITE_CACHE_SIZE,
+        'temp_store': config_class.SQLITE_TEMP_STORE,
+        'busy_timeout': config_class.SQLITE_BUSY_TIMEOUT,
+        'foreign_keys': 'ON' if config_class.SQLITE_FOREIGN_KEYS else 'OFF',
+    }
+
+
+def _register_sqlite_pragmas(engine, pragmas: dict) -> None:
+    """在连接建立时应用 PRAGMA（连接池中的每个连接只执行一次）"""
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def init_engine(config_class=Config):
+    """创建进程级数据库引擎与会话工厂"""
+    global _engine, _session_factory
+
+    if _engine is not None:
+        _engine.dispose()
+
+    _engine = create_engine(config_class.DATABASE_URL, **_engine_options(config_class))
+    if _engine.dialect.name == 'sqlite':
+        pragmas = _sqlite_pragmas(config_class)
+        if pragmas:
+            _register_sqlite_pragmas(_engine, pragmas)
+    _session_factory = sessionmaker(bind=_engine, class_=AppSession)
+    return _engine
+
+
+def get_engine():
+    """获取进程级数据库引擎（未初始化时按默认配置创建）"""
+    if _engine is None:
+        init_engine()
+    return _engine
+
+
+def get_sqlite_pragmas() -> dict:
+    """读取当前连接实际生效的 SQLite PRAGMA（非 SQLite 数据库返回空字典）"""
+    engine = get_engine()
+    if engine.dialect.name != 'sqlite':
+        return {}
+
+    names = ['journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout', 'foreign_keys']
+    with engine.connect() as conn:
+        return {
+            name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in names
+        }
+
+
+def _migrate_v1(connection) -> None:
+    """v1：基线 schema（补齐缺失的表，已存在的表不受影响）"""
+    SQLModel.metadata.create_all(connection)
+
+
+def _create_transaction_indexes(connection, names) -> None:
+    """按名称创建 transactions 上的索引（已存在则跳过）"""
+    for index in Transaction.__table__.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def _migrate_v2(connection) -> None:
+    """v2：transactions 热点查询复合索引"""
+    _create_transaction_indexes(connection, (
+        'ix_transactions_product_category_trade',
+        'ix_transactions_account_settle',
+        'ix_transactions_category_product',
+    ))
+
+
+def _migrate_v3(connection) -> None:
+    """v3：增量对账的 dirty 对象表、警告缓存表与缓存参数表"""
+    SQLModel.metadata.create_all(connection, tables=[
+        ReconciliationDirtyObject.__table__,
+        ReconciliationWarningCache.__table__,
+        ReconciliationCacheState.__table__,
+    ])
+
 
+def _migrate_v4(connection) -> None:
+    """v4：transactions 列表排序 / keyset 分页索引"""
+    _create_transaction_indexes(connection, ('ix_transactions_trade_date_id',))
 
-def init_db():
-    """初始化数据库"""
-    engine = create_engine(Config.DATABASE_URL)
-    
-    # 创建所有表
-    SQLModel.metadata.create_all(engine)
-    print("数据库表创建完成")
-    
+
+def _migrate_v5(connection) -> None:
+    """v5：transactions.external_ref（导入去重键）及其唯一索引"""
+    columns = {column['name'] for column in inspect(connection).get_columns(Transaction.__tablename__)}
+    if 'external_ref' not in columns:
+        column_type = Transaction.__table__.c.external_ref.type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(
+            f"ALTER TABLE {Transaction.__tablename__} ADD COLUMN external_ref {column_type}"
+        )
+    _create_transaction_indexes(connection, ('ux_transactions_external_ref',))
+
+
+# 迁移函数登记表：版本号 -> 迁移函数（必须可重复执行）
+MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+    4: _migrate_v4,
+    5: _migrate_v5,
+}
+
+
+def _read_schema_version(conn):
+    """在给定连接上读取 schema 版本，未建版本表时返回 None"""
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return None
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def get_schema_version(engine=None):
+    """读取数据库中记录的 schema 版本，未建版本表时返回 None"""
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        return _read_schema_version(conn)
+
+
+# PostgreSQL advisory lock / MySQL GET_LOCK 使用的迁移锁标识
+_MIGRATION_LOCK_KEY = 'vibe_finance_schema_migration'
+_MIGRATION_LOCK_ID = 0x76666d67  # PostgreSQL advisory lock 需要 bigint
+
+
+@contextmanager
+def _migration_lock(engine):
+    """
+    迁移写锁：多个 worker 同时启动时保证只有一个执行迁移，其余等待后看到最新版本
+
+    - SQLite：BEGIN IMMEDIATE 立即取得数据库写锁（其他连接按 busy_timeout 等待）
+    - PostgreSQL：事务级 advisory lock，提交时自动释放
+    - MySQL：GET_LOCK 命名锁（DDL 会隐式提交，锁需在结束时显式释放）
+    Yields:
+        已持有锁的连接；正常退出时提交，异常时回滚
+    """
+    dialect_name = engine.dialect.name
+    with engine.connect() as conn:
+        if dialect_name == 'sqlite':
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        elif dialect_name == 'postgresql':
+            conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({_MIGRATION_LOCK_ID})")
+        elif dialect_name in ('mysql', 'mariadb'):
+            conn.exec_driver_sql(f"SELECT GET_LOCK('{_MIGRATION_LOCK_KEY}', -1)")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if dialect_name in ('mysql', 'mariadb'):
+                conn.exec_driver_sql(f"SELECT RELEASE_LOCK('{_MIGRATION_LOCK_KEY}')")
+
+
+def migrate_db(engine=None) -> int:
+    """
+    将数据库迁移到 SCHEMA_VERSION
+
+    - 空数据库：按最新模型直接建表并记录为最新版本
+    - 已有数据库：依次执行 当前版本+1 .. SCHEMA_VERSION 的迁移
+    先取得迁移写锁再在锁内重新读取版本，其他进程已完成的迁移不会重复执行，
+    多个 worker 同时启动时调用是安全的。
+    Returns:
+        迁移后的版本号
+    """
+    engine = engine or get_engine()
+
+    with _migration_lock(engine) as conn:
+        current = _read_schema_version(conn)
+        if current is not None and current >= SCHEMA_VERSION:
+            return current
+
+        if current is None and not inspect(conn).get_table_names():
+            SQLModel.metadata.create_all(conn)
+            conn.execute(SchemaVersion.__table__.insert().values(version=SCHEMA_VERSION, applied_at=datetime.utcnow()))
+            log_info("数据库表创建完成", extra={"schema_version": SCHEMA_VERSION})
+            return SCHEMA_VERSION
+
+        for version in range((current or 0) + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[version](conn)
+            conn.execute(SchemaVersion.__table__.insert().values(version=version, applied_at=datetime.utcnow()))
+            log_info("数据库迁移完成", extra={"schema_version": version})
+
+    return SCHEMA_VERSION
+
+
+def init_db(auto_migrate: bool = True):
+    """
+    初始化数据库（应用启动时调用）
+
+    schema 版本与代码一致时直接返回，不做任何表结构反射；
+    版本落后时按 auto_migrate 自动迁移，否则仅记录警告，等待手动执行迁移命令。
+    """
+    engine = get_engine()
+
+    current = get_schema_version(engine)
+    if current == SCHEMA_VERSION:
+        return engine
+
+    if not auto_migrate:
+        log_warning(
+            "数据库 schema 版本落后，请执行 `flask --app run migrate-db`",
+            extra={"current_version": current, "required_version": SCHEMA_VERSION}
+        )
+        return engine
+
+    migrate_db(engine)
     return engine
 
 
 def get_session():
-    """获取数据库会话"""
-    engine = create_engine(Config.DATABASE_URL)
-    return Session(engine)
+    """获取数据库会话（复用进程级引擎的连接池）"""
+    if _session_factory is None:
+        init_engine()
+    return _session_factory()
+
+
+def get_request_session() -> AppSession:
+    """
+    获取请求作用域的数据库会话
+
+    首次调用时才创建会话，同一请求内复用；请求结束时由 close_request_session 关闭。
+    """
+    session = g.get('db_session')
+    if session is None:
+        session = get_session()
+        session.info['unit_of_work'] = g.get('db_unit_of_work', False)
+        g.db_session = session
+    return session
+
+
+def close_request_session(exception=None) -> None:
+    """关闭请求作用域的会话（注册到 teardown_appcontext），未提交的写入会被回滚"""
+    session = g.pop('db_session', None)
+    if session is not None:
+        session.close()
+
+
+def unit_of_work(view):
+    """
+    路由装饰器：开启 unit-of-work 模式
+
+    请求内所有服务层 commit() 合并为一次提交；响应状态码 >= 400 或抛出异常时整体回滚。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_unit_of_work = True
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            session = g.get('db_session')
+            if session is not None:
+                session.rollback()
+            raise
+
+        session = g.get('db_session')
+        if session is not None:
+            if response.status_code < 400:
+                session.commit_unit_of_work()
+            else:
+                session.rollback()
+        return response
+
+    return wrapper
@@ -4,4 +4,11 @@ from .snapshot import Snapshot
 from .transaction import Transaction, TransactionCategory
 from .valuation import ProductValuation
 from .institution import Institution
-from .warning import ReconciliationWarningRecord, WarningStatus
+from .warning import (
+    ReconciliationWarningRecord,
+    WarningStatus,
+    ReconciliationDirtyObject,
+    ReconciliationWarningCache,
+    ReconciliationCacheState,
+)
+from .schema_version import SchemaVersion
@@ -0,0 +1,15 @@
+"""
+数据库 schema 版本模型
+用于启动时快速判断是否需要建表/迁移，避免每次启动都执行 create_all
+"""
+
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+
+
+class SchemaVersion(SQLModel, table=True):
+    """schema 版本记录表（每完成一次迁移写入一行）"""
+    __tablename__ = "schema_version"
+
+    version: int = Field(primary_key=True, description="schema 版本号")
+    applied_at: datetime = Field(default_factory=datetime.utcnow, description="迁移完成时间")
@@ -1,6 +1,6 @@
 from datetime import date
 from typing import Optional
-from sqlmodel import Field, Relationship
+from sqlmodel import Field, Relationship, Index
 from models.base import BaseModel
 
 
@@ -10,6 +10,17 @@ class TransactionCategory:
     REDEEM_REQUEST = "redeem_request"  # 赎回申请
     REDEEM_SETTLE = "redeem_settle"    # 赎回到账
     FEE = "fee"                    # 费用
+    TRANSFER_IN = "transfer_in"    # 转入
+    TRANSFER_OUT = "transfer_out"  # 转出
+    INCOME = "income"              # 收入
+    EXPENSE = "expense"            # 支出
+
+    # 产品交易接口可录入的类型
+    PRODUCT_CATEGORIES = (BUY, REDEEM_REQUEST, REDEEM_SETTLE, FEE)
+
+    # 账户余额口径：增加 / 减少余额的类型（redeem_request 只是申请，不影响余额）
+    CASH_INFLOWS = (TRANSFER_IN, INCOME, REDEEM_SETTLE)
+    CASH_OUTFLOWS = (TRANSFER_OUT, EXPENSE, BUY, FEE)
 
 
 class Transaction(BaseModel, table=True):
@@ -18,6 +29,18 @@ class Transaction(BaseModel, table=True):
     记录产品的所有资金流动事件
     """
     __tablename__ = "transactions"
+    __table_args__ = (
+        # 估值断档检测 / 产品交易列表：product_id + category + trade_date
+        Index("ix_transactions_product_category_trade", "product_id", "category", "trade_date"),
+        # 账户推导余额：account_id + settle_date 区间
+        Index("ix_transactions_account_settle", "account_id", "settle_date"),
+        # 在途赎回 / 未来现金流：按 category 全局筛选（可附加 product_id）
+        Index("ix_transactions_category_product", "category", "product_id"),
+        # 交易列表排序与 keyset 分页：(trade_date DESC, id DESC)
+        Index("ix_transactions_trade_date_id", "trade_date", "id"),
+        # 对账单导入去重：external_ref 唯一（NULL 不参与唯一性判断）
+        Index("ux_transactions_external_ref", "external_ref", unique=True),
+    )
     
     product_id: int = Field(foreign_key="products.id", description="关联产品")
     account_id: int = Field(foreign_key="accounts.id", description="关联账户")
@@ -26,6 +49,7 @@ class Transaction(BaseModel, table=True):
     settle_date: Optional[date] = Field(default=None, description="到账/结算日期")
     amount: float = Field(description="金额（买入为正，卖出为负）")
     note: Optional[str] = Field(default=None, description="备注")
+    external_ref: Optional[str] = Field(default=None, description="外部流水号或导入内容哈希（用于重复导入去重）")
     
     # 关系
     product: Optional["Product"] = Relationship(back_populates="transactions")
@@ -3,9 +3,9 @@
 用于管理警告的 acknowledged/muted 状态
 """
 
-from datetime import datetime
+from datetime import date as DateType, datetime
 from typing import Optional
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Index
 
 
 class WarningStatus(str):
@@ -47,3 +47,57 @@ class ReconciliationWarningRecord(SQLModel, table=True):
     
     class Config:
         arbitrary_types_allowed = True
+
+
+class ReconciliationDirtyObject(SQLModel, table=True):
+    """
+    待重算对账的对象
+
+    写路径（快照、交易、估值、产品/账户维护）在同一事务内登记受影响的账户/产品，
+    读取警告时只重算这些对象并消费登记记录。
+    """
+    __tablename__ = "reconciliation_dirty_objects"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    object_type: str = Field(description="对象类型: account/product")
+    object_id: int = Field(description="对象ID")
+
+
+class ReconciliationWarningCache(SQLModel, table=True):
+    """
+    对账警告缓存表
+
+    按对象持久化计算结果（不含 acknowledged/muted 状态，状态在读取时叠加），
+    只对 dirty 对象重算。
+    """
+    __tablename__ = "reconciliation_warning_cache"
+    __table_args__ = (
+        Index("ix_reconciliation_warning_cache_object", "object_type", "object_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    warning_id: str = Field(description="警告唯一标识")
+    level: str = Field(description="级别: info/warn")
+    type: str = Field(description="警告类型: account_diff/redeem_anomaly/valuation_gap")
+    title: str = Field(description="标题")
+    description: str = Field(description="描述")
+    object_type: str = Field(description="对象类型: account/product")
+    object_id: int = Field(description="对象ID")
+    object_name: str = Field(description="对象名称")
+    date: Optional[DateType] = Field(default=None, description="相关日期")
+    diff_value: Optional[float] = Field(default=None, description="差异值")
+    suggested_action: str = Field(description="建议操作")
+    link_to: str = Field(description="跳转链接")
+
+
+class ReconciliationCacheState(SQLModel, table=True):
+    """
+    对账警告缓存的计算参数（单行）
+
+    参数签名（检查日期、各阈值、计算当天）变化时缓存整体重建。
+    """
+    __tablename__ = "reconciliation_cache_state"
+
+    id: int = Field(default=1, primary_key=True)
+    signature: str = Field(description="计算参数签名")
+    built_at: datetime = Field(default_factory=datetime.utcnow, description="全量重建时间")
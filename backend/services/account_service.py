@@ -4,6 +4,7 @@ from sqlmodel import Session, select, delete, func
 
 from models.account import Account, AccountType
 from models.snapshot import Snapshot
+from services.reconciliation_service import mark_reconciliation_dirty
 
 
 def _default_is_liquid(account_type: AccountType) -> bool:
@@ -31,6 +32,8 @@ def create_account(
         currency=currency,
     )
     session.add(account)
+    session.flush()
+    mark_reconciliation_dirty(session, account_ids=[account.id])
     session.commit()
     session.refresh(account)
     return account
@@ -46,6 +49,7 @@ def delete_account(session: Session, account_id: int) -> None:
     session.exec(statement)
     
     session.delete(account)
+    mark_reconciliation_dirty(session, account_ids=[account_id])
     session.commit()
 
 
@@ -113,6 +117,7 @@ def patch_account(
         account.currency = currency
 
     session.add(account)
+    mark_reconciliation_dirty(session, account_ids=[account_id])
     session.commit()
     session.refresh(account)
     return account
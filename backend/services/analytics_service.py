@@ -1,26 +1,57 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 from datetime import date
 import math
 
-def calculate_metrics(series: List[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+import numpy as np
+
+def _to_columns(series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将估值序列统一为列式 (日期序数, 估值) 两个数组
+
+    支持两种输入：
+    - 列表形式：[{'date': date, 'value': float, ...}, ...]
+    - 列式形式：(dates, values)，dates 可以是 date 列表或 date.toordinal() 数组
+    """
+    if isinstance(series, tuple):
+        dates, values = series
+        if len(dates) and isinstance(dates[0], date):
+            ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+        else:
+            ordinals = np.asarray(dates, dtype=np.int64)
+        return ordinals, np.asarray(values, dtype=np.float64)
+
+    ordinals = np.fromiter((p['date'].toordinal() for p in series), dtype=np.int64, count=len(series))
+    values = np.fromiter((p['value'] for p in series), dtype=np.float64, count=len(series))
+    return ordinals, values
+
+
+def _daily_returns(values: np.ndarray) -> np.ndarray:
+    """日收益率序列：前一日估值 <= 0 时记为 0"""
+    prev = values[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prev > 0, values[1:] / prev - 1, 0.0)
+
+
+def calculate_metrics(series: Union[List[Dict[str, Any]], Tuple[Sequence, Sequence]]) -> Optional[Dict[str, float]]:
     """
     计算收益与风险指标
+
+    series 可以是 [{'date', 'value'}, ...] 列表，也可以是列式的 (dates, values)。
     """
-    if len(series) < 2:
+    if len(series[0] if isinstance(series, tuple) else series) < 2:
         return None
         
-    values = [p['value'] for p in series]
-    dates = [p['date'] for p in series]
+    ordinals, values = _to_columns(series)
     
     # 1. TWR (累计收益率)
-    start_val = values[0]
-    end_val = values[-1]
+    start_val = float(values[0])
+    end_val = float(values[-1])
     if start_val == 0:
         return None
     twr = (end_val / start_val) - 1
     
     # 2. Annualized (年化收益率)
-    days_total = (dates[-1] - dates[0]).days
+    days_total = int(ordinals[-1] - ordinals[0])
     if days_total > 0:
         # (1 + r)^(365/d) - 1
         # 防止负数底数（虽然市值通常为正）
@@ -32,70 +63,38 @@ def calculate_metrics(series: List[Dict[str, Any]]) -> Optional[Dict[str, float]
         annualized = 0.0
         
     # 3. Volatility (年化波动率)
-    # 计算日收益率序列
-    returns = []
-    for i in range(1, len(values)):
-        v_prev = values[i-1]
-        v_curr = values[i]
-        if v_prev > 0:
-            r = (v_curr / v_prev) - 1
-            returns.append(r)
-        else:
-            returns.append(0.0)
-            
+    returns = _daily_returns(values)
     if len(returns) > 1:
-        mean_r = sum(returns) / len(returns)
-        variance = sum((r - mean_r) ** 2 for r in returns) / (len(returns) - 1)
-        std_dev = math.sqrt(variance)
-        volatility = std_dev * math.sqrt(365)
+        volatility = float(np.std(returns, ddof=1)) * math.sqrt(365)
     else:
         volatility = 0.0
         
-    # 4. Max Drawdown (最大回撤) & Recovery Days
-    max_dd = 0.0
-    recovery_days = 0
-    
-    current_peak_val = values[0]
-    current_peak_date = dates[0]
+    # 4. Max Drawdown (最大回撤)
+    # 运行峰值；峰值下标取最近一次严格创新高的位置
+    running_peak = np.maximum.accumulate(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = 1.0 - (values / running_peak)
+    is_new_peak = np.empty(len(values), dtype=bool)
+    is_new_peak[0] = True
+    is_new_peak[1:] = values[1:] > running_peak[:-1]
+    peak_index = np.maximum.accumulate(np.where(is_new_peak, np.arange(len(values)), 0))
     
-    # 记录最大回撤时的信息
-    worst_dd_val = 0.0
-    worst_peak_date = dates[0]
+    # 第一次出现最大回撤的位置
+    worst = int(np.argmax(drawdowns))
+    max_dd = max(float(drawdowns[worst]), 0.0)
     
-    for i, val in enumerate(values):
-        date = dates[i]
-        if val > current_peak_val:
-            current_peak_val = val
-            current_peak_date = date
-        else:
-            dd = 1.0 - (val / current_peak_val)
-            if dd > max_dd:
-                max_dd = dd
-                worst_peak_date = current_peak_date
-                
     # 5. Recovery Days (针对最大回撤)
-    # 寻找从 worst_peak_date 开始，第一次回到 peak_val 的时间
+    # 从最大回撤对应的峰值开始，第一次回到峰值的时间
+    recovery_days = 0
     if max_dd > 0:
-        # 找到 worst_peak_date 对应的 value
-        peak_val = 0
-        start_search_idx = 0
-        for i, d in enumerate(dates):
-            if d == worst_peak_date:
-                peak_val = values[i]
-                start_search_idx = i
-                break
-        
-        recover_date = None
-        for i in range(start_search_idx + 1, len(values)):
-            if values[i] >= peak_val:
-                recover_date = dates[i]
-                break
-                
-        if recover_date:
-            recovery_days = (recover_date - worst_peak_date).days
+        peak = int(peak_index[worst])
+        recovered = values[peak + 1:] >= values[peak]
+        if recovered.any():
+            recover_idx = peak + 1 + int(np.argmax(recovered))
         else:
             # 尚未修复，使用当前天数作为下限
-            recovery_days = (dates[-1] - worst_peak_date).days
+            recover_idx = len(values) - 1
+        recovery_days = int(ordinals[recover_idx] - ordinals[peak])
             
     return {
         "twr": twr * 100,  # 转换为百分比
@@ -104,3 +103,130 @@ def calculate_metrics(series: List[Dict[str, Any]]) -> Optional[Dict[str, float]
         "max_drawdown": max_dd * 100,  # 转换为百分比
         "drawdown_recovery_days": recovery_days
     }
+
+
+def _suffix_drawdowns(values: List[float]):
+    """
+    一次逆序扫描，求出以每个下标 s 为起点的后缀序列的最大回撤及其峰值下标
+
+    以 s 为起点时，峰值保持为 values[s]，直到遇到第一个严格更大的点 g（next greater）；
+    此后的峰值演化与以 g 为起点完全相同，因此：
+        mdd[s] = max(1 - min(values[s:g]) / values[s], mdd[g])
+    相等时取更早的峰值 s（与顺序扫描中 dd > max_dd 才更新的规则一致）。
+    单调栈保证整体 O(n)。
+
+    Returns:
+        (mdd, peak): 两个长度为 n 的列表
+    """
+    n = len(values)
+    mdd = [0.0] * n
+    peak = list(range(n))
+    seg_min = list(values)  # seg_min[s] = min(values[s:next_greater[s]])
+    stack: List[int] = []
+
+    for s in range(n - 1, -1, -1):
+        v = values[s]
+        segment_min = v
+        while stack and values[stack[-1]] <= v:
+            t = stack.pop()
+            if seg_min[t] < segment_min:
+                segment_min = seg_min[t]
+        seg_min[s] = segment_min
+
+        local_dd = 1.0 - (segment_min / v) if v != 0 else 0.0
+        if stack and mdd[stack[-1]] > local_dd:
+            mdd[s] = mdd[stack[-1]]
+            peak[s] = peak[stack[-1]]
+        else:
+            mdd[s] = local_dd
+            peak[s] = s
+        stack.append(s)
+
+    return mdd, peak
+
+
+def _next_greater_or_equal(values: List[float]) -> List[Optional[int]]:
+    """逆序扫描求每个下标之后第一个 >= 它的下标（用于回撤修复天数）"""
+    n = len(values)
+    result: List[Optional[int]] = [None] * n
+    stack: List[int] = []
+    for i in range(n - 1, -1, -1):
+        while stack and values[stack[-1]] < values[i]:
+            stack.pop()
+        result[i] = stack[-1] if stack else None
+        stack.append(i)
+    return result
+
+
+def calculate_metrics_by_window(
+    ordinals,
+    values,
+    window_starts: Dict[str, int]
+) -> Dict[str, Optional[Dict[str, float]]]:
+    """
+    基于同一条最长序列，一次性计算多个窗口的收益与风险指标
+
+    每个窗口是最长序列的一个后缀（window_starts 给出后缀起始下标），
+    结果与对每个窗口的子序列分别调用 calculate_metrics 一致：
+    - 日收益率只计算一次，各窗口的波动率对其后缀切片调用 np.std（两遍算法，
+      与 calculate_metrics 的结果逐位一致；窗口数很少，每个窗口 O(n) 的代价可以忽略）
+    - 最大回撤与修复天数由一次逆序扫描得到所有后缀的结果
+
+    Args:
+        ordinals: 日期序数序列（date.toordinal()）
+        values: 估值序列
+        window_starts: {窗口名: 后缀起始下标}
+    """
+    ordinals = [int(o) for o in ordinals]
+    values = [float(v) for v in values]
+    n = len(values)
+    results: Dict[str, Optional[Dict[str, float]]] = {}
+    if n < 2:
+        return {window: None for window in window_starts}
+
+    # 日收益率（与 calculate_metrics 相同的定义）
+    returns = _daily_returns(np.asarray(values, dtype=np.float64))
+
+    mdd, peak = _suffix_drawdowns(values)
+    recover = _next_greater_or_equal(values)
+
+    for window, s in window_starts.items():
+        if n - s < 2 or values[s] == 0:
+            results[window] = None
+            continue
+
+        start_val = values[s]
+        end_val = values[-1]
+        twr = (end_val / start_val) - 1
+
+        days_total = ordinals[-1] - ordinals[s]
+        if days_total > 0:
+            if end_val / start_val > 0:
+                annualized = (end_val / start_val) ** (365 / days_total) - 1
+            else:
+                annualized = -1.0
+        else:
+            annualized = 0.0
+
+        # 后缀收益率为 returns[s:]；np.std 先求均值再求离差平方和，不会出现平方和相减的抵消误差
+        if n - 1 - s > 1:
+            volatility = float(np.std(returns[s:], ddof=1)) * math.sqrt(365)
+        else:
+            volatility = 0.0
+
+        max_dd = mdd[s]
+        recovery_days = 0
+        if max_dd > 0:
+            p = peak[s]
+            r = recover[p]
+            recovery_days = (ordinals[r] if r is not None else ordinals[-1]) - ordinals[p]
+
+        results[window] = {
+            "twr": twr * 100,
+            "annualized": annualized * 100,
+            "volatility": volatility * 100,
+            "max_drawdown": max_dd * 100,
+            "drawdown_recovery_days": recovery_days
+        }
+
+    return results
@@ -1,13 +1,76 @@
 from datetime import date, timedelta
 from typing import Dict, Any, Optional, List
-from sqlmodel import Session, select
+import numpy as np
+from sqlmodel import Session, select, func
 from models.snapshot import Snapshot
 from models.account import Account
 from models.product import Product
 from models.transaction import Transaction, TransactionCategory
 from services.redeem_service import calculate_pending_redeems, summarize_future_cash_flow, calculate_future_cash_flow
+from utils.computation_context import memoized
 
 
+class CashFlowCalendar:
+    """
+    未来现金流日历（按天分桶）
+
+    - start_date: 第 0 天
+    - daily_inflow: 第 i 天的预计到账合计，float64，长度 horizon + 1
+    - cumulative_inflow: daily_inflow 的前缀和，即截至第 i 天（含）的累计到账
+    - flows: 按日期排序的现金流明细；flow_offsets[i] 为第 i 天首条明细的下标
+
+    构建一次后，任意里程碑的累计到账与期间明细都是 O(1) 查找。
+    """
+    def __init__(self, start_date: date, days: int, flows: List[Dict[str, Any]]):
+        horizon = max(days, 0)
+        self.start_date = start_date
+        self.flows = flows
+
+        start_ordinal = start_date.toordinal()
+        day_index = np.fromiter(
+            (date.fromisoformat(flow["date"]).toordinal() - start_ordinal for flow in flows),
+            dtype=np.int64,
+            count=len(flows)
+        )
+        amounts = np.fromiter((flow["amount"] for flow in flows), dtype=np.float64, count=len(flows))
+
+        self.daily_inflow = np.bincount(day_index, weights=amounts, minlength=horizon + 1)
+        self.cumulative_inflow = np.cumsum(self.daily_inflow)
+        self.flow_offsets = np.searchsorted(day_index, np.arange(horizon + 2), side='left')
+
+    @property
+    def horizon(self) -> int:
+        return len(self.daily_inflow) - 1
+
+    def accumulated(self, days: int) -> float:
+        """截至第 days 天（含）的累计到账"""
+        if days < 0:
+            return 0.0
+        return float(self.cumulative_inflow[min(days, self.horizon)])
+
+    def changes(self, days: int) -> List[Dict[str, Any]]:
+        """第 1 天到第 days 天（含）之间的现金流明细（不含当天）"""
+        if days <= 0:
+            return []
+        end = int(self.flow_offsets[min(days, self.horizon) + 1])
+        return self.flows[int(self.flow_offsets[1]):end]
+
+    def dates(self) -> List[date]:
+        return [self.start_date + timedelta(days=i) for i in range(self.horizon + 1)]
+
+
+@memoized
+def build_cash_flow_calendar(
+    session: Session,
+    start_date: date,
+    days: int
+) -> CashFlowCalendar:
+    """基于在途赎回与定期到期预测，构建 [start_date, start_date + days] 的现金流日历"""
+    flows = calculate_future_cash_flow(session, start_date=start_date, days=days)
+    return CashFlowCalendar(start_date, days, flows)
+
+
+@memoized
 def calculate_locked_in_products(session: Session) -> Dict[str, Any]:
     """
     计算锁定在产品中的资金总额
@@ -23,46 +86,46 @@ def calculate_locked_in_products(session: Session) -> Dict[str, Any]:
     """
     from models.valuation import ProductValuation
     
-    # 查询每个产品的最新估值
+    # 子查询：每个产品的最新估值日期（与 product_service.get_latest_valuations 相同的分组取最大日期模式）
+    latest_dates = (
+        select(
+            ProductValuation.product_id,
+            func.max(ProductValuation.date).label('max_date')
+        )
+        .group_by(ProductValuation.product_id)
+        .subquery()
+    )
+    
+    # 主查询：一次取回所有产品及其最新估值，查询数不随产品数量增长
     stmt = (
-        select(Product, ProductValuation.market_value)
+        select(
+            Product.id,
+            Product.name,
+            Product.liquidity_rule,
+            Product.term_days,
+            ProductValuation.market_value
+        )
+        .join(latest_dates, Product.id == latest_dates.c.product_id)
         .join(
             ProductValuation,
-            Product.id == ProductValuation.product_id
-        )
-        .where(
-            ProductValuation.date == (
-                select(ProductValuation.date)
-                .where(ProductValuation.product_id == Product.id)
-                .order_by(ProductValuation.date.desc())
-                .limit(1)
-            )
+            (ProductValuation.product_id == latest_dates.c.product_id) &
+            (ProductValuation.date == latest_dates.c.max_date)
         )
+        .order_by(Product.id)
     )
     
-    # 简化处理：查询所有产品和最新估值
-    products = session.exec(select(Product)).all()
-    
     total_locked = 0.0
     by_product = []
     
-    for product in products:
-        # 获取产品最新估值
-        latest_valuation = session.exec(
-            select(ProductValuation)
-            .where(ProductValuation.product_id == product.id)
-            .order_by(ProductValuation.date.desc())
-            .limit(1)
-        ).first()
-        
-        if latest_valuation and latest_valuation.market_value:
-            total_locked += latest_valuation.market_value
+    for product_id, product_name, liquidity_rule, term_days, market_value in session.exec(stmt).all():
+        if market_value:
+            total_locked += market_value
             by_product.append({
-                "product_id": product.id,
-                "product_name": product.name,
-                "market_value": latest_valuation.market_value,
-                "liquidity_rule": product.liquidity_rule.value,
-                "term_days": product.term_days
+                "product_id": product_id,
+                "product_name": product_name,
+                "market_value": market_value,
+                "liquidity_rule": liquidity_rule.value,
+                "term_days": term_days
             })
     
     return {
@@ -112,9 +175,8 @@ def calculate_cash_timeline(
         "locked_in_products": locked["total_locked"]
     }
     
-    # 2. 计算未来现金流（最长到最大里程碑）
-    max_days = max(milestones)
-    future_flows = calculate_future_cash_flow(session, start_date=today, days=max_days)
+    # 2. 构建现金流日历（最长到最大里程碑）
+    calendar = build_cash_flow_calendar(session, today, max(milestones))
     
     # 3. 构建里程碑视图
     milestone_list = []
@@ -122,29 +184,20 @@ def calculate_cash_timeline(
     for days in milestones:
         milestone_date = today + timedelta(days=days)
         
-        # 统计到这个里程碑日期为止的预计到账
-        accumulated = sum(
-            flow["amount"] 
-            for flow in future_flows 
-            if date.fromisoformat(flow["date"]) <= milestone_date
-        )
+        # 到这个里程碑日期为止的预计到账
+        accumulated = calendar.accumulated(days)
         
         # 预计可用现金 = 当前可用 + 累计到账
         projected_available = cash_summary["real_available"] + accumulated
         
-        # 这个里程碑期间的变化
-        changes = [
-            flow for flow in future_flows
-            if today < date.fromisoformat(flow["date"]) <= milestone_date
-        ]
-        
         milestone_list.append({
             "date": milestone_date.isoformat(),
             "label": f"+{days}天",
             "days_from_now": days,
             "projected_available_cash": projected_available,
             "accumulated_inflow": accumulated,
-            "changes": changes
+            # 这个里程碑期间的变化
+            "changes": calendar.changes(days)
         })
     
     return {
@@ -153,6 +206,7 @@ def calculate_cash_timeline(
     }
 
 
+@memoized
 def calculate_available_cash(
     session: Session,
     target_date: Optional[date] = None
@@ -232,6 +286,7 @@ def calculate_available_cash(
     }
 
 
+@memoized
 def get_cash_summary(
     session: Session,
     target_date: Optional[date] = None
@@ -253,29 +308,63 @@ def get_cash_summary(
     # 计算可用现金
     available_cash = calculate_available_cash(session, target_date)
     
-    # 计算未来现金流（统一计算 7/30/90 天）
-    today = date.today()
-    future_flows_90d = calculate_future_cash_flow(session, start_date=today, days=90)
-    
-    date_7d = today + timedelta(days=7)
-    date_30d = today + timedelta(days=30)
-    
-    total_7d = sum(
-        flow["amount"] for flow in future_flows_90d 
-        if date.fromisoformat(flow["date"]) <= date_7d
-    )
-    total_30d = sum(
-        flow["amount"] for flow in future_flows_90d 
-        if date.fromisoformat(flow["date"]) <= date_30d
-    )
-    total_90d = sum(flow["amount"] for flow in future_flows_90d)
+    # 计算未来现金流（统一基于 90 天日历）
+    calendar = build_cash_flow_calendar(session, date.today(), 90)
     
     return {
         "date": available_cash["date"],
         "base_available": available_cash["base_available"],
         "pending_redeems": available_cash["pending_redeems"],
         "real_available": available_cash["real_available"],
-        "future_7d": total_7d,
-        "future_30d": total_30d,
-        "future_90d": total_90d,
+        "future_7d": calendar.accumulated(7),
+        "future_30d": calendar.accumulated(30),
+        "future_90d": calendar.accumulated(90),
+    }
+
+
+def calculate_cash_curve(
+    session: Session,
+    days: int = 90
+) -> Dict[str, Any]:
+    """
+    计算逐日预计可用现金曲线（用于图表）
+    
+    预计可用现金 = 当前实际可用现金 + 截至当天的累计预计到账
+    
+    Returns:
+        {
+            "start_date": str,
+            "available_cash": float,
+            "points": [
+                {"date", "inflow", "accumulated_inflow", "projected_available_cash"},
+                ...
+            ]
+        }
+    """
+    today = date.today()
+    available_cash = calculate_available_cash(session)
+    calendar = build_cash_flow_calendar(session, today, days)
+    
+    base = available_cash["real_available"]
+    projected = base + calendar.cumulative_inflow
+    
+    points = [
+        {
+            "date": day.isoformat(),
+            "inflow": inflow,
+            "accumulated_inflow": accumulated,
+            "projected_available_cash": value
+        }
+        for day, inflow, accumulated, value in zip(
+            calendar.dates(),
+            calendar.daily_inflow.tolist(),
+            calendar.cumulative_inflow.tolist(),
+            projected.tolist()
+        )
+    ]
+    
+    return {
+        "start_date": today.isoformat(),
+        "available_cash": base,
+        "points": points
     }
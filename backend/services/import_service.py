@@ -0,0 +1,355 @@
+"""
+流式导入服务
+逐行解析 CSV / NDJSON 请求体，按固定块大小交给现有的批量 upsert 服务写入，
+内存占用与文件大小无关（只保留当前块和有限条错误信息）。
+"""
+
+import csv
+import io
+import json
+from datetime import date
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+
+from models.account import Account
+from models.product import Product
+from services.snapshot_service import batch_upsert_snapshots
+from services.valuation_service import batch_upsert_valuations
+from utils.bulk_upsert import select_in_chunks
+from utils.logger import log_error, log_info, log_warning
+from utils.response import err_safe
+
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+
+# 请求体 Content-Type 与导入格式的对应关系
+_MIMETYPE_FORMATS = {
+    'text/csv': FORMAT_CSV,
+    'application/csv': FORMAT_CSV,
+    'application/x-ndjson': FORMAT_NDJSON,
+    'application/ndjson': FORMAT_NDJSON,
+    'application/jsonl': FORMAT_NDJSON,
+    'application/x-jsonlines': FORMAT_NDJSON,
+}
+
+# 响应中最多返回的逐行错误 / 警告条数（其余只计数）
+MAX_REPORTED_ERRORS = 100
+
+SNAPSHOT_COLUMNS = ('date', 'account_id', 'balance')
+VALUATION_COLUMNS = ('product_id', 'date', 'market_value')
+
+# 逐块进度包含的汇总字段
+PROGRESS_FIELDS = ('chunks', 'lines', 'accepted', 'inserted', 'updated', 'error_count')
+
+# (行号, 记录, 解析错误)：记录与错误二者只有一个非空
+Record = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def detect_import_format(mimetype: Optional[str], format_param: Optional[str] = None) -> Optional[str]:
+    """根据 ?format= 参数（优先）或 Content-Type 判断导入格式，无法识别时返回 None"""
+    if format_param:
+        format_param = format_param.lower()
+        return format_param if format_param in (FORMAT_CSV, FORMAT_NDJSON) else None
+    return _MIMETYPE_FORMATS.get((mimetype or '').lower())
+
+
+def _text_stream(stream) -> io.TextIOWrapper:
+    # utf-8-sig 兼容 Excel 导出的 BOM；newline='' 交给 csv 模块处理引号内换行
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def iter_csv_records(stream, required_columns: Tuple[str, ...]) -> Iterator[Record]:
+    """
+    逐行读取带表头的 CSV
+
+    表头在调用时立即读取并校验（流式返回进度前即可报 400），数据行按需读取。
+    解码按块进行，读取表头时遇到的坏字节可能位于后续行，因此不报 400，
+    而是在读取第一行时重新抛出，由 iter_stream_import 记为 stream_error。
+
+    Raises:
+        ValueError: 表头缺少必需列
+    """
+    reader = csv.reader(_text_stream(stream))
+    try:
+        header = next(reader, None)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return _iter_failed_read(e)
+    if header is None:
+        return iter(())
+    header = [column.strip() for column in header]
+    missing = [column for column in required_columns if column not in header]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    return _iter_csv_rows(reader, header)
+
+
+def _iter_failed_read(error: Exception) -> Iterator[Record]:
+    raise error
+    yield
+
+
+def _iter_csv_rows(reader, header: List[str]) -> Iterator[Record]:
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        if len(values) != len(header):
+            yield reader.line_num, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield reader.line_num, dict(zip(header, values)), None
+
+
+def iter_ndjson_records(stream) -> Iterator[Record]:
+    """逐行读取 NDJSON（每行一个 JSON 对象，空行忽略）"""
+    for line_no, line in enumerate(_text_stream(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None, "invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "line must be a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def _require(record: Dict[str, Any], field: str) -> Any:
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError(f"{field} is required")
+    return value.strip() if isinstance(value, str) else value
+
+
+def _parse_date(record: Dict[str, Any], field: str) -> date:
+    value = _require(record, field)
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid {field} format")
+
+
+def _parse_int(record: Dict[str, Any], field: str) -> int:
+    value = _require(record, field)
+    if isinstance(value, bool):
+        raise ValueError(f"invalid {field}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid {field}")
+
+
+def _parse_float(record: Dict[str, Any], field: str) -> float:
+    value = _require(record, field)
+    if isinstance(value, bool):
+        raise ValueError(f"invalid {field}")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid {field}")
+
+
+def parse_snapshot_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """校验并规范化一行快照数据，不合法时抛出 ValueError"""
+    return {
+        "date": _parse_date(record, 'date'),
+        "account_id": _parse_int(record, 'account_id'),
+        "balance": _parse_float(record, 'balance'),
+    }
+
+
+def parse_valuation_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """校验并规范化一行估值数据，不合法时抛出 ValueError"""
+    return {
+        "product_id": _parse_int(record, 'product_id'),
+        "date": _parse_date(record, 'date'),
+        "market_value": _parse_float(record, 'market_value'),
+    }
+
+
+def iter_stream_import(
+    records: Iterator[Record],
+    parse_record: Callable[[Dict[str, Any]], Dict[str, Any]],
+    upsert_chunk: Callable[[List[Dict[str, Any]]], Tuple[int, int, List[str]]],
+    chunk_size: int,
+    label: str,
+    ref_field: str,
+    existing_refs: Callable[[Iterable[int]], Set[int]]
+) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+    """
+    分块导入（生成器）
+
+    每凑满 chunk_size 行调用一次 upsert_chunk（由其提交），已写入的块不会因后续错误回滚。
+    每写入一块产出一次进度 {"chunks", "lines", "accepted", "inserted", "updated", "error_count"}，
+    生成器的返回值为导入汇总。
+    写入前按块一次性查询 ref_field 引用的对象（账户 / 产品）是否存在，不存在的行按行号记为错误、不写入。
+    请求体解码失败或 CSV 格式损坏时停止读取，已读出的合法行照常写入，错误记在 stream_error。
+    同一键在不同块中重复出现时，按块分别计入 inserted / updated。
+
+    汇总格式：
+        {
+            "lines": int,          # 读取的数据行数
+            "accepted": int,       # 通过校验、交给 upsert 的行数
+            "chunks": int,
+            "inserted": int,
+            "updated": int,
+            "error_count": int,
+            "errors": [{"line": int, "error": str}, ...],   # 最多 MAX_REPORTED_ERRORS 条
+            "warning_count": int,
+            "warnings": [str, ...],                         # 最多 MAX_REPORTED_ERRORS 条
+            "stream_error": {"after_line": int, "error": str} | None   # 请求体无法继续读取时
+        }
+    """
+    summary = {
+        "lines": 0,
+        "accepted": 0,
+        "chunks": 0,
+        "inserted": 0,
+        "updated": 0,
+        "error_count": 0,
+        "errors": [],
+        "warning_count": 0,
+        "warnings": [],
+        "stream_error": None,
+    }
+    # (行号, 规范化后的记录)
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    records = iter(records)
+
+    def add_error(line_no: int, error: str) -> None:
+        summary["error_count"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line_no, "error": error})
+
+    def flush() -> Dict[str, Any]:
+        known = existing_refs({row[ref_field] for _, row in chunk})
+        rows = []
+        for line_no, row in chunk:
+            if row[ref_field] in known:
+                rows.append(row)
+            else:
+                add_error(line_no, f"{ref_field} {row[ref_field]} not found")
+        chunk.clear()
+
+        inserted, updated, warnings = upsert_chunk(rows) if rows else (0, 0, [])
+        summary["chunks"] += 1
+        summary["accepted"] += len(rows)
+        summary["inserted"] += inserted
+        summary["updated"] += updated
+        summary["warning_count"] += len(warnings)
+        room = MAX_REPORTED_ERRORS - len(summary["warnings"])
+        summary["warnings"].extend(warnings[:max(room, 0)])
+        progress = {key: summary[key] for key in PROGRESS_FIELDS}
+        log_info(f"{label} 导入进度", extra=progress)
+        return progress
+
+    while True:
+        # 请求体按需解码：坏字节 / CSV 语法错误在读取中途才会抛出，此时之前的块已提交，
+        # 记为流错误并停止读取，仍返回汇总让调用方知道已写入多少
+        try:
+            line_no, record, error = next(records)
+        except StopIteration:
+            break
+        except (UnicodeDecodeError, csv.Error) as e:
+            summary["error_count"] += 1
+            summary["stream_error"] = {"after_line": summary["lines"], "error": str(e)}
+            log_warning(f"{label} 导入读取中断", extra={"lines": summary["lines"], "error": str(e)})
+            break
+
+        summary["lines"] += 1
+        if error is None:
+            try:
+                chunk.append((line_no, parse_record(record)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            add_error(line_no, error)
+            continue
+        if len(chunk) >= chunk_size:
+            yield flush()
+
+    if chunk:
+        yield flush()
+    return summary
+
+
+def drain_import(progress: Generator[Dict[str, Any], None, Dict[str, Any]]) -> Dict[str, Any]:
+    """执行完整个导入，丢弃逐块进度，返回汇总"""
+    while True:
+        try:
+            next(progress)
+        except StopIteration as stop:
+            return stop.value
+
+
+def ndjson_progress_lines(
+    progress: Generator[Dict[str, Any], None, Dict[str, Any]],
+    fmt: str,
+    log_message: str,
+    endpoint: str
+) -> Iterator[str]:
+    """
+    把导入过程转为 NDJSON 响应行（用于流式响应，客户端边上传边收到进度）
+
+    每写入一块输出 {"type": "progress", ...}，结束时输出 {"type": "summary", "data": {...汇总, "format"}}；
+    响应已开始发送后状态码无法再改变，中途异常记录日志并以 {"type": "error", ...} 行结束。
+    """
+    while True:
+        try:
+            item = next(progress)
+        except StopIteration as stop:
+            yield json.dumps({"type": "summary", "data": dict(stop.value, format=fmt)}, ensure_ascii=False) + "\n"
+            return
+        except Exception as e:
+            log_error(log_message, error=e, extra={"endpoint": endpoint, "format": fmt})
+            yield json.dumps(dict(err_safe(e, code=500), type="error"), ensure_ascii=False) + "\n"
+            return
+        yield json.dumps(dict(item, type="progress")) + "\n"
+
+
+def _existing_ids(session: Session, id_column) -> Callable[[Iterable[int]], Set[int]]:
+    return lambda ids: set(select_in_chunks(session, select(id_column), id_column, ids))
+
+
+def _iter_records(stream, fmt: str, columns: Tuple[str, ...]) -> Iterator[Record]:
+    if fmt == FORMAT_CSV:
+        return iter_csv_records(stream, columns)
+    return iter_ndjson_records(stream)
+
+
+def iter_import_snapshots(
+    session: Session, stream, fmt: str, chunk_size: int
+) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+    """流式导入账户快照（CSV 列：date, account_id, balance），逐块产出进度，返回汇总"""
+    records = _iter_records(stream, fmt, SNAPSHOT_COLUMNS)
+    return iter_stream_import(
+        records,
+        parse_snapshot_record,
+        lambda rows: batch_upsert_snapshots(session, rows),
+        chunk_size,
+        label="快照",
+        ref_field="account_id",
+        existing_refs=_existing_ids(session, Account.id)
+    )
+
+
+def iter_import_valuations(
+    session: Session, stream, fmt: str, chunk_size: int
+) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+    """流式导入产品估值（CSV 列：product_id, date, market_value），逐块产出进度，返回汇总"""
+    def upsert_chunk(rows: List[Dict[str, Any]]) -> Tuple[int, int, List[str]]:
+        result = batch_upsert_valuations(session, rows)
+        return result["inserted"], result["updated"], result["warnings"]
+
+    records = _iter_records(stream, fmt, VALUATION_COLUMNS)
+    return iter_stream_import(
+        records,
+        parse_valuation_record,
+        upsert_chunk,
+        chunk_size,
+        label="估值",
+        ref_field="product_id",
+        existing_refs=_existing_ids(session, Product.id)
+    )
@@ -4,6 +4,7 @@ from sqlmodel import Session, select, delete, func, asc
 from models.product import Product, ProductType, LiquidityRule, ValuationMode
 from models.institution import Institution
 from models.valuation import ProductValuation
+from services.reconciliation_service import mark_reconciliation_dirty
 
 
 def create_product(
@@ -30,6 +31,8 @@ def create_product(
         note=note,
     )
     session.add(product)
+    session.flush()
+    mark_reconciliation_dirty(session, product_ids=[product.id])
     session.commit()
     session.refresh(product)
     return product
@@ -45,6 +48,7 @@ def delete_product(session: Session, product_id: int) -> None:
     session.exec(statement)
     
     session.delete(product)
+    mark_reconciliation_dirty(session, product_ids=[product_id])
     session.commit()
 
 
@@ -142,6 +146,7 @@ def patch_product(
         product.valuation_mode = valuation_mode
 
     session.add(product)
+    mark_reconciliation_dirty(session, product_ids=[product_id])
     session.commit()
     session.refresh(product)
     return product
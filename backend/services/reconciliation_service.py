@@ -3,18 +3,30 @@
 提供账户对账、赎回一致性检查、估值断档检测等功能
 """
 
-from datetime import date, timedelta
-from typing import List, Dict, Any, Optional
+from datetime import date, datetime, timedelta
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Optional
 from decimal import Decimal
 
-from sqlmodel import Session, select, func
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlmodel import Session, select, func, case, delete
 
 from models.snapshot import Snapshot
 from models.transaction import Transaction, TransactionCategory
 from models.product import Product
 from models.valuation import ProductValuation
 from models.account import Account
-from models.warning import ReconciliationWarningRecord, WarningStatus
+from models.warning import (
+    ReconciliationWarningRecord,
+    WarningStatus,
+    ReconciliationDirtyObject,
+    ReconciliationWarningCache,
+    ReconciliationCacheState,
+)
+from utils.bulk_upsert import upsert_rows
+from utils.logger import log_warning
 
 
 class AccountDiffItem:
@@ -178,6 +190,80 @@ class ReconciliationWarning:
         }
 
 
+def _signed_cash_flow():
+    """
+    交易对账户余额的影响（带符号的金额）
+    - transfer_in / income / redeem_settle: +amount
+    - transfer_out / expense / buy / fee: -amount
+    - redeem_request 不影响账户余额（只是申请）
+    """
+    return case(
+        (Transaction.category.in_(TransactionCategory.CASH_INFLOWS), Transaction.amount),
+        (Transaction.category.in_(TransactionCategory.CASH_OUTFLOWS), -Transaction.amount),
+        else_=0.0
+    )
+
+
+def calculate_account_derived_balances(
+    session: Session,
+    target_date: date,
+    account_ids: Optional[List[int]] = None
+) -> Dict[int, float]:
+    """
+    批量计算账户的推导余额（基于 Transaction 现金流累计），一次查询完成
+
+    逻辑：
+    - 每个账户 target_date 之前最新的 Snapshot 作为期初（分组 MAX(date) 子查询）
+    - 累计 (期初日期, target_date] 期间按 settle_date 到账的现金流（分组 SUM）
+
+    Args:
+        account_ids: 只计算这些账户，默认全部
+
+    Returns:
+        {account_id: 推导余额}；没有期初快照的账户不在结果中
+    """
+    opening_dates = select(
+        Snapshot.account_id,
+        func.max(Snapshot.date).label('opening_date')
+    ).where(Snapshot.date <= target_date)
+    if account_ids is not None:
+        opening_dates = opening_dates.where(Snapshot.account_id.in_(account_ids))
+    opening_dates = opening_dates.group_by(Snapshot.account_id).subquery()
+
+    opening = select(
+        Snapshot.account_id,
+        Snapshot.date.label('opening_date'),
+        Snapshot.balance.label('opening_balance')
+    ).join(
+        opening_dates,
+        (Snapshot.account_id == opening_dates.c.account_id) &
+        (Snapshot.date == opening_dates.c.opening_date)
+    ).subquery()
+
+    cash_flows = select(
+        Transaction.account_id,
+        func.sum(_signed_cash_flow()).label('cash_flow')
+    ).join(
+        opening, Transaction.account_id == opening.c.account_id
+    ).where(
+        Transaction.settle_date > opening.c.opening_date,
+        Transaction.settle_date <= target_date
+    ).group_by(Transaction.account_id).subquery()
+
+    rows = session.exec(
+        select(
+            opening.c.account_id,
+            opening.c.opening_balance,
+            func.coalesce(cash_flows.c.cash_flow, 0.0)
+        ).outerjoin(cash_flows, cash_flows.c.account_id == opening.c.account_id)
+    ).all()
+
+    return {
+        account_id: float(opening_balance) + float(cash_flow)
+        for account_id, opening_balance, cash_flow in rows
+    }
+
+
 def calculate_account_derived_balance(
     session: Session,
     account_id: int,
@@ -189,103 +275,147 @@ def calculate_account_derived_balance(
     逻辑：
     - 找到 target_date 之前最新的 Snapshot 作为期初
     - 累计从期初日期+1 到 target_date 的所有现金流
+    - 没有期初快照时无法计算，返回 0
     """
-    # 1. 找到期初 Snapshot（target_date 之前最新的）
-    opening_snapshot = session.exec(
-        select(Snapshot)
-        .where(Snapshot.account_id == account_id)
-        .where(Snapshot.date <= target_date)
-        .order_by(Snapshot.date.desc())
-        .limit(1)
-    ).first()
-
-    if not opening_snapshot:
-        # 没有期初快照，无法计算
-        return 0.0
-
-    opening_balance = float(opening_snapshot.balance)
-    opening_date = opening_snapshot.date
-
-    # 2. 如果 target_date 就是 opening_date，直接返回
-    if opening_date == target_date:
-        return opening_balance
-
-    # 3. 累计 (opening_date, target_date] 期间的现金流
-    # 影响账户余额的交易类型：
-    # - transfer_in: +amount
-    # - transfer_out: -amount
-    # - income: +amount
-    # - expense: -amount
-    # - buy: -amount（从账户扣款）
-    # - redeem_settle: +amount（到账）
-    # - fee: -amount
-
-    transactions = session.exec(
-        select(Transaction)
-        .where(Transaction.account_id == account_id)
-        .where(Transaction.settle_date > opening_date)
-        .where(Transaction.settle_date <= target_date)
-    ).all()
-
-    cash_flow = 0.0
-    for tx in transactions:
-        amount = float(tx.amount)
-        if tx.category in [
-            TransactionCategory.TRANSFER_IN,
-            TransactionCategory.INCOME,
-            TransactionCategory.REDEEM_SETTLE
-        ]:
-            cash_flow += amount
-        elif tx.category in [
-            TransactionCategory.TRANSFER_OUT,
-            TransactionCategory.EXPENSE,
-            TransactionCategory.BUY,
-            TransactionCategory.FEE
-        ]:
-            cash_flow -= amount
-        # redeem_request 不影响账户余额（只是申请）
-
-    return opening_balance + cash_flow
+    balances = calculate_account_derived_balances(session, target_date, [account_id])
+    return balances.get(account_id, 0.0)
 
 
 def check_account_diffs(
     session: Session,
     target_date: Optional[date] = None,
-    threshold: float = 1.0
+    threshold: float = 1.0,
+    account_ids: Optional[List[int]] = None
 ) -> List[AccountDiffItem]:
     """
     检查账户对账差异（S6-2）
     
+    只检查 target_date 当天有快照的账户；快照与推导余额均为集合查询，
+    查询次数与账户数量无关。
+    
     Args:
         target_date: 检查日期，默认今天
         threshold: 差异阈值，默认 1 元
+        account_ids: 只检查这些账户，默认全部
     """
     if target_date is None:
         target_date = date.today()
 
     results = []
 
-    # 获取所有账户
-    accounts = session.exec(select(Account)).all()
+    # target_date 当天有快照的账户
+    statement = (
+        select(Account.id, Account.name, Snapshot.balance)
+        .join(Snapshot, Snapshot.account_id == Account.id)
+        .where(Snapshot.date == target_date)
+    )
+    if account_ids is not None:
+        statement = statement.where(Account.id.in_(account_ids))
+    snapshots = session.exec(statement.order_by(Account.id)).all()
+    if not snapshots:
+        return results
+
+    # 推导余额
+    derived_balances = calculate_account_derived_balances(session, target_date, account_ids)
+
+    for account_id, account_name, balance in snapshots:
+        derived = derived_balances.get(account_id, 0.0)
+        snapshot_balance = float(balance)
+        diff = snapshot_balance - derived
 
-    for account in accounts:
-        # 获取 target_date 的 Snapshot
-        snapshot = session.exec(
-            select(Snapshot)
-            .where(Snapshot.account_id == account.id)
-            .where(Snapshot.date == target_date)
-        ).first()
+        # 判断差异
+        if abs(diff) > threshold:
+            severity = 'warn'
+            hint = _generate_account_diff_hint(diff)
+        else:
+            severity = 'info'
+            hint = "余额一致"
 
-        if not snapshot:
-            # 该日期没有快照，跳过（或生成缺失提示）
+        results.append(AccountDiffItem(
+            account_id=account_id,
+            account_name=account_name,
+            check_date=target_date,
+            snapshot_balance=snapshot_balance,
+            derived_balance=derived,
+            diff=diff,
+            severity=severity,
+            hint=hint
+        ))
+
+    return results
+
+
+def check_account_diffs_range(
+    session: Session,
+    from_date: date,
+    to_date: date,
+    threshold: float = 1.0,
+    account_ids: Optional[List[int]] = None
+) -> List[AccountDiffItem]:
+    """
+    区间对账：对 [from_date, to_date] 内每个快照日期输出一行差异
+
+    每个账户以 from_date 之前（含）最新的 Snapshot 为期初（没有则以区间内第一个快照为期初），
+    按日期顺序流式合并该账户的快照与已到账现金流，维护滚动推导余额：
+    推导余额 = 期初余额 + (期初日期, 快照日期] 内的现金流累计。
+    区间首日的结果与单日检查一致；查询次数固定，计算量为 O(快照数 + 交易数)。
+    """
+    opening_dates = select(
+        Snapshot.account_id,
+        func.max(Snapshot.date).label('opening_date')
+    ).where(Snapshot.date <= from_date).group_by(Snapshot.account_id).subquery()
+    start_date = func.coalesce(opening_dates.c.opening_date, from_date)
+
+    # 期初快照及区间内全部快照，按 (账户, 日期) 排序
+    snapshot_statement = (
+        select(Snapshot.account_id, Snapshot.date, Account.name, Snapshot.balance)
+        .join(Account, Account.id == Snapshot.account_id)
+        .outerjoin(opening_dates, opening_dates.c.account_id == Snapshot.account_id)
+        .where(Snapshot.date >= start_date, Snapshot.date <= to_date)
+    )
+    # 期初之后到账的现金流，按 (账户, 到账日) 汇总
+    flow_statement = (
+        select(Transaction.account_id, Transaction.settle_date, func.sum(_signed_cash_flow()))
+        .outerjoin(opening_dates, opening_dates.c.account_id == Transaction.account_id)
+        .where(Transaction.settle_date > start_date, Transaction.settle_date <= to_date)
+    )
+    if account_ids is not None:
+        snapshot_statement = snapshot_statement.where(Snapshot.account_id.in_(account_ids))
+        flow_statement = flow_statement.where(Transaction.account_id.in_(account_ids))
+
+    snapshots = session.exec(snapshot_statement.order_by(Snapshot.account_id, Snapshot.date))
+    flows = session.exec(
+        flow_statement
+        .group_by(Transaction.account_id, Transaction.settle_date)
+        .order_by(Transaction.account_id, Transaction.settle_date)
+    )
+
+    # 同一天先计入现金流再核对快照（与单日检查的 (期初, 目标日] 区间一致）
+    events = heapq.merge(
+        ((account_id, day, 0, amount, None) for account_id, day, amount in flows),
+        ((account_id, day, 1, balance, name) for account_id, day, name, balance in snapshots),
+    )
+
+    results = []
+    current_account = None
+    derived = None
+    for account_id, day, kind, amount, account_name in events:
+        if account_id != current_account:
+            current_account = account_id
+            derived = None
+        if kind == 0:
+            if derived is not None:
+                derived += float(amount)
             continue
 
-        # 计算推导余额
-        derived = calculate_account_derived_balance(session, account.id, target_date)
-        snapshot_balance = float(snapshot.balance)
-        diff = snapshot_balance - derived
+        snapshot_balance = float(amount)
+        if derived is None:
+            # 期初快照
+            derived = snapshot_balance
+        if day < from_date:
+            continue
 
-        # 判断差异
+        diff = snapshot_balance - derived
         if abs(diff) > threshold:
             severity = 'warn'
             hint = _generate_account_diff_hint(diff)
@@ -294,9 +424,9 @@ def check_account_diffs(
             hint = "余额一致"
 
         results.append(AccountDiffItem(
-            account_id=account.id,
-            account_name=account.name,
-            check_date=target_date,
+            account_id=account_id,
+            account_name=account_name,
+            check_date=day,
             snapshot_balance=snapshot_balance,
             derived_balance=derived,
             diff=diff,
@@ -317,43 +447,47 @@ def _generate_account_diff_hint(diff: float) -> str:
 
 def check_redeem_consistency(
     session: Session,
-    buffer_days: int = 3
+    buffer_days: int = 3,
+    product_ids: Optional[List[int]] = None
 ) -> List[RedeemCheckItem]:
     """
     检查赎回在途一致性（S6-3）
     
+    按产品分组聚合赎回申请/到账，整个检查只需一次查询。
+    
     Args:
         buffer_days: 缓冲天数，默认 3 天
+        product_ids: 只检查这些产品，默认全部
     """
     results = []
     today = date.today()
 
-    # 获取所有产品
-    products = session.exec(select(Product)).all()
-
-    for product in products:
-        # 计算在途金额
-        requests = session.exec(
-            select(Transaction)
-            .where(Transaction.product_id == product.id)
-            .where(Transaction.category == TransactionCategory.REDEEM_REQUEST)
-        ).all()
-
-        settles = session.exec(
-            select(Transaction)
-            .where(Transaction.product_id == product.id)
-            .where(Transaction.category == TransactionCategory.REDEEM_SETTLE)
-        ).all()
-
-        total_request = sum(float(r.amount) for r in requests)
-        total_settle = sum(float(s.amount) for s in settles)
-        pending = total_request - total_settle
-
-        # 获取最新申请日期
-        latest_request = max(
-            (r.trade_date for r in requests),
-            default=None
+    # 一次分组聚合：每个产品的申请总额、到账总额、最新申请日期
+    is_request = Transaction.category == TransactionCategory.REDEEM_REQUEST
+    is_settle = Transaction.category == TransactionCategory.REDEEM_SETTLE
+    statement = (
+        select(
+            Product.id,
+            Product.name,
+            Product.settle_days,
+            func.sum(case((is_request, Transaction.amount), else_=0.0)),
+            func.sum(case((is_settle, Transaction.amount), else_=0.0)),
+            func.max(case((is_request, Transaction.trade_date)))
         )
+        .join(Transaction, Transaction.product_id == Product.id)
+        .where(Transaction.category.in_([
+            TransactionCategory.REDEEM_REQUEST,
+            TransactionCategory.REDEEM_SETTLE
+        ]))
+    )
+    if product_ids is not None:
+        statement = statement.where(Product.id.in_(product_ids))
+    rows = session.exec(statement.group_by(Product.id).order_by(Product.id)).all()
+
+    for product_id, product_name, settle_days, total_request, total_settle, latest_request in rows:
+        total_request = float(total_request)
+        total_settle = float(total_settle)
+        pending = total_request - total_settle
 
         # 判断状态
         if pending < -0.01:  # 允许小数误差
@@ -364,13 +498,13 @@ def check_redeem_consistency(
         elif pending > 0.01:
             # 检查是否长期未结
             if latest_request:
-                expected_settle = latest_request + timedelta(days=product.settle_days)
+                expected_settle = latest_request + timedelta(days=settle_days)
                 days_pending = (today - latest_request).days
-                overdue_threshold = product.settle_days + buffer_days
+                overdue_threshold = settle_days + buffer_days
 
                 if days_pending > overdue_threshold:
                     status = 'overdue'
-                    hint = f"赎回申请已 {days_pending} 天未到账，超过 T+{product.settle_days} 预期到账时间，可能漏记到账或规则不同"
+                    hint = f"赎回申请已 {days_pending} 天未到账，超过 T+{settle_days} 预期到账时间，可能漏记到账或规则不同"
                 else:
                     status = 'normal'
                     hint = f"在途赎回正常，预计 {expected_settle.isoformat()} 前到账"
@@ -384,8 +518,8 @@ def check_redeem_consistency(
             continue
 
         results.append(RedeemCheckItem(
-            product_id=product.id,
-            product_name=product.name,
+            product_id=product_id,
+            product_name=product_name,
             pending_amount=pending,
             status=status,
             latest_request_date=latest_request,
@@ -399,76 +533,85 @@ def check_redeem_consistency(
 
 def check_valuation_gaps(
     session: Session,
-    gap_threshold_days: int = 14
+    gap_threshold_days: int = 14,
+    product_ids: Optional[List[int]] = None
 ) -> List[ValuationGapItem]:
     """
     检查估值断档（S6-4）
     
+    一次查询得到每个产品的最新估值日期、最新交易日期，以及最新估值之后
+    是否有交易（EXISTS），Python 层只负责组装结果。
+    
     Args:
         gap_threshold_days: 断档阈值天数，默认 14 天
+        product_ids: 只检查这些产品，默认全部
     """
     results = []
     today = date.today()
 
-    # 获取所有产品
-    products = session.exec(select(Product)).all()
-
-    for product in products:
-        # 获取最新估值日期
-        latest_valuation = session.exec(
-            select(ProductValuation)
-            .where(ProductValuation.product_id == product.id)
-            .order_by(ProductValuation.date.desc())
-            .limit(1)
-        ).first()
-
-        # Sprint 6 可选：获取最近一次交易日期（用于提示优先级）
-        latest_trade = session.exec(
-            select(Transaction)
-            .where(Transaction.product_id == product.id)
-            .where(Transaction.category.in_([
-                TransactionCategory.BUY,
-                TransactionCategory.REDEEM_REQUEST,
-                TransactionCategory.REDEEM_SETTLE
-            ]))
-            .order_by(Transaction.trade_date.desc())
-            .limit(1)
-        ).first()
-        
-        last_trade_date = latest_trade.trade_date if latest_trade else None
+    trade_categories = [
+        TransactionCategory.BUY,
+        TransactionCategory.REDEEM_REQUEST,
+        TransactionCategory.REDEEM_SETTLE
+    ]
+
+    # 每个产品的最新估值日期与最近一次交易日期（Sprint 6 可选：用于提示优先级）
+    latest = select(
+        Product.id.label('product_id'),
+        Product.name.label('product_name'),
+        select(func.max(ProductValuation.date))
+        .where(ProductValuation.product_id == Product.id)
+        .scalar_subquery()
+        .label('last_valuation_date'),
+        select(func.max(Transaction.trade_date))
+        .where(Transaction.product_id == Product.id)
+        .where(Transaction.category.in_(trade_categories))
+        .scalar_subquery()
+        .label('last_trade_date')
+    )
+    if product_ids is not None:
+        latest = latest.where(Product.id.in_(product_ids))
+    latest = latest.subquery()
+
+    # 最新估值之后（至今天）是否有交易
+    has_recent_trade = select(Transaction.id).where(
+        Transaction.product_id == latest.c.product_id,
+        Transaction.category.in_(trade_categories),
+        Transaction.trade_date > latest.c.last_valuation_date,
+        Transaction.trade_date <= today
+    ).exists()
+
+    # 未超过阈值的产品正常，直接在 SQL 中过滤
+    rows = session.exec(
+        select(
+            latest.c.product_id,
+            latest.c.product_name,
+            latest.c.last_valuation_date,
+            latest.c.last_trade_date,
+            has_recent_trade
+        )
+        .where(
+            latest.c.last_valuation_date.is_(None) |
+            (latest.c.last_valuation_date < today - timedelta(days=gap_threshold_days))
+        )
+        .order_by(latest.c.product_id)
+    ).all()
+
+    for product_id, product_name, last_date, last_trade_date, has_recent_trade in rows:
         days_since_trade = (today - last_trade_date).days if last_trade_date else None
 
-        if not latest_valuation:
+        if last_date is None:
             # 从未录过估值
             days_since = 9999
-            last_date = None
+            has_recent_trade = False
             severity = 'warn'
             if last_trade_date:
                 hint = f"该产品从未录入估值，但最近 {days_since_trade} 天前有交易发生，请尽快补录"
             else:
                 hint = "该产品从未录入估值，请尽快补录"
         else:
-            last_date = latest_valuation.date
             days_since = (today - last_date).days
-
-            if days_since <= gap_threshold_days:
-                # 未超过阈值，正常
-                continue
-
-            # 判断是否期间有交易
-            recent_trades = session.exec(
-                select(Transaction)
-                .where(Transaction.product_id == product.id)
-                .where(Transaction.trade_date > last_date)
-                .where(Transaction.trade_date <= today)
-                .where(Transaction.category.in_([
-                    TransactionCategory.BUY,
-                    TransactionCategory.REDEEM_REQUEST,
-                    TransactionCategory.REDEEM_SETTLE
-                ]))
-            ).all()
-
-            has_recent_trade = len(recent_trades) > 0
+            has_recent_trade = bool(has_recent_trade)
 
             # Sprint 6 可选：根据最近一次交易日期提升提示优先级
             if has_recent_trade:
@@ -482,11 +625,11 @@ def check_valuation_gaps(
                 hint = f"已 {days_since} 天未录估值，期间无交易，建议补录"
 
         results.append(ValuationGapItem(
-            product_id=product.id,
-            product_name=product.name,
+            product_id=product_id,
+            product_name=product_name,
             last_valuation_date=last_date,
             days_since=days_since,
-            has_recent_trade=has_recent_trade if latest_valuation else False,
+            has_recent_trade=has_recent_trade,
             severity=severity,
             hint=hint,
             last_trade_date=last_trade_date,
@@ -496,74 +639,139 @@ def check_valuation_gaps(
     return results
 
 
-def get_all_warnings(
+# 警告类型的生成顺序（缓存读取时按此顺序还原，保证与全量计算结果一致）
+WARNING_TYPE_ORDER = ['account_diff', 'redeem_anomaly', 'valuation_gap']
+
+# 缓存表与 ReconciliationWarning 共有的字段（id 对应缓存表的 warning_id）
+_CACHED_WARNING_FIELDS = (
+    'level', 'type', 'title', 'description', 'object_type', 'object_id',
+    'object_name', 'date', 'diff_value', 'suggested_action', 'link_to'
+)
+
+
+def _supports_parallel_checks(session: Session) -> bool:
+    """内存 SQLite 每个连接是独立的数据库，无法在其他线程的会话中读取，只能串行执行"""
+    url = session.get_bind().url
+    return not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'))
+
+
+def _run_checks(
     session: Session,
-    target_date: Optional[date] = None,
-    account_diff_threshold: float = 1.0,
-    valuation_gap_days: int = 14,
-    redeem_buffer_days: int = 3
+    checks: Dict[str, Callable[[Session], Any]],
+    parallel: bool
+) -> Dict[str, Any]:
+    """
+    执行多项检查
+
+    parallel=True 时在线程池中并发执行，每项检查使用独立的只读会话（从连接池取连接），
+    结果按检查名返回，合并顺序与执行完成顺序无关。
+    """
+    if not parallel or len(checks) < 2 or not _supports_parallel_checks(session):
+        return {name: check(session) for name, check in checks.items()}
+
+    engine = session.get_bind()
+
+    def _run(check: Callable[[Session], Any]) -> Any:
+        with Session(engine) as check_session:
+            return check(check_session)
+
+    with ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix='reconciliation') as executor:
+        futures = {name: executor.submit(_run, check) for name, check in checks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _build_warnings(
+    session: Session,
+    target_date: Optional[date],
+    account_diff_threshold: float,
+    valuation_gap_days: int,
+    redeem_buffer_days: int,
+    account_ids: Optional[List[int]] = None,
+    product_ids: Optional[List[int]] = None,
+    parallel: bool = False
 ) -> List[ReconciliationWarning]:
     """
-    获取所有对账警告（聚合接口）
+    执行三类检查并生成警告（不含状态、未排序）
+
+    account_ids / product_ids 为 None 时检查全部对象，为空列表时跳过对应检查。
+    parallel=True 时三类检查并发执行，警告仍按 账户差异 -> 赎回异常 -> 估值断档 的固定顺序生成。
     """
+    checks: Dict[str, Callable[[Session], Any]] = {}
+    if account_ids is None or account_ids:
+        checks['account_diff'] = lambda s: check_account_diffs(
+            s, target_date, account_diff_threshold, account_ids
+        )
+    if product_ids is None or product_ids:
+        checks['redeem_anomaly'] = lambda s: check_redeem_consistency(s, redeem_buffer_days, product_ids)
+        checks['valuation_gap'] = lambda s: check_valuation_gaps(s, valuation_gap_days, product_ids)
+    results = _run_checks(session, checks, parallel)
+
     warnings = []
 
     # 1. 账户对账差异
-    account_diffs = check_account_diffs(session, target_date, account_diff_threshold)
-    for diff in account_diffs:
-        if diff.severity == 'warn':
-            warnings.append(ReconciliationWarning(
-                id=f"account_diff_{diff.account_id}_{diff.check_date}",
-                level='warn',
-                type='account_diff',
-                title=f"账户 [{diff.account_name}] 余额不一致",
-                description=diff.hint,
-                object_type='account',
-                object_id=diff.account_id,
-                object_name=diff.account_name,
-                date=diff.check_date,
-                diff_value=diff.diff,
-                suggested_action="核对 Snapshot 与交易记录",
-                link_to=f"/master/snapshots?date={diff.check_date.isoformat()}"
-            ))
+    if 'account_diff' in results:
+        for diff in results['account_diff']:
+            if diff.severity == 'warn':
+                warnings.append(ReconciliationWarning(
+                    id=f"account_diff_{diff.account_id}_{diff.check_date}",
+                    level='warn',
+                    type='account_diff',
+                    title=f"账户 [{diff.account_name}] 余额不一致",
+                    description=diff.hint,
+                    object_type='account',
+                    object_id=diff.account_id,
+                    object_name=diff.account_name,
+                    date=diff.check_date,
+                    diff_value=diff.diff,
+                    suggested_action="核对 Snapshot 与交易记录",
+                    link_to=f"/master/snapshots?date={diff.check_date.isoformat()}"
+                ))
 
     # 2. 赎回异常
-    redeem_checks = check_redeem_consistency(session, redeem_buffer_days)
-    for check in redeem_checks:
-        if check.status in ['negative', 'overdue']:
+    if 'redeem_anomaly' in results:
+        for check in results['redeem_anomaly']:
+            if check.status in ['negative', 'overdue']:
+                warnings.append(ReconciliationWarning(
+                    id=f"redeem_{check.product_id}_{check.status}",
+                    level='warn',
+                    type='redeem_anomaly',
+                    title=f"产品 [{check.product_name}] 赎回异常",
+                    description=check.hint,
+                    object_type='product',
+                    object_id=check.product_id,
+                    object_name=check.product_name,
+                    date=check.latest_request_date,
+                    diff_value=check.pending_amount,
+                    suggested_action="核对赎回申请与到账记录",
+                    link_to=f"/master/products/{check.product_id}"
+                ))
+
+    # 3. 估值断档
+    if 'valuation_gap' in results:
+        for gap in results['valuation_gap']:
             warnings.append(ReconciliationWarning(
-                id=f"redeem_{check.product_id}_{check.status}",
-                level='warn',
-                type='redeem_anomaly',
-                title=f"产品 [{check.product_name}] 赎回异常",
-                description=check.hint,
+                id=f"valuation_gap_{gap.product_id}",
+                level=gap.severity,
+                type='valuation_gap',
+                title=f"产品 [{gap.product_name}] 估值断档",
+                description=gap.hint,
                 object_type='product',
-                object_id=check.product_id,
-                object_name=check.product_name,
-                date=check.latest_request_date,
-                diff_value=check.pending_amount,
-                suggested_action="核对赎回申请与到账记录",
-                link_to=f"/master/products/{check.product_id}"
+                object_id=gap.product_id,
+                object_name=gap.product_name,
+                date=gap.last_valuation_date,
+                diff_value=None,
+                suggested_action="补录产品估值",
+                link_to=f"/master/products/{gap.product_id}"
             ))
 
-    # 3. 估值断档
-    valuation_gaps = check_valuation_gaps(session, valuation_gap_days)
-    for gap in valuation_gaps:
-        warnings.append(ReconciliationWarning(
-            id=f"valuation_gap_{gap.product_id}",
-            level=gap.severity,
-            type='valuation_gap',
-            title=f"产品 [{gap.product_name}] 估值断档",
-            description=gap.hint,
-            object_type='product',
-            object_id=gap.product_id,
-            object_name=gap.product_name,
-            date=gap.last_valuation_date,
-            diff_value=None,
-            suggested_action="补录产品估值",
-            link_to=f"/master/products/{gap.product_id}"
-        ))
+    return warnings
+
 
+def _apply_status_and_sort(
+    session: Session,
+    warnings: List[ReconciliationWarning]
+) -> List[ReconciliationWarning]:
+    """叠加 acknowledged/muted 状态并排序（warn 在前）"""
     # 查询数据库中的状态记录
     warning_ids = [w.id for w in warnings]
     status_records = session.exec(
@@ -587,6 +795,199 @@ def get_all_warnings(
     return warnings
 
 
+def get_all_warnings(
+    session: Session,
+    target_date: Optional[date] = None,
+    account_diff_threshold: float = 1.0,
+    valuation_gap_days: int = 14,
+    redeem_buffer_days: int = 3,
+    parallel: bool = False
+) -> List[ReconciliationWarning]:
+    """
+    获取所有对账警告（聚合接口，全量计算）
+
+    parallel=True 时三类检查在线程池中并发执行，结果与串行一致。
+    """
+    warnings = _build_warnings(
+        session,
+        target_date,
+        account_diff_threshold,
+        valuation_gap_days,
+        redeem_buffer_days,
+        parallel=parallel
+    )
+    return _apply_status_and_sort(session, warnings)
+
+
+def mark_reconciliation_dirty(
+    session: Session,
+    account_ids: Iterable[Optional[int]] = (),
+    product_ids: Iterable[Optional[int]] = ()
+) -> None:
+    """
+    登记受写操作影响的账户/产品
+
+    在写操作的同一事务内调用（提交前），下次读取缓存警告时只重算这些对象。
+    """
+    rows = [
+        {"object_type": "account", "object_id": object_id}
+        for object_id in sorted({i for i in account_ids if i is not None})
+    ] + [
+        {"object_type": "product", "object_id": object_id}
+        for object_id in sorted({i for i in product_ids if i is not None})
+    ]
+    if rows:
+        session.exec(insert(ReconciliationDirtyObject.__table__), params=rows)
+
+
+def _warnings_signature(
+    target_date: date,
+    account_diff_threshold: float,
+    valuation_gap_days: int,
+    redeem_buffer_days: int
+) -> str:
+    """缓存参数签名：检查日期、阈值，以及计算当天（赎回逾期、估值断档依赖今天，固定为最后一段）"""
+    return "|".join(str(v) for v in (
+        target_date.isoformat(),
+        float(account_diff_threshold),
+        valuation_gap_days,
+        redeem_buffer_days,
+        date.today().isoformat()
+    ))
+
+
+def _read_cache_state(session: Session):
+    """读取缓存状态行 (signature, built_at)，尚未建立缓存时返回 None（只取列，不经过身份映射）"""
+    return session.exec(
+        select(ReconciliationCacheState.signature, ReconciliationCacheState.built_at)
+        .where(ReconciliationCacheState.id == 1)
+    ).first()
+
+
+class _CacheStateChanged(Exception):
+    """计算期间缓存已被其他请求重建，本次的增量结果不能再写入"""
+
+
+def get_cached_warnings(
+    session: Session,
+    target_date: Optional[date] = None,
+    account_diff_threshold: float = 1.0,
+    valuation_gap_days: int = 14,
+    redeem_buffer_days: int = 3,
+    refresh: bool = False,
+    parallel: bool = False
+) -> List[ReconciliationWarning]:
+    """
+    获取所有对账警告（增量计算，结果与 get_all_warnings 一致）
+
+    - 首次计算、refresh=True 或缓存建于之前某天时，按本次参数全量重建缓存
+    - 参数签名与当天有效的缓存不同时直接全量计算、不改写缓存，
+      避免参数交替的请求每次都整体重建缓存
+    - 否则只重算写路径登记为 dirty 的账户/产品，其余直接读取缓存
+    - 本次消费的 dirty 记录按 id 上界删除，并发写入的新登记留到下次处理
+    - parallel=True 时需要重算的检查并发执行
+
+    缓存写入在 SAVEPOINT 内进行，并先 upsert 状态行：状态行的行锁（SQLite 为数据库写锁）
+    使并发请求的缓存写入串行执行。写入冲突（锁等待超时、计算期间缓存已被其他请求重建等）时
+    回滚本次写入，返回不经缓存的全量计算结果。
+
+    会写入缓存表，调用方负责提交事务。
+    """
+    if target_date is None:
+        target_date = date.today()
+
+    def compute_uncached() -> List[ReconciliationWarning]:
+        return get_all_warnings(
+            session, target_date, account_diff_threshold, valuation_gap_days, redeem_buffer_days,
+            parallel=parallel
+        )
+
+    signature = _warnings_signature(
+        target_date, account_diff_threshold, valuation_gap_days, redeem_buffer_days
+    )
+    state = _read_cache_state(session)
+    rebuild = (
+        refresh or state is None
+        or state.signature.rsplit("|", 1)[-1] != date.today().isoformat()
+    )
+    if not rebuild and state.signature != signature:
+        return compute_uncached()
+
+    max_dirty_id = session.exec(select(func.max(ReconciliationDirtyObject.id))).one()
+    if rebuild:
+        warnings = _build_warnings(
+            session, target_date, account_diff_threshold, valuation_gap_days, redeem_buffer_days,
+            parallel=parallel
+        )
+    elif max_dirty_id is not None:
+        # 只重算 dirty 对象
+        dirty = session.exec(
+            select(ReconciliationDirtyObject.object_type, ReconciliationDirtyObject.object_id)
+            .where(ReconciliationDirtyObject.id <= max_dirty_id)
+            .distinct()
+        ).all()
+        account_ids = sorted(object_id for object_type, object_id in dirty if object_type == 'account')
+        product_ids = sorted(object_id for object_type, object_id in dirty if object_type == 'product')
+
+        warnings = _build_warnings(
+            session, target_date, account_diff_threshold, valuation_gap_days, redeem_buffer_days,
+            account_ids=account_ids, product_ids=product_ids, parallel=parallel
+        )
+
+    if rebuild or max_dirty_id is not None:
+        try:
+            with session.begin_nested():
+                # 先写状态行取得写锁；增量路径只做空更新（SET id = id），不改变签名
+                upsert_rows(
+                    session,
+                    ReconciliationCacheState.__table__,
+                    [{"id": 1, "signature": signature, "built_at": datetime.utcnow()}],
+                    conflict_columns=("id",),
+                    update_columns=("signature", "built_at") if rebuild else ("id",)
+                )
+                if rebuild:
+                    session.exec(delete(ReconciliationWarningCache))
+                else:
+                    if tuple(_read_cache_state(session)) != tuple(state):
+                        raise _CacheStateChanged()
+                    session.exec(delete(ReconciliationWarningCache).where(
+                        ((ReconciliationWarningCache.object_type == 'account') &
+                         ReconciliationWarningCache.object_id.in_(account_ids)) |
+                        ((ReconciliationWarningCache.object_type == 'product') &
+                         ReconciliationWarningCache.object_id.in_(product_ids))
+                    ))
+                if warnings:
+                    session.exec(insert(ReconciliationWarningCache.__table__), params=[
+                        dict({field: getattr(w, field) for field in _CACHED_WARNING_FIELDS}, warning_id=w.id)
+                        for w in warnings
+                    ])
+                if max_dirty_id is not None:
+                    session.exec(delete(ReconciliationDirtyObject).where(ReconciliationDirtyObject.id <= max_dirty_id))
+        except (IntegrityError, OperationalError, _CacheStateChanged) as e:
+            log_warning("对账警告缓存写入冲突，返回未缓存的计算结果", extra={
+                "signature": signature,
+                "rebuild": rebuild,
+                "error": type(e).__name__,
+            })
+            return compute_uncached()
+
+    # 按生成顺序读出全部缓存警告（只取列，不构建 ORM 对象）
+    type_order = case(
+        {t: i for i, t in enumerate(WARNING_TYPE_ORDER)},
+        value=ReconciliationWarningCache.type
+    )
+    columns = [getattr(ReconciliationWarningCache, field) for field in _CACHED_WARNING_FIELDS]
+    cached = session.exec(
+        select(ReconciliationWarningCache.warning_id, *columns)
+        .order_by(type_order, ReconciliationWarningCache.object_id)
+    ).all()
+    warnings = [
+        ReconciliationWarning(id=row[0], **dict(zip(_CACHED_WARNING_FIELDS, row[1:])))
+        for row in cached
+    ]
+    return _apply_status_and_sort(session, warnings)
+
+
 def update_warning_status(
     session: Session,
     warning_id: str,
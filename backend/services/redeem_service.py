@@ -1,10 +1,12 @@
 from datetime import date, timedelta
 from typing import List, Optional, Dict, Any
-from sqlmodel import Session, select, func
+from sqlmodel import Session, select, func, case
 from models.transaction import Transaction, TransactionCategory
 from models.product import Product
+from utils.computation_context import memoized
 
 
+@memoized
 def calculate_pending_redeems(
     session: Session,
     product_id: Optional[int] = None
@@ -25,78 +27,51 @@ def calculate_pending_redeems(
             "items": [...]           # 明细列表
         }
     """
-    # 查询 redeem_request 记录
-    request_stmt = select(Transaction).where(
-        Transaction.category == TransactionCategory.REDEEM_REQUEST
+    # 一次分组聚合：每个产品的申请/到账总额、最早申请日、最晚预计到账日
+    is_request = Transaction.category == TransactionCategory.REDEEM_REQUEST
+    is_settle = Transaction.category == TransactionCategory.REDEEM_SETTLE
+    stmt = select(
+        Transaction.product_id,
+        Product.name,
+        func.count(case((is_request, Transaction.id))),
+        # redeem_request 的 amount 是负数（资金流出产品），统一取绝对值
+        func.sum(case((is_request, func.abs(Transaction.amount)), else_=0.0)),
+        func.sum(case((is_settle, func.abs(Transaction.amount)), else_=0.0)),
+        func.min(case((is_request, Transaction.trade_date))),
+        func.max(case((is_request, Transaction.settle_date)))
+    ).outerjoin(
+        Product, Transaction.product_id == Product.id
+    ).where(
+        Transaction.category.in_([
+            TransactionCategory.REDEEM_REQUEST,
+            TransactionCategory.REDEEM_SETTLE
+        ])
     )
     if product_id:
-        request_stmt = request_stmt.where(Transaction.product_id == product_id)
-    request_records = session.exec(request_stmt).all()
-    
-    # 查询 redeem_settle 记录
-    settle_stmt = select(Transaction).where(
-        Transaction.category == TransactionCategory.REDEEM_SETTLE
-    )
-    if product_id:
-        settle_stmt = settle_stmt.where(Transaction.product_id == product_id)
-    settle_records = session.exec(settle_stmt).all()
+        stmt = stmt.where(Transaction.product_id == product_id)
+    rows = session.exec(
+        stmt.group_by(Transaction.product_id, Product.name).order_by(Transaction.product_id)
+    ).all()
     
     # 计算在途金额
-    # redeem_request 的 amount 是负数（资金流出产品）
-    total_request = sum(abs(r.amount) for r in request_records)
-    total_settle = sum(abs(s.amount) for s in settle_records)
+    total_request = sum(request_amount for _, _, _, request_amount, _, _, _ in rows)
+    total_settle = sum(settle_amount for _, _, _, _, settle_amount, _, _ in rows)
     total_pending = max(0, total_request - total_settle)
     
-    # 构建明细（按产品分组）
-    pending_by_product: Dict[int, Dict[str, Any]] = {}
-    
-    for req in request_records:
-        pid = req.product_id
-        if pid not in pending_by_product:
-            product = session.get(Product, pid)
-            pending_by_product[pid] = {
-                "product_id": pid,
-                "product_name": product.name if product else "未知产品",
-                "request_amount": 0.0,
-                "settle_amount": 0.0,
-                "pending_amount": 0.0,
-                "requests": []
-            }
-        pending_by_product[pid]["request_amount"] += abs(req.amount)
-        pending_by_product[pid]["requests"].append({
-            "trade_date": req.trade_date.isoformat(),
-            "amount": abs(req.amount),
-            "settle_date": req.settle_date.isoformat() if req.settle_date else None
-        })
-    
-    for settle in settle_records:
-        pid = settle.product_id
-        if pid in pending_by_product:
-            pending_by_product[pid]["settle_amount"] += abs(settle.amount)
-    
-    # 计算每个产品的在途金额
+    # 每个有赎回申请的产品的在途金额
     items = []
-    for pid, data in pending_by_product.items():
-        pending = max(0, data["request_amount"] - data["settle_amount"])
+    for pid, product_name, request_count, request_amount, settle_amount, earliest_request, latest_settle in rows:
+        if not request_count:
+            continue
+        pending = max(0, request_amount - settle_amount)
         if pending > 0:
-            data["pending_amount"] = pending
-            # 找到最晚的预计到账日
-            latest_settle_date = None
-            for req in data["requests"]:
-                if req["settle_date"]:
-                    req_date = date.fromisoformat(req["settle_date"])
-                    if latest_settle_date is None or req_date > latest_settle_date:
-                        latest_settle_date = req_date
-            
             items.append({
-                "product_id": data["product_id"],
-                "product_name": data["product_name"],
+                "product_id": pid,
+                "product_name": product_name if product_name is not None else "未知产品",
                 "pending_amount": pending,
-                "latest_request_date": min(
-                    (date.fromisoformat(r["trade_date"]) for r in data["requests"]),
-                    default=None
-                ).isoformat() if data["requests"] else None,
-                "estimated_settle_date": latest_settle_date.isoformat() if latest_settle_date else None
+                "latest_request_date": earliest_request.isoformat() if earliest_request else None,
+                # 最晚的预计到账日
+                "estimated_settle_date": latest_settle.isoformat() if latest_settle else None
             })
     
     return {
@@ -139,6 +114,7 @@ def get_product_pending_redeem(
     }
 
 
+@memoized
 def calculate_future_cash_flow(
     session: Session,
     start_date: Optional[date] = None,
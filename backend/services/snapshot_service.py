@@ -1,8 +1,11 @@
 from typing import List, Dict, Any, Tuple
-from datetime import date
+from datetime import date, datetime
+from sqlalchemy.orm import joinedload
 from sqlmodel import Session, select
 from models.snapshot import Snapshot
 from models.account import Account
+from services.reconciliation_service import mark_reconciliation_dirty
+from utils.bulk_upsert import select_by_keys, select_in_chunks, upsert_rows
 
 
 def batch_upsert_snapshots(
@@ -12,20 +15,21 @@ def batch_upsert_snapshots(
     """
     批量更新/插入快照
     
+    查询数只随块数增长：账户校验按块 IN 查询，已有快照按 (date, account_id) 分块精确预取，
+    写入按块执行 INSERT ... ON CONFLICT(date, account_id) DO UPDATE。
+    
     Args:
         session: 数据库会话
         snapshots_data: 快照数据列表，每项包含 date, account_id, balance
         
     Returns:
         (inserted_count, updated_count, warnings)
+        同一 (date, account_id) 只计一次；余额未变化的行不写入也不计数
     """
-    inserted = 0
-    updated = 0
     warnings = []
     
-    # 预处理数据：按 (date, account_id) 分组，确保无重复
-    # 这里的业务逻辑是：如果有重复，后面的覆盖前面的
-    
+    # 1. 解析与基础校验
+    parsed = []
     for item in snapshots_data:
         snapshot_date = item.get("date")
         # 处理日期字符串转换 (如果输入是字符串)
@@ -42,47 +46,78 @@ def batch_upsert_snapshots(
         if not account_id or balance is None:
             warnings.append(f"Missing account_id or balance for date {snapshot_date}")
             continue
-            
-        # 检查账户是否存在
-        account = session.get(Account, account_id)
-        if not account:
+        
+        parsed.append((snapshot_date, account_id, balance))
+    
+    # 2. 分块 IN 查询校验账户是否存在
+    account_ids = {account_id for _, account_id, _ in parsed}
+    existing_accounts = set(select_in_chunks(session, select(Account.id), Account.id, account_ids))
+    
+    # 3. 按 (date, account_id) 去重：如果有重复，后面的覆盖前面的
+    latest: Dict[Tuple[date, int], float] = {}
+    for snapshot_date, account_id, balance in parsed:
+        if account_id not in existing_accounts:
             warnings.append(f"Account {account_id} not found")
             continue
-            
-        # 查找现有快照
-        statement = select(Snapshot).where(
-            Snapshot.date == snapshot_date,
-            Snapshot.account_id == account_id
+        latest[(snapshot_date, account_id)] = balance
+    
+    if not latest:
+        return 0, 0, warnings
+    
+    # 4. 预取已有快照，用于准确区分新增/更新并跳过未变化的行
+    existing_balances = {
+        (snapshot_date, account_id): balance
+        for snapshot_date, account_id, balance in select_by_keys(
+            session,
+            (Snapshot.date, Snapshot.account_id, Snapshot.balance),
+            (Snapshot.date, Snapshot.account_id),
+            latest
         )
-        existing_snapshot = session.exec(statement).first()
-        
-        if existing_snapshot:
-            # 更新
-            if existing_snapshot.balance != balance:
-                existing_snapshot.balance = balance
-                session.add(existing_snapshot)
-                updated += 1
+    }
+    
+    now = datetime.utcnow()
+    rows = []
+    inserted = 0
+    updated = 0
+    touched_accounts = set()
+    for (snapshot_date, account_id), balance in latest.items():
+        key = (snapshot_date, account_id)
+        if key in existing_balances:
+            if existing_balances[key] == balance:
+                continue
+            updated += 1
         else:
-            # 插入
-            new_snapshot = Snapshot(
-                date=snapshot_date,
-                account_id=account_id,
-                balance=balance
-            )
-            session.add(new_snapshot)
             inserted += 1
-            
+        touched_accounts.add(account_id)
+        rows.append({
+            "date": snapshot_date,
+            "account_id": account_id,
+            "balance": balance,
+            "created_at": now,
+            "updated_at": now
+        })
+    
+    # 5. 分块 upsert（冲突时只覆盖余额与更新时间，保留原 created_at）
+    upsert_rows(
+        session,
+        Snapshot.__table__,
+        rows,
+        conflict_columns=("date", "account_id"),
+        update_columns=("balance", "updated_at")
+    )
+    
+    mark_reconciliation_dirty(session, account_ids=touched_accounts)
     session.commit()
     
     return inserted, updated, warnings
 
-
 from sqlmodel import Session, select, func
 
 def list_snapshots(
     session: Session,
     snapshot_date: date,
-    fill_previous: bool = False
+    fill_previous: bool = False,
+    with_account: bool = False
 ) -> List[Snapshot]:
     """
     获取快照列表
@@ -91,9 +126,12 @@ def list_snapshots(
         session: 数据库会话
         snapshot_date: 查询日期
         fill_previous: 是否回溯最近的快照（如果当天没有，则取该日期之前最近的一条）
+        with_account: 是否在同一查询中预加载 snapshot.account（避免逐条懒加载账户）
     """
     if not fill_previous:
         statement = select(Snapshot).where(Snapshot.date == snapshot_date)
+        if with_account:
+            statement = statement.options(joinedload(Snapshot.account))
         return session.exec(statement).all()
     
     # 回溯逻辑：查找每个账户在 snapshot_date 之前的最近一条记录
@@ -120,5 +158,7 @@ def list_snapshots(
         (Snapshot.account_id == subquery.c.account_id) & 
         (Snapshot.date == subquery.c.max_date)
     )
+    if with_account:
+        statement = statement.options(joinedload(Snapshot.account))
     
     return session.exec(statement).all()
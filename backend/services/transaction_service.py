@@ -1,8 +1,14 @@
-from datetime import date
-from typing import List, Optional, Dict, Any
-from sqlmodel import Session, select, delete
+import hashlib
+import json
+from datetime import date, datetime
+from typing import List, Optional, Dict, Any, Tuple
+from sqlmodel import Session, select, delete, func
 
-from models.transaction import Transaction
+from models.account import Account
+from models.product import Product
+from models.transaction import Transaction, TransactionCategory
+from services.reconciliation_service import mark_reconciliation_dirty
+from utils.bulk_upsert import insert_rows_ignoring_conflicts, select_in_chunks
 
 
 def create_transaction(
@@ -35,11 +41,203 @@ def create_transaction(
     )
     
     session.add(transaction)
+    mark_reconciliation_dirty(session, [account_id], [product_id])
     session.commit()
     session.refresh(transaction)
     
     return transaction
 
+_REQUIRED_FIELDS = ('product_id', 'account_id', 'category', 'trade_date', 'amount')
+
+
+def _parse_transaction_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """校验并规范化单行交易数据，不合法时抛出 ValueError（消息即返回给调用方的错误）"""
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object")
+    for field in _REQUIRED_FIELDS:
+        if row.get(field) is None:
+            raise ValueError(f"{field} is required")
+
+    if row['category'] not in TransactionCategory.PRODUCT_CATEGORIES:
+        raise ValueError("invalid category")
+
+    parsed = {}
+    for field in ('product_id', 'account_id'):
+        value = row[field]
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"invalid {field}")
+        try:
+            parsed[field] = int(value)
+        except ValueError:
+            raise ValueError(f"invalid {field}")
+
+    for field in ('trade_date', 'settle_date'):
+        value = row.get(field)
+        if isinstance(value, str):
+            try:
+                value = date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"invalid {field} format")
+        elif value is not None and not isinstance(value, date):
+            raise ValueError(f"invalid {field} format")
+        parsed[field] = value
+
+    amount = row['amount']
+    if isinstance(amount, bool):
+        raise ValueError("invalid amount")
+    try:
+        parsed['amount'] = float(amount)
+    except (TypeError, ValueError):
+        raise ValueError("invalid amount")
+
+    external_ref = row.get('external_ref')
+    if external_ref is not None and (not isinstance(external_ref, str) or not external_ref):
+        raise ValueError("invalid external_ref")
+
+    parsed['category'] = row['category']
+    parsed['note'] = row.get('note')
+    parsed['external_ref'] = external_ref
+    return parsed
+
+
+def compute_content_ref(row: Dict[str, Any], occurrence: int = 0) -> str:
+    """
+    按交易内容生成去重键（用于没有外部流水号的对账单）
+
+    occurrence 为同一批次内相同内容的第几次出现，使同一文件中确实重复的交易各自保留，
+    而重新导入同一文件时生成的键完全相同。
+    """
+    content = json.dumps([
+        row['product_id'],
+        row['account_id'],
+        row['category'],
+        row['trade_date'].isoformat(),
+        row['settle_date'].isoformat() if row['settle_date'] else None,
+        row['amount'],
+        row['note'],
+        occurrence
+    ], ensure_ascii=False, default=str)
+    return "sha256:" + hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _existing_external_refs(session: Session, refs: List[str]) -> set:
+    """分块 IN 查询已存在的 external_ref（走唯一索引）"""
+    return set(select_in_chunks(session, select(Transaction.external_ref), Transaction.external_ref, refs))
+
+
+def batch_create_transactions(
+    session: Session,
+    rows: List[Dict[str, Any]],
+    hash_missing_refs: bool = False
+) -> Dict[str, Any]:
+    """
+    批量创建交易记录
+    
+    - 产品 / 账户 ID 按块 IN 查询校验（每块不超过绑定参数上限）
+    - 合法行在同一事务内分块插入，只提交一次
+    - 不合法的行记录错误并跳过，不影响其他行
+    - 受影响的账户 / 产品只登记一次对账 dirty
+    - 带 external_ref 的行按唯一索引去重：库中已有或本批次已出现的键直接跳过，
+      重复导入同一对账单是安全的
+    
+    Args:
+        hash_missing_refs: 为 True 时，没有 external_ref 的行使用内容哈希作为去重键
+    
+    Returns:
+        {
+            "created": int,
+            "skipped": int,
+            "failed": int,
+            "duplicates": [{"index": int, "external_ref": str}, ...],
+            "errors": [{"index": int, "error": str}, ...]  # index 为 rows 中的下标
+        }
+    """
+    errors = []
+    parsed_rows = []
+    occurrences: Dict[str, int] = {}
+    for index, row in enumerate(rows):
+        try:
+            parsed = _parse_transaction_row(row)
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        if parsed['external_ref'] is None and hash_missing_refs:
+            base_ref = compute_content_ref(parsed)
+            parsed['external_ref'] = compute_content_ref(parsed, occurrences.get(base_ref, 0))
+            occurrences[base_ref] = occurrences.get(base_ref, 0) + 1
+        parsed_rows.append((index, parsed))
+
+    # 集合查询校验引用的产品与账户是否存在（先于去重，无效行不占用去重键）
+    product_ids = {row['product_id'] for _, row in parsed_rows}
+    account_ids = {row['account_id'] for _, row in parsed_rows}
+    existing_products = set(select_in_chunks(session, select(Product.id), Product.id, product_ids))
+    existing_accounts = set(select_in_chunks(session, select(Account.id), Account.id, account_ids))
+
+    valid_rows = []
+    for index, row in parsed_rows:
+        if row['product_id'] not in existing_products:
+            errors.append({"index": index, "error": f"product {row['product_id']} not found"})
+            continue
+        if row['account_id'] not in existing_accounts:
+            errors.append({"index": index, "error": f"account {row['account_id']} not found"})
+            continue
+        valid_rows.append((index, row))
+
+    # 去重：一次（分块）IN 查询取回已存在的键，之后每行 O(1) 判断
+    seen_refs = _existing_external_refs(
+        session,
+        list({row['external_ref'] for _, row in valid_rows if row['external_ref'] is not None})
+    )
+    now = datetime.utcnow()
+    duplicates = []
+    to_insert = []
+    for index, row in valid_rows:
+        ref = row['external_ref']
+        if ref is not None:
+            if ref in seen_refs:
+                duplicates.append({"index": index, "external_ref": ref})
+                continue
+            seen_refs.add(ref)
+        row['created_at'] = now
+        row['updated_at'] = now
+        to_insert.append(row)
+
+    # ON CONFLICT(external_ref) DO NOTHING：并发导入时的兜底，以实际插入行数为准
+    created = insert_rows_ignoring_conflicts(
+        session,
+        Transaction.__table__,
+        to_insert,
+        conflict_columns=("external_ref",)
+    )
+
+    if to_insert:
+        mark_reconciliation_dirty(
+            session,
+            {row['account_id'] for row in to_insert},
+            {row['product_id'] for row in to_insert}
+        )
+        session.commit()
+
+    errors.sort(key=lambda e: e['index'])
+    return {
+        "created": created,
+        "skipped": len(duplicates) + len(to_insert) - created,
+        "failed": len(errors),
+        "duplicates": duplicates,
+        "errors": errors
+    }
+
+
+def encode_transaction_cursor(transaction: Transaction) -> str:
+    """生成 keyset 游标：指向该交易之后（更早）的记录，格式 "<trade_date>_<id>" """
+    return f"{transaction.trade_date.isoformat()}_{transaction.id}"
+
+
+def decode_transaction_cursor(cursor: str) -> Tuple[date, int]:
+    """解析 keyset 游标，格式不合法时抛出 ValueError"""
+    trade_date, _, transaction_id = cursor.partition('_')
+    return date.fromisoformat(trade_date), int(transaction_id)
+
 
 def list_transactions(
     session: Session,
@@ -49,48 +247,77 @@ def list_transactions(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     page: int = 1,
-    page_size: int = 20
+    page_size: int = 20,
+    with_total: bool = True,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     查询交易记录列表
-    """
-    statement = select(Transaction)
     
-    # 应用过滤条件
+    按 (trade_date DESC, id DESC) 排序，支持两种分页方式：
+    - page/page_size：OFFSET 分页
+    - cursor：keyset 分页，从游标指向的记录之后继续（忽略 page），深翻页不退化
+    
+    Args:
+        with_total: 是否执行 COUNT 查询返回 total/total_pages（为 False 时两者为 None）
+        cursor: 上一页返回的 next_cursor
+    
+    Raises:
+        ValueError: cursor 格式不合法
+    """
+    # 过滤条件
+    conditions = []
     if product_id:
-        statement = statement.where(Transaction.product_id == product_id)
+        conditions.append(Transaction.product_id == product_id)
     if account_id:
-        statement = statement.where(Transaction.account_id == account_id)
+        conditions.append(Transaction.account_id == account_id)
     if category:
-        statement = statement.where(Transaction.category == category)
+        conditions.append(Transaction.category == category)
     if start_date:
-        statement = statement.where(Transaction.trade_date >= start_date)
+        conditions.append(Transaction.trade_date >= start_date)
     if end_date:
-        statement = statement.where(Transaction.trade_date <= end_date)
+        conditions.append(Transaction.trade_date <= end_date)
     
-    # 按交易日期倒序
-    statement = statement.order_by(Transaction.trade_date.desc())
+    # 获取总数（不受游标影响）
+    total = None
+    if with_total:
+        total = session.exec(
+            select(func.count()).select_from(Transaction).where(*conditions)
+        ).one()
     
-    # 获取总数
-    total = len(session.exec(statement).all())
+    # 按交易日期倒序，同日按 id 倒序保证顺序稳定
+    statement = select(Transaction).where(*conditions).order_by(
+        Transaction.trade_date.desc(),
+        Transaction.id.desc()
+    )
     
-    # 分页
-    offset = (page - 1) * page_size
-    statement = statement.offset(offset).limit(page_size)
+    if cursor:
+        cursor_date, cursor_id = decode_transaction_cursor(cursor)
+        # trade_date <= 游标日期 单独列出，便于走 (trade_date, id) 索引的范围扫描
+        statement = statement.where(
+            Transaction.trade_date <= cursor_date,
+            (Transaction.trade_date < cursor_date) | (Transaction.id < cursor_id)
+        )
+    else:
+        statement = statement.offset((page - 1) * page_size)
     
-    items = session.exec(statement).all()
+    # 多取一条判断是否还有下一页
+    items = session.exec(statement.limit(page_size + 1)).all()
+    has_more = len(items) > page_size
+    items = items[:page_size]
     
     return {
         "items": items,
         "pagination": {
-            "page": page,
+            "page": None if cursor else page,
             "page_size": page_size,
             "total": total,
-            "total_pages": (total + page_size - 1) // page_size
+            "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+            "has_more": has_more,
+            "next_cursor": encode_transaction_cursor(items[-1]) if has_more else None
         }
     }
 
-
 def delete_transaction(session: Session, transaction_id: int) -> bool:
     """
     删除交易记录
@@ -100,6 +327,7 @@ def delete_transaction(session: Session, transaction_id: int) -> bool:
         return False
     
     session.delete(transaction)
+    mark_reconciliation_dirty(session, [transaction.account_id], [transaction.product_id])
     session.commit()
     
     return True
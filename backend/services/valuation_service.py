@@ -1,9 +1,14 @@
 from typing import List, Dict, Any, Optional
-from datetime import date, timedelta
-from sqlmodel import Session, select, delete
-from sqlalchemy.dialects.sqlite import insert
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+from sqlmodel import Session, select, delete, func
+from sqlalchemy import Date, bindparam, literal, union_all
 
 from models.valuation import ProductValuation
+from services.reconciliation_service import mark_reconciliation_dirty
+from utils.bulk_upsert import select_by_keys, upsert_rows
 
 
 def delete_valuation(session: Session, product_id: int, valuation_date: date) -> bool:
@@ -15,6 +20,8 @@ def delete_valuation(session: Session, product_id: int, valuation_date: date) ->
         ProductValuation.date == valuation_date
     )
     result = session.exec(statement)
+    if result.rowcount > 0:
+        mark_reconciliation_dirty(session, product_ids=[product_id])
     session.commit()
     return result.rowcount > 0
 
@@ -22,12 +29,15 @@ def delete_valuation(session: Session, product_id: int, valuation_date: date) ->
 def batch_upsert_valuations(session: Session, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     批量插入或更新产品估值数据
+
+    同一 (product_id, date) 以最后一行为准；预取已有估值以返回准确的新增/更新计数，
+    估值未变化的行不写入也不计数。
     """
     if not rows:
         return {"inserted": 0, "updated": 0, "warnings": []}
 
-    # 预处理数据
-    data_to_insert = []
+    # 预处理数据（按 (product_id, date) 去重，后面的覆盖前面的）
+    latest: Dict[tuple, float] = {}
     for row in rows:
         # 确保 date 是 date 对象
         d = row['date']
@@ -39,26 +49,51 @@ def batch_upsert_valuations(session: Session, rows: List[Dict[str, Any]]) -> Dic
         if isinstance(mv, str):
             mv = float(mv)
             
-        data_to_insert.append({
-            "product_id": row['product_id'],
-            "date": d,
-            "market_value": mv
+        latest[(row['product_id'], d)] = mv
+
+    # 按 (product_id, date) 分块精确预取已有估值
+    existing_values = {
+        (product_id, valuation_date): market_value
+        for product_id, valuation_date, market_value in select_by_keys(
+            session,
+            (ProductValuation.product_id, ProductValuation.date, ProductValuation.market_value),
+            (ProductValuation.product_id, ProductValuation.date),
+            latest
+        )
+    }
+
+    now = datetime.utcnow()
+    data_to_upsert = []
+    inserted = 0
+    updated = 0
+    for (product_id, valuation_date), mv in latest.items():
+        key = (product_id, valuation_date)
+        if key in existing_values:
+            if existing_values[key] == mv:
+                continue
+            updated += 1
+        else:
+            inserted += 1
+        data_to_upsert.append({
+            "product_id": product_id,
+            "date": valuation_date,
+            "market_value": mv,
+            "created_at": now,
+            "updated_at": now
         })
 
-    # 使用 SQLite 的 ON CONFLICT DO UPDATE
-    stmt = insert(ProductValuation.__table__).values(data_to_insert)
-    
-    stmt = stmt.on_conflict_do_update(
-        index_elements=['product_id', 'date'],
-        set_={"market_value": stmt.excluded.market_value}
+    # 分块 ON CONFLICT DO UPDATE
+    upsert_rows(
+        session,
+        ProductValuation.__table__,
+        data_to_upsert,
+        conflict_columns=("product_id", "date"),
+        update_columns=("market_value", "updated_at")
     )
-    
-    result = session.exec(stmt)
+    mark_reconciliation_dirty(session, product_ids={row['product_id'] for row in data_to_upsert})
     session.commit()
     
-    total_rows = len(rows)
-    return {"inserted": total_rows, "updated": 0, "warnings": []}
-
+    return {"inserted": inserted, "updated": updated, "warnings": []}
 
 def list_valuations(session: Session, product_id: int, start_date: date, end_date: date) -> List[ProductValuation]:
     """
@@ -73,140 +108,281 @@ def list_valuations(session: Session, product_id: int, start_date: date, end_dat
     return session.exec(statement).all()
 
 
-def get_valuation_series(
+def list_valuations_page(
+    session: Session,
+    product_id: int,
+    start_date: date,
+    end_date: date,
+    page: int = 1,
+    page_size: int = 20,
+    with_total: bool = True,
+    cursor: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    分页查询指定产品在日期范围内的估值（按日期升序，LIMIT/OFFSET 在 SQL 中完成）
+
+    Args:
+        with_total: 是否执行 COUNT 查询返回 total/total_pages（为 False 时两者为 None）
+        cursor: keyset 游标（上一页 next_cursor 对应的日期），从该日期之后继续，忽略 page
+    """
+    conditions = [
+        ProductValuation.product_id == product_id,
+        ProductValuation.date >= start_date,
+        ProductValuation.date <= end_date
+    ]
+
+    total = None
+    if with_total:
+        total = session.exec(
+            select(func.count()).select_from(ProductValuation).where(*conditions)
+        ).one()
+
+    statement = select(ProductValuation).where(*conditions).order_by(ProductValuation.date)
+    if cursor:
+        statement = statement.where(ProductValuation.date > cursor)
+    else:
+        statement = statement.offset((page - 1) * page_size)
+
+    # 多取一条判断是否还有下一页
+    items = session.exec(statement.limit(page_size + 1)).all()
+    has_more = len(items) > page_size
+    items = items[:page_size]
+
+    return {
+        "items": items,
+        "pagination": {
+            "page": None if cursor else page,
+            "page_size": page_size,
+            "total": total,
+            "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+            "has_more": has_more,
+            "next_cursor": items[-1].date.isoformat() if has_more else None
+        }
+    }
+
+# 估值序列来源编码（int8 数组中的取值）
+SOURCE_MANUAL = 0
+SOURCE_INTERPOLATED = 1
+SOURCE_EXTRAPOLATED = 2
+SOURCE_LABELS = ("manual", "interpolated", "extrapolated")
+
+
+class ValuationSeries:
+    """
+    列式估值序列
+
+    - ordinals: 日期序数（date.toordinal()），int64
+    - values: 估值，float64
+    - sources: 来源编码（SOURCE_MANUAL / SOURCE_INTERPOLATED / SOURCE_EXTRAPOLATED），int8
+    """
+    def __init__(self, ordinals: np.ndarray, values: np.ndarray, sources: np.ndarray):
+        self.ordinals = ordinals
+        self.values = values
+        self.sources = sources
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    @classmethod
+    def empty(cls) -> "ValuationSeries":
+        return cls(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.int8)
+        )
+
+    def suffix_start(self, start_date: date) -> Optional[int]:
+        """
+        子窗口 [start_date, 序列末尾] 在本序列中的起始下标
+
+        同一 end_date 下，较短窗口的序列恰好是较长窗口序列的后缀；
+        但若子窗口内没有 manual 点，单独计算时结果为空，此时返回 None。
+        """
+        index = int(np.searchsorted(self.ordinals, start_date.toordinal(), side='left'))
+        if not (self.sources[index:] == SOURCE_MANUAL).any():
+            return None
+        return index
+
+    def dates(self) -> List[date]:
+        return [date.fromordinal(o) for o in self.ordinals.tolist()]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """转换为 [{"date", "value", "source"}, ...]（仅在 API 边界使用）"""
+        return [
+            {"date": d, "value": v, "source": SOURCE_LABELS[s]}
+            for d, v, s in zip(self.dates(), self.values.tolist(), self.sources.tolist())
+        ]
+
+
+def build_valuation_series(
+    manual_ordinals: np.ndarray,
+    manual_values: np.ndarray,
+    start_date: date,
+    end_date: date
+) -> ValuationSeries:
+    """
+    由 manual 点构建逐日估值序列（向量化）
+
+    manual_ordinals/manual_values 按日期升序，可包含范围前后各一个边界点，
+    且范围内至少有一个 manual 点。规则与逐日循环实现一致：
+    - 起点为 max(第一个 manual 点, start_date)，终点为 end_date
+    - 范围内的 manual 点标记为 manual
+    - 相邻 manual 点之间线性插值（interpolated）
+    - 最后一个 manual 点之后保持其值（extrapolated）
+    """
+    xp = np.asarray(manual_ordinals, dtype=np.int64)
+    fp = np.asarray(manual_values, dtype=np.float64)
+
+    first = max(int(xp[0]), start_date.toordinal())
+    x = np.arange(first, end_date.toordinal() + 1, dtype=np.int64)
+
+    # 每一天左侧（含当天）最近的 manual 点
+    left = np.searchsorted(xp, x, side='right') - 1
+    is_manual = xp[left] == x
+    is_extrapolated = (left == len(xp) - 1) & ~is_manual
+    is_interpolated = ~(is_manual | is_extrapolated)
+
+    values = fp[left].copy()
+    if is_interpolated.any():
+        li = left[is_interpolated]
+        left_x, right_x = xp[li], xp[li + 1]
+        left_v, right_v = fp[li], fp[li + 1]
+        # 与逐点公式 left + (right - left) * (curr_days / total_days) 保持相同的运算顺序
+        values[is_interpolated] = left_v + (right_v - left_v) * ((x[is_interpolated] - left_x) / (right_x - left_x))
+
+    sources = np.full(len(x), SOURCE_INTERPOLATED, dtype=np.int8)
+    sources[is_manual] = SOURCE_MANUAL
+    sources[is_extrapolated] = SOURCE_EXTRAPOLATED
+
+    return ValuationSeries(x, values, sources)
+
+
+@lru_cache(maxsize=None)
+def _manual_points_statement(filter_products: bool):
+    """
+    一次查询取出多个产品的插值所需 manual 点：
+    范围内全部点 + 范围前最近一点 + 范围后最近一点（边界点由分组子查询在 SQL 中求出）
+
+    语句只构建一次，通过绑定参数 start_date / end_date / product_ids 执行。
+    """
+    start_date = bindparam('start_date', type_=Date)
+    end_date = bindparam('end_date', type_=Date)
+
+    def _scoped(statement):
+        if filter_products:
+            statement = statement.where(ProductValuation.product_id.in_(bindparam('product_ids', expanding=True)))
+        return statement
+
+    prev_dates = _scoped(
+        select(ProductValuation.product_id, func.max(ProductValuation.date).label('boundary_date'))
+        .where(ProductValuation.date < start_date)
+        .group_by(ProductValuation.product_id)
+    ).subquery()
+
+    next_dates = _scoped(
+        select(ProductValuation.product_id, func.min(ProductValuation.date).label('boundary_date'))
+        .where(ProductValuation.date > end_date)
+        .group_by(ProductValuation.product_id)
+    ).subquery()
+
+    columns = (ProductValuation.product_id, ProductValuation.date, ProductValuation.market_value)
+
+    in_range = _scoped(
+        select(*columns, literal(True).label('in_range'))
+        .where(ProductValuation.date >= start_date, ProductValuation.date <= end_date)
+    )
+    prev_points = select(*columns, literal(False).label('in_range')).join(
+        prev_dates,
+        (ProductValuation.product_id == prev_dates.c.product_id) &
+        (ProductValuation.date == prev_dates.c.boundary_date)
+    )
+    next_points = select(*columns, literal(False).label('in_range')).join(
+        next_dates,
+        (ProductValuation.product_id == next_dates.c.product_id) &
+        (ProductValuation.date == next_dates.c.boundary_date)
+    )
+
+    points = union_all(prev_points, in_range, next_points).subquery()
+    return select(
+        points.c.product_id, points.c.date, points.c.market_value, points.c.in_range
+    ).order_by(points.c.product_id, points.c.date)
+
+
+def get_valuation_series_batch(
+    session: Session,
+    product_ids: Optional[List[int]],
+    start_date: date,
+    end_date: date
+) -> Dict[int, ValuationSeries]:
+    """
+    批量获取多个产品的连续估值序列（固定 1 次查询，与产品数量无关）
+
+    Args:
+        product_ids: 产品ID列表，为 None 时加载全部产品
+    Returns:
+        {product_id: ValuationSeries}，范围内没有 manual 点的产品不出现在结果中
+    """
+    params = {"start_date": start_date, "end_date": end_date}
+    if product_ids is not None:
+        params["product_ids"] = list(product_ids)
+    statement = _manual_points_statement(product_ids is not None)
+    rows = session.exec(statement, params=params).all()
+
+    grouped: Dict[int, Dict[str, Any]] = {}
+    for product_id, point_date, market_value, in_range in rows:
+        points = grouped.setdefault(product_id, {"ordinals": [], "values": [], "has_range_point": False})
+        points["ordinals"].append(point_date.toordinal())
+        points["values"].append(market_value)
+        points["has_range_point"] = points["has_range_point"] or bool(in_range)
+
+    return {
+        product_id: build_valuation_series(
+            np.array(points["ordinals"], dtype=np.int64),
+            np.array(points["values"], dtype=np.float64),
+            start_date,
+            end_date
+        )
+        for product_id, points in grouped.items()
+        if points["has_range_point"]
+    }
+
+
+def get_valuation_series_arrays(
     session: Session,
     product_id: int,
     start_date: date,
     end_date: date,
     interpolate: bool = True
-) -> List[Dict[str, Any]]:
+) -> ValuationSeries:
     """
-    获取连续的估值序列，支持插值
+    获取连续的估值序列（列式），支持插值
     只在两个 manual 点之间插值，之外使用外推（extrapolated）
-    返回格式: [{"date": date, "value": float, "source": "manual"|"interpolated"|"extrapolated"}, ...]
     - manual: 用户录入的真实估值点
     - interpolated: 在两个 manual 点之间线性插值
     - extrapolated: 在最后一个 manual 点之后外推（保持最后一个值）
     """
-    # 1. 获取范围内的所有 manual 点
-    raw_points = list_valuations(session, product_id, start_date, end_date)
-    
     if not interpolate:
-        return [{"date": p.date, "value": p.market_value, "source": "manual"} for p in raw_points]
-    
-    # 2. 如果没有 manual 点，返回空
-    if not raw_points:
-        return []
-        
-    # 3. 只在 manual 点之间插值，之外断线
-    # 获取范围前的最近一个点（用于插值边界）
-    prev_point = session.exec(
-        select(ProductValuation)
-        .where(ProductValuation.product_id == product_id, ProductValuation.date < start_date)
-        .order_by(ProductValuation.date.desc())
-        .limit(1)
-    ).first()
-    
-    # 获取范围后的最近一个点（用于插值边界）
-    next_point = session.exec(
-        select(ProductValuation)
-        .where(ProductValuation.product_id == product_id, ProductValuation.date > end_date)
-        .order_by(ProductValuation.date.asc())
-        .limit(1)
-    ).first()
-    
-    # 构建完整的 manual 点列表（包含边界点）
-    all_manual_points = []
-    if prev_point:
-        all_manual_points.append(prev_point)
-    all_manual_points.extend(raw_points)
-    if next_point:
-        all_manual_points.append(next_point)
-    
-    # 4. 只在相邻 manual 点之间插值
-    result = []
-    
-    # 处理只有一个点的情况
-    if len(all_manual_points) == 1:
-        single_point = all_manual_points[0]
-        if start_date <= single_point.date <= end_date:
-            result.append({
-                "date": single_point.date,
-                "value": float(single_point.market_value),
-                "source": "manual"
-            })
-        # 外推到 end_date（使用 extrapolated 标记）
-        if single_point.date < end_date:
-            curr = single_point.date + timedelta(days=1)
-            while curr <= end_date:
-                result.append({
-                    "date": curr,
-                    "value": float(single_point.market_value),
-                    "source": "extrapolated"
-                })
-                curr += timedelta(days=1)
-        return result
-    
-    for i in range(len(all_manual_points) - 1):
-        left_point = all_manual_points[i]
-        right_point = all_manual_points[i + 1]
-        
-        # 确定当前区间的有效范围（与请求范围交集）
-        interval_start = max(left_point.date, start_date)
-        interval_end = min(right_point.date, end_date)
-        
-        if interval_start > interval_end:
-            continue
-        
-        # 生成区间内的所有日期
-        curr = interval_start
-        while curr <= interval_end:
-            if curr == left_point.date:
-                # manual 点 - 只在范围内添加（避免与上一个区间的right_point重复）
-                if curr >= start_date:
-                    result.append({
-                        "date": curr,
-                        "value": float(left_point.market_value),
-                        "source": "manual"
-                    })
-            elif curr == right_point.date:
-                # manual 点 - 只在范围内添加
-                # 如果是最后一个区间，需要添加right_point；否则跳过（会在下一个区间作为left_point添加）
-                is_last_interval = (i == len(all_manual_points) - 2)
-                if curr <= end_date and curr >= start_date and is_last_interval:
-                    result.append({
-                        "date": curr,
-                        "value": float(right_point.market_value),
-                        "source": "manual"
-                    })
-            else:
-                # 插值点
-                total_days = (right_point.date - left_point.date).days
-                curr_days = (curr - left_point.date).days
-                
-                left_val = float(left_point.market_value)
-                right_val = float(right_point.market_value)
-                val = left_val + (right_val - left_val) * (curr_days / total_days)
-                result.append({
-                    "date": curr,
-                    "value": val,
-                    "source": "interpolated"
-                })
-            
-            curr += timedelta(days=1)
-    
-    # 5. 最后一个 manual 点之后到 end_date 进行外推（extrapolated）
-    last_manual_point = all_manual_points[-1]
-    if last_manual_point.date < end_date:
-        # 使用0斜率外推：保持最后一个manual点的值
-        # 明确标记为 extrapolated，与 interpolated 区分，避免误导
-        curr = last_manual_point.date + timedelta(days=1)
-        while curr <= end_date:
-            result.append({
-                "date": curr,
-                "value": float(last_manual_point.market_value),
-                "source": "extrapolated"
-            })
-            curr += timedelta(days=1)
-
-    return result
+        raw_points = list_valuations(session, product_id, start_date, end_date)
+        return ValuationSeries(
+            np.array([p.date.toordinal() for p in raw_points], dtype=np.int64),
+            np.array([p.market_value for p in raw_points], dtype=np.float64),
+            np.full(len(raw_points), SOURCE_MANUAL, dtype=np.int8)
+        )
+
+    # 范围内没有 manual 点时返回空序列
+    series_by_product = get_valuation_series_batch(session, [product_id], start_date, end_date)
+    return series_by_product.get(product_id) or ValuationSeries.empty()
+
+
+def get_valuation_series(
+    session: Session,
+    product_id: int,
+    start_date: date,
+    end_date: date,
+    interpolate: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    获取连续的估值序列（字典形式，供 API 输出）
+    返回格式: [{"date": date, "value": float, "source": "manual"|"interpolated"|"extrapolated"}, ...]
+    """
+    return get_valuation_series_arrays(session, product_id, start_date, end_date, interpolate).to_dicts()
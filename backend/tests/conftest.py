@@ -0,0 +1,67 @@
+"""
+测试公共夹具
+
+每个测试使用 tmp_path 下独立的 SQLite 文件，通过 create_app 完成建表与迁移。
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from config import Config
+from database import get_engine, get_session
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        DATABASE_URL = f"sqlite:///{tmp_path / 'test.db'}"
+
+    app = create_app(TestConfig)
+    yield app
+    get_engine().dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def session(app):
+    session = get_session()
+    yield session
+    session.close()
+
+
+class QueryCounter:
+    """统计引擎上执行的 SQL 语句条数"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @contextmanager
+    def __call__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+@pytest.fixture
+def count_queries(app):
+    """用法：with count_queries() as counter: ...; counter.count"""
+    return QueryCounter(get_engine())
@@ -0,0 +1 @@
+"""基线实现的原样副本，用于新旧实现的一致性测试"""
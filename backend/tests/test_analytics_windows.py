@@ -0,0 +1,73 @@
+"""
+calculate_metrics_by_window 与逐窗口调用 calculate_metrics 的一致性
+"""
+
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from services.analytics_service import calculate_metrics, calculate_metrics_by_window
+
+
+def _series(n, seed, base=1000.0, drift=0.0003, noise=0.01):
+    rnd = random.Random(seed)
+    start = date(2022, 1, 1)
+    dates, values = [], []
+    value = base
+    day = start
+    for _ in range(n):
+        dates.append(day)
+        values.append(value)
+        value *= 1 + drift + rnd.gauss(0, noise)
+        day += timedelta(days=rnd.choice((1, 1, 1, 3)))
+    return dates, values
+
+
+def _assert_window_matches(dates, values, start):
+    ordinals = [d.toordinal() for d in dates]
+    windowed = calculate_metrics_by_window(ordinals, values, {"w": start})["w"]
+    direct = calculate_metrics((dates[start:], values[start:]))
+    assert (windowed is None) == (direct is None)
+    if direct is None:
+        return
+    # 波动率与 calculate_metrics 使用同一算法（对同一切片求 np.std），应逐位一致
+    assert windowed["volatility"] == direct["volatility"]
+    for key in ("twr", "annualized", "max_drawdown"):
+        assert windowed[key] == pytest.approx(direct[key], rel=1e-12, abs=1e-12)
+    assert windowed["drawdown_recovery_days"] == direct["drawdown_recovery_days"]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_windows_match_calculate_metrics(seed):
+    dates, values = _series(400, seed)
+    for start in (0, 1, 7, 30, 90, 180, 365, 397, 398, 399):
+        _assert_window_matches(dates, values, start)
+
+
+def test_volatility_stable_for_near_constant_returns():
+    # 窗口内日收益率几乎恒定且与全序列均值相差很大（前段上涨、后段下跌），
+    # 用平方和相减求方差会出现灾难性抵消
+    rnd = random.Random(1)
+    dates = [date(2020, 1, 1) + timedelta(days=i) for i in range(3000)]
+    values = [1e6]
+    for i in range(len(dates) - 1):
+        rate = 1.02 if i < 2000 else 0.97
+        values.append(values[-1] * (rate + rnd.uniform(-1e-9, 1e-9)))
+    ordinals = [d.toordinal() for d in dates]
+    starts = {"all": 0, "1y": len(values) - 366, "1m": len(values) - 31}
+
+    result = calculate_metrics_by_window(ordinals, values, starts)
+    returns = np.asarray(values[1:]) / np.asarray(values[:-1]) - 1
+    for window, start in starts.items():
+        expected = float(np.std(returns[start:], ddof=1)) * np.sqrt(365) * 100
+        assert result[window]["volatility"] == pytest.approx(expected, rel=1e-12)
+
+
+def test_short_windows_return_none():
+    dates, values = _series(10, 0)
+    ordinals = [d.toordinal() for d in dates]
+    result = calculate_metrics_by_window(ordinals, values, {"last": 9, "all": 0})
+    assert result["last"] is None
+    assert result["all"] is not None
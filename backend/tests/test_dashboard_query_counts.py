@@ -0,0 +1,77 @@
+"""
+仪表盘各端点的 SQL 查询条数
+
+每个端点的查询条数是固定预算，与账户、产品、交易、估值数量无关（无 N+1）：
+先在少量数据上请求一次，追加大量数据后再请求一次，两次都必须等于预算。
+"""
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from models import (
+    Account, AccountType, LiquidityRule, Product, ProductType, ProductValuation, Snapshot, Transaction
+)
+
+TODAY = date.today()
+CATEGORIES = ('buy', 'redeem_request', 'redeem_settle', 'redeem_request', 'fee')
+
+# (url, 查询条数预算)
+ENDPOINT_BUDGETS = [
+    ('/api/dashboard/available_dates', 1),
+    ('/api/dashboard/latest_date', 1),
+    (f'/api/dashboard/summary?date={TODAY.isoformat()}', 6),
+    ('/api/dashboard/pending_redeems', 1),
+    ('/api/dashboard/future_cash_flow?days=30', 3),
+    (f'/api/dashboard/cash_detail?date={TODAY.isoformat()}', 2),
+    ('/api/dashboard/cash_timeline', 7),
+    ('/api/dashboard/cash_curve?days=90', 6),
+]
+
+
+def _add_portfolio(session, count, seed):
+    """追加 count 个账户与 count 个产品，以及它们的快照、估值和交易（含在途赎回）"""
+    rng = random.Random(seed)
+    accounts = [
+        Account(name=f'acct{seed}-{i}', type=(AccountType.DEBIT, AccountType.CREDIT)[i % 5 == 0], is_liquid=i % 4 != 0)
+        for i in range(count)
+    ]
+    products = [
+        Product(
+            name=f'prod{seed}-{i}', product_type=ProductType.BANK_WMP,
+            liquidity_rule=tuple(LiquidityRule)[i % 3], term_days=(None, 90)[i % 2], settle_days=1 + i % 3
+        )
+        for i in range(count)
+    ]
+    session.add_all(accounts + products)
+    session.commit()
+
+    for account in accounts:
+        for days_ago in range(0, 40, 5):
+            session.add(Snapshot(date=TODAY - timedelta(days=days_ago), account_id=account.id, balance=rng.uniform(-500, 1e4)))
+    for product in products:
+        for days_ago in range(0, 60, 3):
+            session.add(ProductValuation(
+                product_id=product.id, date=TODAY - timedelta(days=days_ago), market_value=rng.uniform(900, 1100)
+            ))
+        for index, category in enumerate(CATEGORIES):
+            trade_date = TODAY - timedelta(days=rng.randint(0, 60))
+            session.add(Transaction(
+                product_id=product.id, account_id=rng.choice(accounts).id, category=category,
+                trade_date=trade_date, settle_date=trade_date + timedelta(days=2) if index != 3 else None,
+                amount=rng.uniform(100, 1000)
+            ))
+    session.commit()
+
+
+@pytest.mark.parametrize('url,budget', ENDPOINT_BUDGETS, ids=[url.split('?')[0] for url, _ in ENDPOINT_BUDGETS])
+def test_query_count_is_fixed(client, session, count_queries, url, budget):
+    counts = []
+    for size, seed in ((2, 1), (40, 2)):
+        _add_portfolio(session, size, seed)
+        with count_queries() as counter:
+            response = client.get(url)
+        assert response.status_code == 200, url
+        counts.append(counter.count)
+    assert counts == [budget, budget], '\n'.join(counter.statements)
@@ -0,0 +1,78 @@
+"""
+向量化 calculate_metrics 与基线纯 Python 实现（tests/legacy/metrics.py）的一致性
+"""
+
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from services.analytics_service import calculate_metrics
+from tests.legacy.metrics import calculate_metrics as legacy_calculate_metrics
+
+# 波动率：np.std 使用成对求和，基线为顺序求和，二者仅有舍入级差异
+VOLATILITY_REL_TOL = 1e-12
+
+
+def _walk(rng, n, kind):
+    day = date(2024, 1, 1) + timedelta(days=rng.randint(0, 300))
+    value = rng.uniform(1, 1e6)
+    points = []
+    for _ in range(n):
+        if kind == 'ties':
+            # 大量持平与重复峰值
+            value = round(value * (1 + rng.choice((-0.01, 0, 0.01))), 2)
+        elif kind == 'flat':
+            value = value if rng.random() < 0.7 else value * rng.uniform(0.9, 1.1)
+        elif kind == 'crash':
+            # 中途清零后恢复：前值为 0 的日收益率记为 0
+            value = 0.0 if rng.random() < 0.05 else abs(value or 1000.0) * (1 + rng.gauss(0, 0.05))
+        else:
+            value *= 1 + rng.gauss(0.0003, 0.01)
+        points.append({'date': day, 'value': value})
+        day += timedelta(days=rng.choice((1, 1, 1, 2, 3)))
+    return points
+
+
+def _corpus():
+    rng = random.Random(9)
+    corpus = [
+        [],
+        [{'date': date(2024, 1, 1), 'value': 100.0}],
+        [{'date': date(2024, 1, 1), 'value': 100.0}, {'date': date(2024, 1, 1), 'value': 120.0}],
+        [{'date': date(2024, 1, 1), 'value': 0.0}, {'date': date(2024, 1, 2), 'value': 120.0}],
+        [{'date': date(2024, 1, 1), 'value': 100.0}, {'date': date(2024, 1, 5), 'value': 0.0}],
+        [{'date': date(2024, 1, 1) + timedelta(days=i), 'value': 50.0} for i in range(10)],
+    ]
+    for kind in ('walk', 'ties', 'flat', 'crash'):
+        for _ in range(150):
+            corpus.append(_walk(rng, rng.randint(2, 400), kind))
+    return corpus
+
+
+def _assert_same(actual, expected):
+    assert (actual is None) == (expected is None)
+    if expected is None:
+        return
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if key == 'volatility':
+            assert actual[key] == pytest.approx(value, rel=VOLATILITY_REL_TOL, abs=1e-15)
+        else:
+            assert actual[key] == value, key
+
+
+@pytest.mark.parametrize('series', _corpus())
+def test_matches_legacy(series):
+    _assert_same(calculate_metrics(series), legacy_calculate_metrics(series))
+
+
+@pytest.mark.parametrize('series', _corpus()[:80])
+def test_columnar_inputs_match_list_input(series):
+    expected = calculate_metrics(series)
+    dates = [p['date'] for p in series]
+    values = [p['value'] for p in series]
+    ordinals = np.array([d.toordinal() for d in dates], dtype=np.int64)
+    assert calculate_metrics((dates, values)) == expected
+    assert calculate_metrics((ordinals, np.array(values))) == expected
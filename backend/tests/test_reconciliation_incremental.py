@@ -0,0 +1,271 @@
+"""
+对账警告增量缓存与全量重算的一致性
+
+通过 API 执行随机写入序列，每一步之后比较 /reconciliation/warnings（只增量重算 dirty 对象）
+与 get_all_warnings 全量重算的结果。新产品经 product_service 创建（POST /products 不在本测试范围内）。
+另覆盖并发冷启动、缓存写入冲突时的回退，以及参数交替时不重建缓存。
+"""
+
+import random
+import threading
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import func, select
+
+from database import get_session
+from models import LiquidityRule, ProductType, ReconciliationCacheState, ReconciliationDirtyObject
+from services.product_service import create_product
+from services.reconciliation_service import get_all_warnings
+
+TODAY = date.today()
+STEPS = 60
+# 查询参数组合：不同参数对应不同的缓存签名
+PARAMS_CHOICES = ({}, {'gap_days': 7}, {'redeem_buffer': 0}, {'date': (TODAY - timedelta(days=1)).isoformat()})
+OPERATIONS = (
+    'tx', 'tx', 'del_tx', 'snapshot', 'valuation', 'valuation', 'del_valuation',
+    'patch_product', 'patch_account', 'new_product', 'del_product', 'new_account', 'mute'
+)
+
+
+def _day(days_ago):
+    return (TODAY - timedelta(days=days_ago)).isoformat()
+
+
+def _items(response):
+    data = response.get_json()['data']
+    return data['items'] if isinstance(data, dict) else data
+
+
+def _seed(client):
+    for i in range(4):
+        assert client.post('/api/accounts', json={'name': f'acct{i}', 'type': 'debit'}).status_code in (200, 201)
+    for i in range(5):
+        _new_product(f'prod{i}', tuple(LiquidityRule)[i % 3], settle_days=1 + i % 3)
+
+
+def _new_product(name, liquidity_rule=LiquidityRule.OPEN, settle_days=1):
+    session = get_session()
+    try:
+        create_product(session, name, ProductType.BANK_WMP, liquidity_rule, settle_days=settle_days)
+    finally:
+        session.close()
+
+
+def _apply_random_write(client, rng, step):
+    products = [p['id'] for p in _items(client.get('/api/products'))]
+    accounts = [a['id'] for a in _items(client.get('/api/accounts'))]
+    op = rng.choice(OPERATIONS)
+
+    if op == 'tx' and products and accounts:
+        client.post('/api/transactions', json={
+            'product_id': rng.choice(products), 'account_id': rng.choice(accounts),
+            'category': rng.choice(('buy', 'redeem_request', 'redeem_settle', 'fee')),
+            'trade_date': _day(rng.randint(-3, 60)), 'settle_date': _day(rng.randint(-3, 30)),
+            'amount': rng.choice((100.0, 250.5, 1000.0))
+        })
+    elif op == 'del_tx':
+        transactions = _items(client.get('/api/transactions?page_size=200'))
+        if transactions:
+            client.delete(f"/api/transactions/{rng.choice(transactions)['id']}")
+    elif op == 'snapshot' and accounts:
+        client.post('/api/snapshots/batch_upsert', json={'rows': [
+            {'date': _day(rng.randint(0, 5)), 'account_id': rng.choice(accounts), 'balance': rng.uniform(0, 9999)}
+            for _ in range(3)
+        ]})
+    elif op == 'valuation' and products:
+        client.post('/api/valuations/batch_upsert', json={'rows': [
+            {'product_id': rng.choice(products), 'date': _day(rng.randint(0, 40)), 'market_value': rng.uniform(900, 1100)}
+            for _ in range(2)
+        ]})
+    elif op == 'del_valuation' and products:
+        product_id = rng.choice(products)
+        valuations = _items(client.get(f'/api/products/{product_id}/valuations'))
+        if valuations:
+            client.delete(f"/api/products/{product_id}/valuations?date={rng.choice(valuations)['date']}")
+    elif op == 'patch_product' and products:
+        client.patch(f'/api/products/{rng.choice(products)}', json={'name': f'renamed{step}', 'settle_days': rng.randint(0, 5)})
+    elif op == 'patch_account' and accounts:
+        client.patch(f'/api/accounts/{rng.choice(accounts)}', json={'name': f'acct-r{step}'})
+    elif op == 'new_product':
+        _new_product(f'new{step}')
+    elif op == 'del_product' and products:
+        # 有交易的产品删除会违反外键约束（既有行为），只删除无交易的产品
+        product_id = rng.choice(products)
+        if not _items(client.get(f'/api/products/{product_id}/transactions')):
+            client.delete(f'/api/products/{product_id}')
+    elif op == 'new_account':
+        client.post('/api/accounts', json={'name': f'new-acct{step}', 'type': 'debit'})
+    elif op == 'mute':
+        warnings = _items(client.get('/api/reconciliation/warnings'))
+        if warnings:
+            client.put(
+                f"/api/reconciliation/warnings/{rng.choice(warnings)['id']}/status",
+                json={'status': 'muted', 'mute_reason': 'test'}
+            )
+    return op
+
+
+def _full_recompute(params):
+    session = get_session()
+    try:
+        warnings = get_all_warnings(
+            session,
+            target_date=date.fromisoformat(params['date']) if 'date' in params else TODAY,
+            valuation_gap_days=params.get('gap_days', 14),
+            redeem_buffer_days=params.get('redeem_buffer', 3)
+        )
+        return [w.to_dict() for w in warnings]
+    finally:
+        session.close()
+
+
+@pytest.mark.parametrize('seed', [13, 29, 71])
+def test_incremental_matches_full_recompute(client, seed):
+    rng = random.Random(seed)
+    _seed(client)
+    seen_types = set()
+    for step in range(STEPS):
+        op = _apply_random_write(client, rng, step)
+        params = rng.choice(PARAMS_CHOICES)
+        cached = _items(client.get('/api/reconciliation/warnings', query_string=params))
+        full = _full_recompute(params)
+        assert cached == full, (step, op, params)
+        seen_types.update(w['type'] for w in full)
+    # 序列需要真正触发过警告，否则比较没有意义
+    assert seen_types
+
+
+def test_refresh_matches_incremental(client):
+    rng = random.Random(5)
+    _seed(client)
+    for step in range(STEPS):
+        _apply_random_write(client, rng, step)
+    incremental = _items(client.get('/api/reconciliation/warnings'))
+    refreshed = _items(client.get('/api/reconciliation/warnings', query_string={'refresh': 'true'}))
+    assert incremental == refreshed == _full_recompute({})
+
+
+def _concurrent_gets(app, monkeypatch, params_list):
+    """多个请求同时读取警告：全部算完之后才开始写缓存，复现并发冷启动 / 参数不同的竞争"""
+    from services import reconciliation_service
+
+    barrier = threading.Barrier(len(params_list), timeout=10)
+    build_warnings = reconciliation_service._build_warnings
+
+    def build_then_wait(*args, **kwargs):
+        result = build_warnings(*args, **kwargs)
+        barrier.wait()
+        return result
+
+    monkeypatch.setattr(reconciliation_service, '_build_warnings', build_then_wait)
+    responses = [None] * len(params_list)
+
+    def get(index):
+        try:
+            responses[index] = app.test_client().get('/api/reconciliation/warnings', query_string=params_list[index])
+        except Exception as e:  # TESTING 模式下视图异常直接抛出
+            responses[index] = e
+
+    threads = [threading.Thread(target=get, args=(i,)) for i in range(len(params_list))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    monkeypatch.setattr(reconciliation_service, '_build_warnings', build_warnings)
+    return responses
+
+
+@pytest.mark.parametrize('params_list', [
+    [{}, {}],
+    [{}, {'gap_days': 7}],
+], ids=['cold', 'different-signatures'])
+def test_concurrent_cold_gets(app, client, monkeypatch, params_list):
+    _seed(client)
+    products = [p['id'] for p in _items(client.get('/api/products'))]
+    accounts = [a['id'] for a in _items(client.get('/api/accounts'))]
+    client.post('/api/snapshots/batch_upsert', json={'rows': [
+        {'date': _day(0), 'account_id': account_id, 'balance': 100.0 * account_id} for account_id in accounts
+    ]})
+    client.post('/api/transactions', json={
+        'product_id': products[0], 'account_id': accounts[0], 'category': 'redeem_request',
+        'trade_date': _day(30), 'amount': 500.0
+    })
+
+    responses = _concurrent_gets(app, monkeypatch, params_list)
+    for response, params in zip(responses, params_list):
+        assert not isinstance(response, Exception), repr(response)
+        assert response.status_code == 200, response.get_json()
+        assert _items(response) == _full_recompute(params)
+
+    # 之后的请求仍然正确（缓存未被并发写坏）
+    for params in params_list:
+        assert _items(client.get('/api/reconciliation/warnings', query_string=params)) == _full_recompute(params)
+
+
+def _cache_state(session):
+    session.expire_all()
+    state = session.get(ReconciliationCacheState, 1)
+    return None if state is None else (state.signature, state.built_at)
+
+
+def test_write_conflict_returns_uncached_result(client, session, monkeypatch):
+    from services import reconciliation_service
+
+    _seed(client)
+    client.post('/api/snapshots/batch_upsert', json={'rows': [{'date': _day(0), 'account_id': 1, 'balance': 50.0}]})
+    real_upsert = reconciliation_service.upsert_rows
+
+    def upsert_then_lock_timeout(*args, **kwargs):
+        real_upsert(*args, **kwargs)
+        raise OperationalError('UPDATE reconciliation_cache_state', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(reconciliation_service, 'upsert_rows', upsert_then_lock_timeout)
+    response = client.get('/api/reconciliation/warnings')
+    assert response.status_code == 200
+    assert _items(response) == _full_recompute({})
+    # 本次缓存写入整体回滚，dirty 登记保留到下次
+    assert _cache_state(session) is None
+    assert session.exec(select(func.count()).select_from(ReconciliationDirtyObject)).one() > 0
+
+    monkeypatch.setattr(reconciliation_service, 'upsert_rows', real_upsert)
+    assert _items(client.get('/api/reconciliation/warnings')) == _full_recompute({})
+    assert _cache_state(session) is not None
+
+
+def test_cache_rebuilt_during_incremental_compute(app, client, session, monkeypatch):
+    from services import reconciliation_service
+
+    _seed(client)
+    client.get('/api/reconciliation/warnings')
+    client.post('/api/snapshots/batch_upsert', json={'rows': [{'date': _day(0), 'account_id': 2, 'balance': 70.0}]})
+    build_warnings = reconciliation_service._build_warnings
+
+    def build_while_other_request_rebuilds(*args, **kwargs):
+        result = build_warnings(*args, **kwargs)
+        monkeypatch.setattr(reconciliation_service, '_build_warnings', build_warnings)
+        assert app.test_client().get('/api/reconciliation/warnings?refresh=true').status_code == 200
+        return result
+
+    monkeypatch.setattr(reconciliation_service, '_build_warnings', build_while_other_request_rebuilds)
+    before = _cache_state(session)
+    response = client.get('/api/reconciliation/warnings')
+    assert response.status_code == 200
+    assert _items(response) == _full_recompute({})
+    assert _cache_state(session) != before
+    assert _items(client.get('/api/reconciliation/warnings')) == _full_recompute({})
+
+
+def test_alternating_parameters_do_not_rebuild_cache(client, session):
+    _seed(client)
+    client.post('/api/snapshots/batch_upsert', json={'rows': [{'date': _day(0), 'account_id': 1, 'balance': 50.0}]})
+    client.get('/api/reconciliation/warnings')
+    state = _cache_state(session)
+    for params in ({'gap_days': 7}, {}, {'redeem_buffer': 0}, {}):
+        assert _items(client.get('/api/reconciliation/warnings', query_string=params)) == _full_recompute(params)
+        assert _cache_state(session) == state
+
+    # refresh=true 按新参数重建
+    client.get('/api/reconciliation/warnings', query_string={'gap_days': 7, 'refresh': 'true'})
+    assert _cache_state(session)[0] != state[0]
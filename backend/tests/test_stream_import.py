@@ -0,0 +1,241 @@
+"""
+流式导入接口：POST /snapshots/import 与 POST /valuations/import
+"""
+
+import json
+
+import pytest
+from sqlmodel import func, select
+
+from app import create_app
+from config import Config
+from database import get_engine
+from models import Account, AccountType, Product, ProductType, LiquidityRule, ProductValuation, Snapshot
+
+CHUNK_SIZE = 3
+
+
+@pytest.fixture
+def ids(app, session):
+    app.config['IMPORT_CHUNK_SIZE'] = CHUNK_SIZE
+    account = Account(name='acct', type=AccountType.DEBIT)
+    product = Product(name='prod', product_type=ProductType.FUND, liquidity_rule=LiquidityRule.OPEN)
+    session.add_all([account, product])
+    session.commit()
+    return account.id, product.id
+
+
+def _count(session, model):
+    session.expire_all()
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+def _csv(header, rows):
+    return header + '\n' + ''.join(row + '\n' for row in rows)
+
+
+def _ndjson(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def _post(client, url, body, content_type):
+    response = client.post(url, data=body, content_type=content_type)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def test_snapshot_csv_happy_path(client, session, ids):
+    account_id, _ = ids
+    body = _csv('date,account_id,balance', [f'2024-01-0{day},{account_id},{day * 100}' for day in range(1, 6)])
+    data = _post(client, '/api/snapshots/import', body, 'text/csv')
+    assert data['format'] == 'csv'
+    assert (data['lines'], data['accepted'], data['inserted'], data['updated']) == (5, 5, 5, 0)
+    assert (data['error_count'], data['errors'], data['stream_error']) == (0, [], None)
+    assert _count(session, Snapshot) == 5
+
+    # 重复导入：未变化的行不计数，变化的行计为更新
+    body = _csv('date,account_id,balance', [f'2024-01-01,{account_id},100', f'2024-01-02,{account_id},999'])
+    data = _post(client, '/api/snapshots/import', body, 'text/csv')
+    assert (data['accepted'], data['inserted'], data['updated']) == (2, 0, 1)
+    assert _count(session, Snapshot) == 5
+
+
+def test_valuation_ndjson_happy_path(client, session, ids):
+    _, product_id = ids
+    body = _ndjson([
+        {'product_id': product_id, 'date': f'2024-02-0{day}', 'market_value': 1000 + day} for day in range(1, 5)
+    ])
+    data = _post(client, '/api/valuations/import', body, 'application/x-ndjson')
+    assert data['format'] == 'ndjson'
+    assert (data['lines'], data['accepted'], data['inserted'], data['error_count']) == (4, 4, 4, 0)
+    assert _count(session, ProductValuation) == 4
+
+
+def test_format_query_param_overrides_content_type(client, ids):
+    _, product_id = ids
+    body = _csv('product_id,date,market_value', [f'{product_id},2024-02-01,1'])
+    data = _post(client, '/api/valuations/import?format=csv', body, 'application/octet-stream')
+    assert data['inserted'] == 1
+
+
+def test_unsupported_format_and_missing_columns(client, ids):
+    assert client.post('/api/snapshots/import', data='x', content_type='text/plain').status_code == 415
+    response = client.post('/api/snapshots/import', data='date,balance\n2024-01-01,1\n', content_type='text/csv')
+    assert response.status_code == 400
+    assert 'account_id' in response.get_json()['message']
+
+
+def test_bad_csv_rows_reported_with_line_numbers(client, session, ids):
+    account_id, _ = ids
+    body = _csv('date,account_id,balance', [
+        f'2024-01-01,{account_id},1',      # 第 2 行
+        f'2024-13-01,{account_id},1',      # 第 3 行：非法日期
+        '2024-01-02,,1',                   # 第 4 行：缺 account_id
+        f'2024-01-03,{account_id}',        # 第 5 行：列数不对
+        '',                                # 第 6 行：空行忽略
+        f'2024-01-04,{account_id},abc',    # 第 7 行：非法余额
+        f'2024-01-05,{account_id},5',      # 第 8 行
+    ])
+    data = _post(client, '/api/snapshots/import', body, 'text/csv')
+    assert data['errors'] == [
+        {'line': 3, 'error': 'invalid date format'},
+        {'line': 4, 'error': 'account_id is required'},
+        {'line': 5, 'error': 'expected 3 columns, got 2'},
+        {'line': 7, 'error': 'invalid balance'},
+    ]
+    assert (data['lines'], data['accepted'], data['inserted'], data['error_count']) == (6, 2, 2, 4)
+    assert _count(session, Snapshot) == 2
+
+
+def test_bad_ndjson_lines_reported_with_line_numbers(client, ids):
+    _, product_id = ids
+    body = '\n'.join([
+        json.dumps({'product_id': product_id, 'date': '2024-02-01', 'market_value': 1}),
+        '{not json',
+        '[1, 2]',
+        json.dumps({'product_id': product_id, 'date': '2024-02-02'}),
+        json.dumps({'product_id': True, 'date': '2024-02-03', 'market_value': 1}),
+    ]) + '\n'
+    data = _post(client, '/api/valuations/import', body, 'application/x-ndjson')
+    assert data['errors'] == [
+        {'line': 2, 'error': 'invalid JSON'},
+        {'line': 3, 'error': 'line must be a JSON object'},
+        {'line': 4, 'error': 'market_value is required'},
+        {'line': 5, 'error': 'invalid product_id'},
+    ]
+    assert (data['accepted'], data['inserted']) == (1, 1)
+
+
+def test_unknown_account_rejected_per_line(client, session, ids):
+    account_id, _ = ids
+    body = _csv('date,account_id,balance', [
+        f'2024-01-01,{account_id},1',
+        '2024-01-01,777,1',
+        f'2024-01-02,{account_id},2',
+        '2024-01-03,778,1',
+    ])
+    data = _post(client, '/api/snapshots/import', body, 'text/csv')
+    assert data['errors'] == [
+        {'line': 3, 'error': 'account_id 777 not found'},
+        {'line': 5, 'error': 'account_id 778 not found'},
+    ]
+    assert (data['lines'], data['accepted'], data['inserted'], data['error_count']) == (4, 2, 2, 2)
+    assert data['warnings'] == []
+    assert _count(session, Snapshot) == 2
+
+
+def test_unknown_product_rejected_per_line(client, session, ids):
+    _, product_id = ids
+    body = _csv('product_id,date,market_value', ['999,2024-01-01,100', f'{product_id},2024-01-01,100'])
+    data = _post(client, '/api/valuations/import', body, 'text/csv')
+    assert data['errors'] == [{'line': 2, 'error': 'product_id 999 not found'}]
+    assert (data['accepted'], data['inserted'], data['error_count']) == (1, 1, 1)
+    assert session.exec(select(ProductValuation.product_id)).all() == [product_id]
+
+
+def test_unknown_product_with_foreign_keys_enabled(tmp_path):
+    class ForeignKeyConfig(Config):
+        TESTING = True
+        DATABASE_URL = f"sqlite:///{tmp_path / 'fk.db'}"
+        SQLITE_FOREIGN_KEYS = True
+
+    client = create_app(ForeignKeyConfig).test_client()
+    try:
+        body = _csv('product_id,date,market_value', ['999,2024-01-01,100'])
+        data = _post(client, '/api/valuations/import', body, 'text/csv')
+        assert data['errors'] == [{'line': 2, 'error': 'product_id 999 not found'}]
+        assert data['inserted'] == 0
+    finally:
+        get_engine().dispose()
+
+
+def test_body_longer_than_chunk_size(client, session, ids):
+    _, product_id = ids
+    rows = [f'{product_id},2024-03-{day:02d},{day}' for day in range(1, 11)]
+    data = _post(client, '/api/valuations/import', _csv('product_id,date,market_value', rows), 'text/csv')
+    assert data['chunks'] == 4  # 10 行 / 每块 3 行
+    assert (data['lines'], data['accepted'], data['inserted']) == (10, 10, 10)
+    assert _count(session, ProductValuation) == 10
+
+
+def test_chunk_with_only_rejected_rows_is_counted(client, ids):
+    account_id, _ = ids
+    rows = ['2024-01-01,777,1'] * CHUNK_SIZE + [f'2024-01-01,{account_id},1']
+    data = _post(client, '/api/snapshots/import', _csv('date,account_id,balance', rows), 'text/csv')
+    assert (data['chunks'], data['accepted'], data['error_count']) == (2, 1, CHUNK_SIZE)
+
+
+def test_mid_stream_decode_error_fills_stream_error(client, session, ids):
+    account_id, _ = ids
+    # 足够长的合法前缀，使坏字节落在后续解码块中（TextIOWrapper 按 8KB 分块解码）
+    valid = [f'2024-01-{day % 28 + 1:02d},{account_id},{n}' for n, day in enumerate(range(2000))]
+    body = _csv('date,account_id,balance', valid).encode() + b'2024-02-01,1,\xff\xfe\n' + b'2024-02-02,1,1\n'
+    data = _post(client, '/api/snapshots/import', body, 'text/csv')
+    stream_error = data['stream_error']
+    assert stream_error is not None
+    assert 'decode' in stream_error['error']
+    assert 0 < stream_error['after_line'] <= len(valid)
+    # 出错前读出的行照常写入（同一键后面覆盖前面，只有 28 个不同日期）
+    assert data['lines'] == data['accepted'] == stream_error['after_line']
+    assert data['error_count'] == 1
+    assert _count(session, Snapshot) == 28
+
+
+def test_decode_error_in_first_block_is_stream_error(client, session, ids):
+    account_id, _ = ids
+    body = f'date,account_id,balance\n2024-01-01,{account_id},1\n'.encode() + b'\xff\n'
+    data = _post(client, '/api/snapshots/import', body, 'text/csv')
+    assert data['stream_error']['after_line'] == 0
+    assert data['accepted'] == 0
+    assert _count(session, Snapshot) == 0
+
+
+def test_progress_streamed_as_ndjson(client, session, ids):
+    _, product_id = ids
+    rows = [f'{product_id},2024-03-{day:02d},{day}' for day in range(1, 8)] + ['999,2024-03-09,1']
+    response = client.post(
+        '/api/valuations/import?progress=true',
+        data=_csv('product_id,date,market_value', rows),
+        content_type='text/csv'
+    )
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    progress = [line for line in lines if line['type'] == 'progress']
+    assert [p['chunks'] for p in progress] == [1, 2, 3]
+    assert [p['lines'] for p in progress] == [3, 6, 8]
+    assert [p['accepted'] for p in progress] == [3, 6, 7]
+    assert progress[-1]['error_count'] == 1
+
+    summary = lines[-1]
+    assert summary['type'] == 'summary'
+    assert summary['data']['format'] == 'csv'
+    assert (summary['data']['chunks'], summary['data']['inserted']) == (3, 7)
+    assert summary['data']['errors'] == [{'line': 9, 'error': 'product_id 999 not found'}]
+    assert _count(session, ProductValuation) == 7
+
+
+def test_progress_mode_rejects_bad_header_before_streaming(client, ids):
+    response = client.post('/api/snapshots/import?progress=true', data='x,y\n1,2\n', content_type='text/csv')
+    assert response.status_code == 400
@@ -0,0 +1,88 @@
+"""
+向量化估值序列与基线逐日循环实现（tests/legacy/valuation_series.py）的一致性
+"""
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from models import Product, ProductType, LiquidityRule, ProductValuation
+from services import valuation_service
+from tests.legacy import valuation_series as legacy
+
+BASE = date(2023, 1, 1)
+# 每个产品的 manual 点个数：覆盖无点、单点、稀疏与密集
+POINT_COUNTS = (0, 1, 2, 3, 10, 50, 200)
+
+
+@pytest.fixture
+def product_ids(session):
+    rng = random.Random(1)
+    products = [
+        Product(name=f"p{i}", product_type=ProductType.FUND, liquidity_rule=LiquidityRule.OPEN)
+        for i in range(len(POINT_COUNTS) * 6)
+    ]
+    session.add_all(products)
+    session.commit()
+    for index, product in enumerate(products):
+        count = POINT_COUNTS[index % len(POINT_COUNTS)]
+        for offset in sorted(rng.sample(range(0, 700), count)):
+            session.add(ProductValuation(
+                product_id=product.id,
+                date=BASE + timedelta(days=offset),
+                market_value=rng.uniform(0.5, 2) * 1000
+            ))
+    session.commit()
+    return [product.id for product in products]
+
+
+def _random_window(rng):
+    start = BASE + timedelta(days=rng.randint(-30, 720))
+    return start, start + timedelta(days=rng.randint(0, 400))
+
+
+def test_matches_legacy_on_random_windows(session, product_ids):
+    rng = random.Random(2)
+    for _ in range(600):
+        product_id = rng.choice(product_ids)
+        start, end = _random_window(rng)
+        interpolate = rng.random() < 0.9
+        expected = legacy.get_valuation_series(session, product_id, start, end, interpolate)
+        actual = valuation_service.get_valuation_series(session, product_id, start, end, interpolate)
+        assert actual == expected, (product_id, start, end, interpolate)
+
+
+def test_matches_legacy_on_boundaries(session, product_ids):
+    # 窗口恰好落在 manual 点上、单日窗口、窗口早于 / 晚于全部点
+    for product_id in product_ids:
+        points = legacy.list_valuations(session, product_id, date.min, date.max)
+        dates = [p.date for p in points]
+        windows = [
+            (BASE - timedelta(days=60), BASE - timedelta(days=1)),
+            (BASE + timedelta(days=800), BASE + timedelta(days=900)),
+        ]
+        if dates:
+            windows += [
+                (dates[0], dates[-1]),
+                (dates[0], dates[0]),
+                (dates[-1], dates[-1] + timedelta(days=10)),
+                (dates[len(dates) // 2], dates[-1]),
+                (dates[0] - timedelta(days=5), dates[len(dates) // 2] + timedelta(days=1)),
+            ]
+        for start, end in windows:
+            expected = legacy.get_valuation_series(session, product_id, start, end)
+            assert valuation_service.get_valuation_series(session, product_id, start, end) == expected
+
+
+def test_batch_matches_per_product_legacy(session, product_ids):
+    rng = random.Random(3)
+    for _ in range(20):
+        start, end = _random_window(rng)
+        batch = valuation_service.get_valuation_series_batch(session, None, start, end)
+        for product_id in product_ids:
+            expected = legacy.get_valuation_series(session, product_id, start, end)
+            if not expected:
+                assert product_id not in batch
+            else:
+                assert batch[product_id].to_dicts() == expected
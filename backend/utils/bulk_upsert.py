@@ -0,0 +1,204 @@
+"""
+批量 upsert 工具
+按数据库方言生成 INSERT ... ON CONFLICT DO UPDATE / DO NOTHING
+（MySQL 为 ON DUPLICATE KEY UPDATE / INSERT IGNORE），语句只编译一次，
+按块以 executemany 执行。
+其他方言没有可用的 upsert 语法，退回逐行 UPDATE / INSERT（结果相同，只是更慢）。
+批量写入前的 IN 校验 / 预取查询同样按绑定参数上限分块。
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import Table, and_, bindparam, exists, or_, select
+
+
+# IN 查询单条语句的绑定参数上限（取旧版 SQLite 的 999，兼容所有支持的方言）
+MAX_BIND_PARAMS = 999
+
+# 每次 executemany 提交给驱动的行数
+EXECUTEMANY_CHUNK_SIZE = 1000
+
+
+def select_in_chunks(session, statement, in_column, keys: Iterable[Any]) -> List[Any]:
+    """
+    分块执行 statement.where(in_column IN keys)，合并各块结果
+
+    每块最多 MAX_BIND_PARAMS 个值，keys 数量不受数据库绑定参数上限约束。
+    """
+    keys = list(keys)
+    result = []
+    for start in range(0, len(keys), MAX_BIND_PARAMS):
+        result.extend(session.exec(
+            statement.where(in_column.in_(keys[start:start + MAX_BIND_PARAMS]))
+        ).all())
+    return result
+
+
+@lru_cache(maxsize=None)
+def _keys_statement(columns: Tuple[Any, ...], key_columns: Tuple[Any, ...], chunk_size: int):
+    """
+    (col1 = :key_0_0 AND col2 = :key_0_1) OR ... 形式的预取语句
+
+    语句对象按形状缓存，重复执行时不必重建表达式树和缓存键。
+    """
+    return select(*columns).where(or_(*(
+        and_(*(
+            key_column == bindparam(f'key_{row}_{col}', type_=key_column.type)
+            for col, key_column in enumerate(key_columns)
+        ))
+        for row in range(chunk_size)
+    )))
+
+
+def select_by_keys(
+    session,
+    columns: Tuple[Any, ...],
+    key_columns: Tuple[Any, ...],
+    keys: Iterable[Tuple]
+) -> List[Any]:
+    """
+    按复合键精确预取：只取 keys 中列出的 (col1, col2, ...) 组合，不会取回各列 IN 的笛卡尔积
+
+    各方言都能逐键走唯一索引（SQLite 对多行行值 IN 不使用索引）。
+    按 MAX_BIND_PARAMS 分块，块大小向上取 2 的幂、末块用最后一个键补齐，
+    使语句形状只有少数几种；补齐的键会让最后一行重复返回，调用方需按键去重。
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+
+    max_chunk = MAX_BIND_PARAMS // len(key_columns)
+    chunk_size = min(max_chunk, 1 << (len(keys) - 1).bit_length())
+    statement = _keys_statement(tuple(columns), tuple(key_columns), chunk_size)
+
+    result = []
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        chunk = chunk + [chunk[-1]] * (chunk_size - len(chunk))
+        result.extend(session.exec(statement, params={
+            f'key_{row}_{col}': value
+            for row, key in enumerate(chunk)
+            for col, value in enumerate(key)
+        }).all())
+    return result
+
+
+def _dialect_insert(dialect_name: str):
+    """返回方言专属的 insert 构造函数，不支持 upsert 语法的方言返回 None"""
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        return None
+    return insert
+
+
+def _match_conflict(table: Table, row: Dict[str, Any], conflict_columns: Sequence[str]):
+    return and_(*(table.c[column] == row[column] for column in conflict_columns))
+
+
+def _upsert_rows_one_by_one(session, table, rows, conflict_columns, update_columns) -> None:
+    """逐行 UPDATE，未命中时再 INSERT"""
+    for row in rows:
+        result = session.exec(
+            table.update()
+            .where(_match_conflict(table, row, conflict_columns))
+            .values({column: row[column] for column in update_columns})
+        )
+        if result.rowcount == 0:
+            session.exec(table.insert().values(row))
+
+
+def _insert_rows_one_by_one(session, table, rows, conflict_columns) -> int:
+    """逐行检查冲突键，只插入库中和本批次中都不存在的行（键含 NULL 时不会冲突）"""
+    to_insert = []
+    batch_keys = set()
+    for row in rows:
+        key = tuple(row.get(column) for column in conflict_columns)
+        if None not in key:
+            if key in batch_keys:
+                continue
+            if session.exec(select(exists().where(_match_conflict(table, row, conflict_columns)))).scalar():
+                continue
+            batch_keys.add(key)
+        to_insert.append(row)
+    for start in range(0, len(to_insert), EXECUTEMANY_CHUNK_SIZE):
+        session.exec(table.insert(), params=to_insert[start:start + EXECUTEMANY_CHUNK_SIZE])
+    return len(to_insert)
+
+
+def upsert_rows(
+    session,
+    table: Table,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: Sequence[str]
+) -> None:
+    """
+    分块执行 upsert
+
+    Args:
+        session: 数据库会话
+        table: 目标表
+        rows: 行数据，所有行的键必须一致；同一冲突键在 rows 中只能出现一次
+        conflict_columns: 唯一约束列（冲突判定）
+        update_columns: 冲突时用新值覆盖的列
+    """
+    if not rows:
+        return
+
+    dialect_name = session.get_bind().dialect.name
+    insert = _dialect_insert(dialect_name)
+    if insert is None:
+        _upsert_rows_one_by_one(session, table, rows, conflict_columns, update_columns)
+        return
+
+    stmt = insert(table)
+    if dialect_name in ('mysql', 'mariadb'):
+        stmt = stmt.on_duplicate_key_update(
+            {column: stmt.inserted[column] for column in update_columns}
+        )
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+
+    for start in range(0, len(rows), EXECUTEMANY_CHUNK_SIZE):
+        session.exec(stmt, params=rows[start:start + EXECUTEMANY_CHUNK_SIZE])
+
+
+def insert_rows_ignoring_conflicts(
+    session,
+    table: Table,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[str]
+) -> int:
+    """
+    分块执行 INSERT，唯一约束冲突的行直接跳过（ON CONFLICT DO NOTHING / INSERT IGNORE）
+
+    Returns:
+        实际插入的行数
+    """
+    if not rows:
+        return 0
+
+    dialect_name = session.get_bind().dialect.name
+    insert = _dialect_insert(dialect_name)
+    if insert is None:
+        return _insert_rows_one_by_one(session, table, rows, conflict_columns)
+
+    stmt = insert(table)
+    if dialect_name in ('mysql', 'mariadb'):
+        stmt = stmt.prefix_with('IGNORE')
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+
+    inserted = 0
+    for start in range(0, len(rows), EXECUTEMANY_CHUNK_SIZE):
+        inserted += session.exec(stmt, params=rows[start:start + EXECUTEMANY_CHUNK_SIZE]).rowcount
+    return inserted
@@ -0,0 +1,68 @@
+"""
+请求级计算上下文
+在同一请求内按参数缓存服务层的中间计算结果（在途赎回、未来现金流等），
+避免 Dashboard 各汇总函数互相调用时重复查询。
+"""
+
+import inspect
+from contextlib import contextmanager
+from functools import wraps
+
+from sqlalchemy import event
+
+
+# 缓存存放在 session.info 中，随会话（即请求）一起失效
+_CACHE_KEY = 'computation_cache'
+
+
+def _clear_cache(session, flush_context) -> None:
+    """会话发生写入后清空缓存，保证后续读取看到最新数据"""
+    cache = session.info.get(_CACHE_KEY)
+    if cache:
+        cache.clear()
+
+
+@contextmanager
+def computation_context(session):
+    """
+    开启计算上下文：上下文内被 @memoized 装饰的服务函数按参数复用结果
+
+    可嵌套使用，仅最外层负责创建和清理缓存。
+    """
+    if _CACHE_KEY in session.info:
+        yield
+        return
+
+    session.info[_CACHE_KEY] = {}
+    event.listen(session, 'after_flush', _clear_cache)
+    try:
+        yield
+    finally:
+        event.remove(session, 'after_flush', _clear_cache)
+        session.info.pop(_CACHE_KEY, None)
+
+
+def memoized(func):
+    """
+    服务函数装饰器：计算上下文内按（函数, 参数）缓存返回值
+
+    被装饰函数的第一个参数必须是 session，其余参数需可哈希；
+    不在计算上下文内时直接计算。返回值会被多个调用方共享，调用方不得修改。
+    """
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(session, *args, **kwargs):
+        cache = session.info.get(_CACHE_KEY)
+        if cache is None:
+            return func(session, *args, **kwargs)
+
+        # 统一位置参数与关键字参数、补齐默认值，使等价调用命中同一缓存项
+        bound = signature.bind(session, *args, **kwargs)
+        bound.apply_defaults()
+        key = (func,) + tuple(bound.arguments.items())[1:]
+        if key not in cache:
+            cache[key] = func(session, *args, **kwargs)
+        return cache[key]
+
+    return wrapper
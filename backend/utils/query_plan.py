@@ -0,0 +1,61 @@
+"""
+查询计划分析工具
+捕获服务层实际执行的 SELECT 语句，并用 SQLite 的 EXPLAIN QUERY PLAN 检查是否存在全表扫描
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import event
+
+
+@contextmanager
+def capture_statements(engine):
+    """
+    捕获上下文内引擎执行的 SELECT 语句
+
+    Yields:
+        [(sql, parameters), ...]，按执行顺序，同一 SQL 文本只记录第一次
+    """
+    captured: List[Tuple[str, Any]] = []
+    seen = set()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith('SELECT'):
+            return
+        if statement in seen:
+            return
+        seen.add(statement)
+        captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+def is_full_scan(detail: str) -> bool:
+    """判断查询计划节点是否为全表扫描（SCAN 且未使用索引）"""
+    detail = detail.upper()
+    return detail.startswith('SCAN') and 'INDEX' not in detail and 'CONSTANT ROW' not in detail
+
+
+def explain_query_plan(connection, statement: str, parameters: Any) -> Dict[str, Any]:
+    """
+    对单条 SQL 执行 EXPLAIN QUERY PLAN
+
+    Returns:
+        {
+            "sql": str,
+            "plan": [str, ...],        # 计划节点描述
+            "full_scans": [str, ...]   # 其中的全表扫描节点
+        }
+    """
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    plan = [row[-1] for row in rows]
+    return {
+        "sql": statement,
+        "plan": plan,
+        "full_scans": [detail for detail in plan if is_full_scan(detail)],
+    }
@@ -0,0 +1,187 @@
+"""
+基准测试脚本的公共工具
+
+脚本从仓库根目录运行，例如：
+    python scripts/bench_requests.py
+    python scripts/bench_requests.py --backend /tmp/old/backend
+
+--backend 指向另一份检出（如 `git worktree add /tmp/old <commit>`）的 backend 目录，
+即可用同一脚本、同一份合成数据对比改动前后的结果。
+数据库通过 DATABASE_URL 环境变量指定，新旧版本的代码都能识别。
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Sequence
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BACKEND = os.path.join(REPO_ROOT, 'backend')
+
+
+def make_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, help='被测 backend 目录（默认当前检出）')
+    parser.add_argument('--db', default=None, help='数据库文件路径（默认临时文件）')
+    return parser
+
+
+def temp_db_path(name: str) -> str:
+    return os.path.join(tempfile.mkdtemp(prefix='bench_'), name)
+
+
+def load_backend(backend_dir: str, db_path: str, env: Dict[str, str] = None):
+    """
+    以指定数据库导入被测 backend，创建一次应用完成建表 / 迁移
+
+    Returns:
+        create_app 工厂函数
+    """
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    for key, value in (env or {}).items():
+        os.environ[key] = value
+    backend_dir = os.path.abspath(backend_dir)
+    sys.path.insert(0, backend_dir)
+    os.chdir(backend_dir)
+
+    from app import create_app
+    create_app()
+    ensure_tables(db_path)
+    return create_app
+
+
+def ensure_tables(db_path: str) -> None:
+    """补建缺失的表（旧版本 init_db 只为已导入的模型建表）"""
+    import models  # noqa: F401  注册全部模型
+    from sqlmodel import SQLModel, create_engine
+
+    engine = create_engine(f'sqlite:///{db_path}')
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+
+
+def seed_portfolio(
+    db_path: str,
+    products: int = 40,
+    accounts: int = 10,
+    valuation_days: int = 120,
+    transactions_per_product: int = 6,
+    snapshot_days: int = 12,
+    valuation_step: int = 1,
+    seed: int = 7
+) -> Dict[str, int]:
+    """
+    用原生 SQL 批量写入合成数据（表需已存在），枚举按名称存储，与 ORM 写入一致
+
+    - 每个产品最近 valuation_days 天内每 valuation_step 天一个估值点
+      （部分产品没有估值，部分估值截止于若干天前）
+    - 每个产品 transactions_per_product 笔交易，分布在最近 400 天
+    - 每个账户 snapshot_days 个快照日期
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow().isoformat(sep=' ')
+    today = date.today()
+    categories = ('buy', 'buy', 'redeem_request', 'redeem_settle', 'fee')
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO accounts (created_at, updated_at, name, type, currency, is_liquid) VALUES (?, ?, ?, ?, ?, ?)",
+        [(now, now, f'acct{i:04d}', 'DEBIT', 'CNY', int(rng.random() < 0.8)) for i in range(accounts)]
+    )
+    conn.executemany(
+        "INSERT INTO products (created_at, updated_at, name, product_type, liquidity_rule, term_days, settle_days, valuation_mode)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (now, now, f'prod{i:05d}', 'BANK_WMP', rng.choice(('OPEN', 'CLOSED', 'PERIODIC_OPEN')),
+             rng.choice((None, 28, 90, 180)), rng.choice((1, 2, 3)), 'PRODUCT_VALUE')
+            for i in range(products)
+        ]
+    )
+    account_ids = [row[0] for row in conn.execute("SELECT id FROM accounts ORDER BY id")]
+    product_ids = [row[0] for row in conn.execute("SELECT id FROM products ORDER BY id")]
+
+    valuations = []
+    for product_id in product_ids:
+        if product_id % 50 == 0:
+            continue  # 从未估值的产品
+        end = rng.choice((0, 0, 5, 20, 40, 90))
+        value = 1000.0
+        for offset in range(end + valuation_days - 1, end - 1, -valuation_step):
+            value *= 1 + rng.gauss(0.0003, 0.004)
+            valuations.append((now, now, product_id, (today - timedelta(days=offset)).isoformat(), value))
+        if len(valuations) >= 100000:
+            conn.executemany(
+                "INSERT INTO product_valuations (created_at, updated_at, product_id, date, market_value) VALUES (?, ?, ?, ?, ?)",
+                valuations
+            )
+            valuations.clear()
+    conn.executemany(
+        "INSERT INTO product_valuations (created_at, updated_at, product_id, date, market_value) VALUES (?, ?, ?, ?, ?)",
+        valuations
+    )
+
+    transactions = []
+    for product_id in product_ids:
+        for _ in range(transactions_per_product):
+            trade_date = today - timedelta(days=rng.randint(0, 400))
+            settle_date = trade_date + timedelta(days=rng.randint(0, 5)) if rng.random() < 0.7 else None
+            transactions.append((
+                now, now, product_id, rng.choice(account_ids), rng.choice(categories),
+                trade_date.isoformat(), settle_date.isoformat() if settle_date else None,
+                round(rng.uniform(100, 5000), 2)
+            ))
+    conn.executemany(
+        "INSERT INTO transactions (created_at, updated_at, product_id, account_id, category, trade_date, settle_date, amount)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        transactions
+    )
+
+    snapshots = []
+    for account_id in account_ids:
+        for offset in sorted(rng.sample(range(0, 120), min(snapshot_days, 120))):
+            snapshots.append((
+                now, now, (today - timedelta(days=offset)).isoformat(), account_id, round(rng.uniform(-2000, 20000), 2)
+            ))
+    conn.executemany(
+        "INSERT INTO snapshots (created_at, updated_at, date, account_id, balance) VALUES (?, ?, ?, ?, ?)",
+        snapshots
+    )
+    conn.commit()
+
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('accounts', 'products', 'product_valuations', 'transactions', 'snapshots')
+    }
+    conn.close()
+    return counts
+
+
+def percentile(sorted_samples: Sequence[float], p: float) -> float:
+    """已排序样本的 p 分位数（最近秩）"""
+    if not sorted_samples:
+        return float('nan')
+    index = min(len(sorted_samples) - 1, int(len(sorted_samples) * p))
+    return sorted_samples[index]
+
+
+def best_of(func: Callable[[], object], repeat: int = 5, number: int = 1) -> float:
+    """重复 repeat 轮、每轮调用 number 次，返回单次调用的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def print_table(headers: List[str], rows: List[Sequence]) -> None:
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,63 @@
+"""
+收益风险指标基准：基线纯 Python calculate_metrics vs 向量化实现
+
+默认 10k 点序列，分别以 list-of-dicts、(dates, values) 与 (ordinals ndarray, values ndarray)
+三种输入计时。基线实现取自 backend/tests/legacy。
+
+    python scripts/bench_metrics.py --points 10000
+"""
+
+import random
+import sys
+from datetime import date, timedelta
+
+from bench_common import best_of, make_parser, print_table
+
+
+def make_series(points: int, seed: int = 9):
+    rng = random.Random(seed)
+    day = date(2000, 1, 1)
+    value = 1000.0
+    series = []
+    for _ in range(points):
+        series.append({'date': day, 'value': value})
+        value *= 1 + rng.gauss(0.0003, 0.01)
+        day += timedelta(days=rng.choice((1, 1, 1, 3)))
+    return series
+
+
+def main():
+    parser = make_parser('收益风险指标基准')
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+    sys.path.insert(0, args.backend)
+
+    import numpy as np
+    from services.analytics_service import calculate_metrics
+    from tests.legacy.metrics import calculate_metrics as legacy_calculate_metrics
+
+    series = make_series(args.points)
+    dates = [p['date'] for p in series]
+    values = [p['value'] for p in series]
+    arrays = (np.array([d.toordinal() for d in dates], dtype=np.int64), np.array(values))
+
+    cases = [
+        ('legacy list-of-dicts', legacy_calculate_metrics, series),
+        ('numpy list-of-dicts', calculate_metrics, series),
+        ('numpy (dates, values)', calculate_metrics, (dates, values)),
+        ('numpy (ordinals, values) arrays', calculate_metrics, arrays),
+    ]
+    baseline = None
+    rows = []
+    for name, func, arg in cases:
+        elapsed = best_of(lambda: func(arg), args.repeat, args.number)
+        baseline = baseline or elapsed
+        rows.append([name, f"{elapsed * 1000:.3f}", f"{baseline / elapsed:.1f}x"])
+    print(f"points={args.points}")
+    print_table(['implementation', 'ms/call', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
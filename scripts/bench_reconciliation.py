@@ -0,0 +1,78 @@
+"""
+对账警告全量计算基准：get_all_warnings 串行 / 并行（RECONCILIATION_PARALLEL）耗时对比
+
+在大规模合成数据上分别计时三类检查与 get_all_warnings 串行、并行两种模式，
+并校验两种模式输出一致。并行只能把总耗时压到最慢一项检查附近，且需要多核：
+    python scripts/bench_reconciliation.py
+    python scripts/bench_reconciliation.py --backend /tmp/before/backend   # 旧版本只计时串行
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from functools import partial
+
+from bench_common import best_of, load_backend, make_parser, print_table, seed_portfolio, temp_db_path
+
+
+def _digest(warnings) -> str:
+    payload = json.dumps([w.to_dict() for w in warnings], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def main():
+    parser = make_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--valuation-days', type=int, default=205)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    db_path = args.db or temp_db_path('reconciliation.db')
+    load_backend(args.backend, db_path)
+    start = time.perf_counter()
+    counts = seed_portfolio(
+        db_path, products=args.products, accounts=args.accounts, valuation_days=args.valuation_days,
+        transactions_per_product=12, snapshot_days=40
+    )
+    print(f"backend={args.backend} cpus={os.cpu_count()} data={counts} (seeded in {time.perf_counter() - start:.1f}s)")
+
+    from database import get_session
+    from services import reconciliation_service as rs
+
+    session = get_session()
+    rows = [
+        [name, f"{best_of(lambda: check(session), args.repeat) * 1000:.1f}", len(check(session)), '']
+        for name, check in (
+            ('check_account_diffs', rs.check_account_diffs),
+            ('check_redeem_consistency', rs.check_redeem_consistency),
+            ('check_valuation_gaps', rs.check_valuation_gaps),
+        )
+    ]
+
+    modes = [False, True] if 'parallel' in inspect.signature(rs.get_all_warnings).parameters else [None]
+    calls = {
+        parallel: partial(rs.get_all_warnings, session, **({} if parallel is None else {'parallel': parallel}))
+        for parallel in modes
+    }
+    results = {parallel: call() for parallel, call in calls.items()}
+    # 串行 / 并行交替计时，避免机器负载漂移偏向其中一种模式
+    best = {parallel: float('inf') for parallel in modes}
+    for _ in range(args.repeat):
+        for parallel, call in calls.items():
+            best[parallel] = min(best[parallel], best_of(call, 1))
+    for parallel in modes:
+        label = 'get_all_warnings' + ('' if parallel is None else f" ({'parallel' if parallel else 'serial'})")
+        rows.append([label, f"{best[parallel] * 1000:.1f}", len(results[parallel]), _digest(results[parallel])])
+    digests = {_digest(warnings) for warnings in results.values()}
+    session.close()
+
+    print_table(['call', 'best_ms', 'items', 'digest'], rows)
+    if len(digests) != 1:
+        raise SystemExit('serial and parallel outputs differ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+请求吞吐基准：/api/accounts 与 /api/dashboard/summary 的 requests/sec
+
+对比共享连接池引擎前后（或任意两个版本）：
+    git worktree add /tmp/before <commit>
+    python scripts/bench_requests.py --backend /tmp/before/backend
+    python scripts/bench_requests.py
+"""
+
+import time
+from datetime import date
+
+from bench_common import load_backend, make_parser, seed_portfolio, temp_db_path
+
+ENDPOINTS = ('/api/accounts', f'/api/dashboard/summary?date={date.today().isoformat()}')
+
+
+def main():
+    parser = make_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help='每个端点计时的请求数')
+    parser.add_argument('--warmup', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = args.db or temp_db_path('requests.db')
+    create_app = load_backend(args.backend, db_path)
+    counts = seed_portfolio(db_path, products=40, accounts=20)
+    client = create_app().test_client()
+    print(f"backend={args.backend} data={counts}")
+
+    for url in ENDPOINTS:
+        for _ in range(args.warmup):
+            assert client.get(url).status_code == 200, url
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client.get(url)
+        elapsed = time.perf_counter() - start
+        print(f"{url:<40} {args.requests / elapsed:8.0f} req/s  ({elapsed / args.requests * 1000:.2f} ms/req)")
+
+
+if __name__ == '__main__':
+    main()
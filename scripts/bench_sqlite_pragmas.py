@@ -0,0 +1,125 @@
+"""
+并发读写尾延迟基准：SQLite PRAGMA 调优配置开启 / 关闭对比
+
+读进程循环请求 /api/dashboard/summary，写进程同时循环提交 /snapshots/batch_upsert，
+统计读请求的 p50 / p95 / p99 / max 延迟与失败数。两种配置各使用一个全新的数据库文件
+（WAL 模式会持久化在文件中）。
+
+    python scripts/bench_sqlite_pragmas.py --seconds 10 --readers 4 --writers 2
+"""
+
+import multiprocessing as mp
+import os
+import random
+import time
+from datetime import date
+
+from bench_common import load_backend, make_parser, percentile, print_table, seed_portfolio, temp_db_path
+
+
+def _profile_config(enabled: bool, db_path: str):
+    from config import Config
+
+    class ProfileConfig(Config):
+        DATABASE_URL = f'sqlite:///{db_path}'
+        SQLITE_PRAGMAS_ENABLED = enabled
+
+    return ProfileConfig
+
+
+def _writer(create_app, enabled, db_path, worker, account_ids, rows_per_batch, stop_at, results):
+    client = create_app(_profile_config(enabled, db_path)).test_client()
+    rng = random.Random(worker)
+    batches = errors = 0
+    while time.time() < stop_at:
+        batches += 1
+        day = date(2023, rng.randint(1, 12), rng.randint(1, 28)).isoformat()
+        rows = [
+            {"date": day, "account_id": account_id, "balance": round(rng.uniform(0, 1e4), 2)}
+            for account_id in rng.sample(account_ids, min(rows_per_batch, len(account_ids)))
+        ]
+        if client.post('/api/snapshots/batch_upsert', json={"rows": rows}).status_code != 200:
+            errors += 1
+    results.put(('write', batches, errors))
+
+
+def _reader(create_app, enabled, db_path, url, stop_at, results):
+    client = create_app(_profile_config(enabled, db_path)).test_client()
+    latencies = []
+    errors = 0
+    while time.time() < stop_at:
+        start = time.perf_counter()
+        status = client.get(url).status_code
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors += 1
+    results.put(('read', latencies, errors))
+
+
+def run_profile(create_app, enabled, db_path, args):
+    account_ids = list(range(1, args.accounts + 1))
+    url = f'/api/dashboard/summary?date={date.today().isoformat()}'
+    # 预热一次，避免计入首个请求的开销
+    create_app(_profile_config(enabled, db_path)).test_client().get(url)
+
+    stop_at = time.time() + args.seconds
+    results = mp.Queue()
+    workers = [
+        mp.Process(target=_writer, args=(create_app, enabled, db_path, k, account_ids, args.rows_per_batch, stop_at, results))
+        for k in range(args.writers)
+    ] + [
+        mp.Process(target=_reader, args=(create_app, enabled, db_path, url, stop_at, results))
+        for _ in range(args.readers)
+    ]
+    for process in workers:
+        process.start()
+
+    latencies, read_errors, batches, write_errors = [], 0, 0, 0
+    for _ in workers:
+        kind, payload, errors = results.get()
+        if kind == 'read':
+            latencies.extend(payload)
+            read_errors += errors
+        else:
+            batches += payload
+            write_errors += errors
+    for process in workers:
+        process.join()
+
+    latencies.sort()
+    ms = lambda p: f"{percentile(latencies, p) * 1000:.1f}"
+    return [
+        'on' if enabled else 'off', len(latencies), ms(0.50), ms(0.95), ms(0.99),
+        f"{latencies[-1] * 1000:.1f}" if latencies else 'nan', read_errors, batches, write_errors
+    ]
+
+
+def main():
+    parser = make_parser('并发读写尾延迟基准（PRAGMA 调优开 / 关）')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--accounts', type=int, default=200)
+    parser.add_argument('--rows-per-batch', type=int, default=200)
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(args.db) if args.db else os.path.dirname(temp_db_path('pragmas.db'))
+    rows = []
+    create_app = None
+    for enabled in (False, True):
+        db_path = os.path.join(base_dir, f"pragmas_{'on' if enabled else 'off'}.db")
+        if create_app is None:
+            create_app = load_backend(args.backend, db_path)
+        create_app(_profile_config(enabled, db_path))
+        seed_portfolio(db_path, products=200, accounts=args.accounts)
+        rows.append(run_profile(create_app, enabled, db_path, args))
+
+    print(f"readers={args.readers} writers={args.writers} seconds={args.seconds}")
+    print_table(
+        ['pragmas', 'reads', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'read_err', 'write_batches', 'write_err'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+估值断档检测基准：5k 产品、约 1M 估值点上的 check_valuation_gaps 耗时与查询数
+
+输出结果摘要（digest），对比前后两个版本时可确认检测结果一致：
+    git worktree add /tmp/before <commit>
+    python scripts/bench_valuation_gaps.py --backend /tmp/before/backend
+    python scripts/bench_valuation_gaps.py
+"""
+
+import hashlib
+import json
+import time
+
+from bench_common import best_of, load_backend, make_parser, seed_portfolio, temp_db_path
+
+
+def main():
+    parser = make_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--valuation-days', type=int, default=205, help='每个产品的估值天数（5000 × 205 ≈ 1M）')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = args.db or temp_db_path('valuation_gaps.db')
+    load_backend(args.backend, db_path)
+    start = time.perf_counter()
+    counts = seed_portfolio(
+        db_path, products=args.products, accounts=50,
+        valuation_days=args.valuation_days, transactions_per_product=8
+    )
+    print(f"backend={args.backend} data={counts} (seeded in {time.perf_counter() - start:.1f}s)")
+
+    from sqlalchemy import event
+    from database import get_session
+    from services.reconciliation_service import check_valuation_gaps
+
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    session = get_session()
+    engine = session.get_bind()
+
+    event.listen(engine, 'before_cursor_execute', listener)
+    items = check_valuation_gaps(session)
+    event.remove(engine, 'before_cursor_execute', listener)
+
+    payload = json.dumps(sorted((item.to_dict() for item in items), key=lambda d: d['product_id']), sort_keys=True)
+    elapsed = best_of(lambda: check_valuation_gaps(session), args.repeat)
+    session.close()
+
+    print(f"gaps={len(items)} digest={hashlib.sha256(payload.encode()).hexdigest()[:16]}")
+    print(f"check_valuation_gaps: {elapsed * 1000:.1f} ms, {len(statements)} queries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+估值序列基准：基线逐日循环实现 vs 向量化实现，按窗口长度对比
+
+单产品 get_valuation_series 与全部产品批量获取（基线为逐个产品调用）各计时一次。
+基线实现取自 backend/tests/legacy，只能在当前检出上运行。
+
+    python scripts/bench_valuation_series.py --products 200 --step 7
+"""
+
+from datetime import date, timedelta
+
+from bench_common import best_of, load_backend, make_parser, print_table, seed_portfolio, temp_db_path
+
+WINDOWS = (30, 90, 365, 1095, 1825)
+
+
+def main():
+    parser = make_parser('估值序列基准（按窗口长度）')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--step', type=int, default=7, help='估值点间隔天数（越稀疏插值天数越多）')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = args.db or temp_db_path('valuation_series.db')
+    create_app = load_backend(args.backend, db_path)
+    counts = seed_portfolio(db_path, products=args.products, valuation_days=max(WINDOWS) + 30, valuation_step=args.step)
+    create_app()
+    print(f"data={counts} step={args.step}")
+
+    from database import get_session
+    from services import valuation_service
+    from tests.legacy import valuation_series as legacy
+
+    session = get_session()
+    product_id = 1
+    end = date.today()
+    rows = []
+    for window in WINDOWS:
+        start = end - timedelta(days=window - 1)
+        assert valuation_service.get_valuation_series(session, product_id, start, end) == \
+            legacy.get_valuation_series(session, product_id, start, end)
+
+        single_old = best_of(lambda: legacy.get_valuation_series(session, product_id, start, end), args.repeat, 10)
+        single_new = best_of(lambda: valuation_service.get_valuation_series(session, product_id, start, end), args.repeat, 10)
+        single_arrays = best_of(
+            lambda: valuation_service.get_valuation_series_arrays(session, product_id, start, end), args.repeat, 10
+        )
+        batch_old = best_of(
+            lambda: [legacy.get_valuation_series(session, pid, start, end) for pid in range(1, args.products + 1)],
+            args.repeat
+        )
+        batch_new = best_of(
+            lambda: valuation_service.get_valuation_series_batch(session, None, start, end), args.repeat
+        )
+        rows.append([
+            window,
+            f"{single_old * 1000:.2f}", f"{single_new * 1000:.2f}", f"{single_arrays * 1000:.2f}",
+            f"{batch_old * 1000:.0f}", f"{batch_new * 1000:.0f}", f"{batch_old / batch_new:.1f}x"
+        ])
+    session.close()
+
+    print_table(
+        ['window_days', 'single_legacy_ms', 'single_dicts_ms', 'single_arrays_ms',
+         'all_legacy_ms', 'all_batch_ms', 'speedup'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()